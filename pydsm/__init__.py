@@ -10,10 +10,11 @@ __all__ = [
     "build_timewindow_for_time",
     "get_interpolated_cell_concentrations",
     "write_gtm_restart",
+    "write_gtm_restarts",
 ]
 
 from ._version import __version__
 from .output.gtmh5 import build_timewindow_for_time, get_interpolated_cell_concentrations
-from .output.create_gtm_restart import write_gtm_restart
+from .output.create_gtm_restart import write_gtm_restart, write_gtm_restarts
 
 
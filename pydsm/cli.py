@@ -9,8 +9,12 @@ from pydsm.input import repeating_timeseries
 from pydsm.input import dcd_calcs
 from pydsm.input.dcd_calcs import calc_netcd_cmd
 from pydsm.input import extend_dss_ts
-from pydsm.output.create_gtm_restart import write_gtm_restart
+from pydsm.output.create_gtm_restart import write_gtm_restart, create_gtm_restarts_cmd
 from pydsm.output.hydro_vol_calcs import calc_volumes_cmd
+from pydsm.output.tidefile_store import export_tidefile_cmd
+from pydsm.output.tidefile_repack import repack_tidefile_cmd
+from pydsm.output.extract_tidefiles import extract_tidefiles_cmd
+from pydsm.output.tidefile_server import serve_cmd
 from pydsm.input import channel_orient
 from pydsm.analysis.dsm2diff import dsm2_diff
 from pydsm.analysis.gate_state import get_gate_state
@@ -437,11 +441,16 @@ main.add_command(create_dsm2_input_for_cd)
 main.add_command(pretty_print_input)
 # GTM restart creation
 main.add_command(create_gtm_restart_cmd)
+main.add_command(create_gtm_restarts_cmd)
 #
 main.add_command(extend_dss_ts.extend_dss_ts)
 main.add_command(channel_orient.generate_channel_orientation, "chan-orient")
 main.add_command(calc_netcd_cmd)
 main.add_command(calc_volumes_cmd)
+main.add_command(export_tidefile_cmd)
+main.add_command(repack_tidefile_cmd)
+main.add_command(extract_tidefiles_cmd)
+main.add_command(serve_cmd)
 main.add_command(dsm2_diff)
 main.add_command(gate_state_cmd)
 
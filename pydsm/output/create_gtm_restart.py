@@ -3,7 +3,9 @@
 Generates a restart file containing:
  - Cell concentrations (interpolated per cell from channel end concentrations)
  - Reservoir concentrations
-for a requested model time.
+for a requested model time. `write_gtm_restarts` writes restart files for
+many target times and constituents (one column each) from a single read of
+the output time steps they need.
 
 Example
 -------
@@ -26,6 +28,15 @@ Output file format (illustrative):
               reservoir_name                ec
 clifton_court                               416.6467054602688336
 ... (reservoirs) ...
+
+Monthly restarts of all constituents::
+
+    write_gtm_restarts(
+        "hist_gtm.h5",
+        pd.date_range("2000-01-01", "2020-01-01", freq="MS"),
+        "restarts/gtm_{time:%Y%m}.qrf",
+        constituents=["ec", "doc", "temp"],
+    )
 """
 
 from __future__ import annotations
@@ -34,14 +45,18 @@ from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Iterable
 
+import click
 import numpy as np
+import pandas as pd
 
+from . import dsm2h5
 from .gtmh5 import (
-    build_timewindow_for_time,
-    get_interpolated_cell_concentrations,
-    _format_time,
+    _nearest_time,
+    _parse_dsm2_time,
+    get_cell_interpolation_operator,
 )
 from .qualh5 import QualH5
+from .tidefile_pool import open_tidefile
 
 _EPOCH_JULMIN = datetime(1899, 12, 31, 0, 0)  # Excel-like epoch (matches sample)
 
@@ -65,12 +80,29 @@ def _compute_julmin(dt: datetime) -> int:
     return int((dt - _EPOCH_JULMIN).total_seconds() // 60)
 
 
-def _format_cell_header(constituent: str) -> str:
-    return f"{'cell_no':>29}{constituent:>20}              "
+def _format_header(label: str, constituents: Iterable[str]) -> str:
+    names = "".join(f"{name:>20}{'':12}" for name in constituents)
+    return f"{label:>29}{names}  "
+
 
+def _format_cell_header(constituent: str | Iterable[str]) -> str:
+    if isinstance(constituent, str):
+        constituent = [constituent]
+    return _format_header("cell_no", constituent)
 
-def _format_res_header(constituent: str) -> str:
-    return f"{'reservoir_name':>29}{constituent:>20}              "
+
+def _format_res_header(constituent: str | Iterable[str]) -> str:
+    if isinstance(constituent, str):
+        constituent = [constituent]
+    return _format_header("reservoir_name", constituent)
+
+
+def _format_rows(row_format: str, rows: list) -> str:
+    """The lines of row_format for each of the rows, formatted in one call."""
+    if not rows:
+        return ""
+    values = tuple(value for row in rows for value in row)
+    return ((row_format + "\n") * len(rows)) % values
 
 
 def write_gtm_restart(
@@ -96,63 +128,203 @@ def write_gtm_restart(
     -------
     Path to the written restart file.
     """
-    tidefile = Path(tidefile)
-    outfile = Path(outfile)
-    qualt = QualH5(str(tidefile))
+    return _write_restarts(tidefile, [target_time], [outfile], [constituent])[0]
 
-    # Determine timewindow and chosen model time
-    timewindow, model_time = build_timewindow_for_time(str(tidefile), target_time)
 
-    # End of interval (label uses interval end so that 2400 formatting matches sample)
-    output_freq = qualt.get_output_freq()
-    interval_end = model_time + output_freq
-
-    # Gather cell concentrations
-    cell_conc = get_interpolated_cell_concentrations(
-        str(tidefile), timewindow, constituent=constituent
-    ).ravel()
-    n_cells = cell_conc.size
-
-    # Gather reservoir concentrations
-    res_df = qualt.get_reservoirs()
-    res_names = list(res_df["name"].values)
-    if res_names:
-        res_conc_df = qualt.get_reservoir_concentration(
-            constituent, res_names, timewindow=timewindow
-        )
-        # Single row expected
-        res_conc = res_conc_df.iloc[0].values.astype(float)
-    else:  # pragma: no cover - unlikely empty dataset
-        res_conc = np.array([])
-    n_res = len(res_conc)
+def write_gtm_restarts(
+    tidefile: str | Path,
+    target_times: Iterable[str | datetime],
+    outfile_pattern: str | Path,
+    constituents: str | Iterable[str] = "ec",
+) -> list[Path]:
+    """Write GTM restart files for many target times and constituents.
 
-    # Compose header
-    time_label = _time_label_with_2400(interval_end)
-    julmin = _compute_julmin(interval_end)
+    All output time steps needed are read with one read of the channel and
+    one of the reservoir concentrations, and the cells of every file are
+    formatted in one call, so a restart costs little more than writing it.
+
+    Parameters
+    ----------
+    tidefile : str | Path
+       Path to GTM/Qual HDF5 file (tide file).
+    target_times : iterable of str | datetime
+       Desired times (each will snap to the nearest output time).
+    outfile_pattern : str | Path
+       Destination restart file path for each time, formatted with the time
+       of the restart (the label on its first line) as ``time``, e.g.
+       ``"restarts/gtm_{time:%Y%m%d}.qrf"``. Directories are created.
+    constituents : str | iterable of str, default 'ec'
+       Constituents to export, one column (``n_column``) each.
 
-    lines: list[str] = []
-    lines.append(f"{time_label}/time")
-    lines.append(f"{julmin:12d} /julmin")
-    lines.append(f"{1:12d} /n_column")
-    lines.append(f"{n_cells:12d} /n_cell")
-    lines.append(_format_cell_header(constituent))
+    Returns
+    -------
+    list of Path
+        The restart files written, in the order of target_times.
+    """
+    target_times = list(target_times)
+    if isinstance(constituents, str):
+        constituents = [constituents]
+    with open_tidefile(str(tidefile), QualH5) as qualt:
+        restart_times = [
+            interval_end for _, interval_end in _snap_times(qualt, target_times)
+        ]
+    outfiles = [Path(str(outfile_pattern).format(time=time)) for time in restart_times]
+    for outfile in outfiles:
+        outfile.parent.mkdir(parents=True, exist_ok=True)
+    return _write_restarts(tidefile, target_times, outfiles, constituents)
+
+
+def _snap_times(qualt, target_times):
+    """(model time, interval end) of the output time nearest each target time"""
+    output_freq = qualt.get_output_freq()
+    start_date, end_date = qualt.get_start_end_dates()
+    start_time = _parse_dsm2_time(start_date)
+    end_time = _parse_dsm2_time(end_date)
+    snapped = []
+    for target_time in target_times:
+        model_time = _nearest_time(target_time, start_time, end_time, output_freq)
+        # the label uses the interval end so that 2400 formatting matches sample
+        snapped.append((model_time, model_time + output_freq))
+    return snapped
+
+
+def _read_rows(data, times):
+    """data at the rows of the times (datetimes), read in one selection"""
+    attrs = dsm2h5.read_attributes_from_table(data)
+    offsets = (
+        pd.DatetimeIndex(times) - pd.Timestamp(attrs["start_time"])
+    ) / pd.Timedelta(attrs["interval"])
+    rows = np.rint(np.asarray(offsets, dtype=float)).astype(np.int64)
+    if len(rows) and (rows.min() < 0 or rows.max() >= data.shape[0]):
+        raise ValueError(
+            f"{data.name} has no output at some of the times {list(times)}"
+        )
+    unique, inverse = np.unique(rows, return_inverse=True)
+    return data[unique][inverse]
+
+
+def _write_restarts(tidefile, target_times, outfiles, constituents):
+    tidefile = str(tidefile)
+    # the helpers below share this reader through the tidefile pool
+    with open_tidefile(tidefile, QualH5) as qualt:
+        snapped = _snap_times(qualt, target_times)
+        model_times = [model_time for model_time, _ in snapped]
+        constituent_indices = qualt._names_to_constituent_indices(list(constituents))
+        location_indices = qualt._channel_locations_to_indicies(
+            ["upstream", "downstream"]
+        )
+        # (time, constituent, channel, location) -> (time, constituent, cell)
+        ends = _read_rows(qualt.h5["/output/channel concentration"], model_times)
+        ends = ends[:, constituent_indices][..., location_indices].astype(float)
+        operator = get_cell_interpolation_operator(tidefile)
+        nchannels = ends.shape[2]
+        cell_conc = np.asarray(ends.reshape(-1, 2 * nchannels) @ operator)
+        cell_conc = cell_conc.reshape(len(model_times), len(constituents), -1)
+        res_names = list(qualt.get_reservoirs()["name"].values)
+        if res_names:
+            res_conc = _read_rows(
+                qualt.h5["/output/reservoir concentration"], model_times
+            )
+            res_conc = res_conc[:, constituent_indices].astype(float)
+        else:  # pragma: no cover - unlikely empty dataset
+            res_conc = np.empty((len(model_times), len(constituents), 0))
+    written = []
+    for i, ((_, interval_end), outfile) in enumerate(zip(snapped, outfiles)):
+        outfile = Path(outfile)
+        outfile.write_text(
+            _restart_text(
+                interval_end, constituents, cell_conc[i], res_names, res_conc[i]
+            )
+        )
+        written.append(outfile)
+    return written
 
-    # Cell data lines: id (1-based) and value
-    for i, val in enumerate(cell_conc, start=1):
-        # Align cell number under 'cell_no' and value under constituent header
-        lines.append(f"{i:32d}{val:32.16f}")
 
-    lines.append(f"{n_res:12d} /n_resv")
-    lines.append(_format_res_header(constituent))
+def _restart_text(restart_time, constituents, cell_conc, res_names, res_conc):
+    """
+    the restart file for the concentrations (constituent, cell) and
+    (constituent, reservoir) at restart_time
+    """
+    n_cells = cell_conc.shape[1]
+    ncol = len(constituents)
+    header = [
+        f"{_time_label_with_2400(restart_time)}/time",
+        f"{_compute_julmin(restart_time):12d} /julmin",
+        f"{ncol:12d} /n_column",
+        f"{n_cells:12d} /n_cell",
+        _format_cell_header(constituents),
+    ]
+    # Cell data lines: id (1-based) and values, aligned under the header
+    cells = np.column_stack([np.arange(1, n_cells + 1), cell_conc.T]).tolist()
+    res_header = [
+        f"{len(res_names):12d} /n_resv",
+        _format_res_header(constituents),
+    ]
+    reservoirs = [
+        [name] + values for name, values in zip(res_names, res_conc.T.tolist())
+    ]
+    return (
+        "\n".join(header)
+        + "\n"
+        + _format_rows("%32d" + "%32.16f" * ncol, cells)
+        + "\n".join(res_header)
+        + "\n"
+        + _format_rows("%-32s" + "%32.16f" * ncol, reservoirs)
+    )
 
-    for name, val in zip(res_names, res_conc):
-        lines.append(f"{name:<32}{val:>32.16f}")
 
-    outfile.write_text("\n".join(lines) + "\n")
-    return outfile
+@click.command(name="create-gtm-restarts")
+@click.argument("tidefile", type=click.Path(exists=True))
+@click.argument("outfile_pattern", type=str)
+@click.option(
+    "-t",
+    "--time",
+    "target_times",
+    multiple=True,
+    help="Target time (e.g. '05FEB2020 0300'), repeat for more.",
+)
+@click.option(
+    "--freq",
+    default=None,
+    help="Restarts at every time of this pandas frequency (e.g. 'MS') instead.",
+)
+@click.option("--start", default=None, help="Start of --freq times (run start).")
+@click.option("--end", default=None, help="End of --freq times (run end).")
+@click.option(
+    "-c",
+    "--constituent",
+    "constituents",
+    multiple=True,
+    default=["ec"],
+    show_default=True,
+    help="Constituent to export, repeat for more columns.",
+)
+def create_gtm_restarts_cmd(
+    tidefile, outfile_pattern, target_times, freq, start, end, constituents
+):
+    """Create GTM restart files for many times from a GTM/Qual tide HDF5 file.
+
+    TIDEFILE: Path to HDF5 tide file.
+    OUTFILE_PATTERN: Restart file name with the restart time as {time}, e.g.
+    "restarts/gtm_{time:%Y%m%d}.qrf".
+    """
+    target_times = list(target_times)
+    if freq:
+        if start is None or end is None:
+            with open_tidefile(tidefile, QualH5) as qualt:
+                run_start, run_end = qualt.get_start_end_dates()
+            start = start or _parse_dsm2_time(run_start)
+            end = end or _parse_dsm2_time(run_end)
+        target_times += list(
+            pd.date_range(_parse_dsm2_time(start), _parse_dsm2_time(end), freq=freq)
+        )
+    if not target_times:
+        raise click.UsageError("give target times with --time or --freq")
+    paths = write_gtm_restarts(tidefile, target_times, outfile_pattern, constituents)
+    click.echo(f"Wrote {len(paths)} restart files")
 
 
-__all__ = ["write_gtm_restart"]
+__all__ = ["write_gtm_restart", "write_gtm_restarts"]
 
 
 if __name__ == "__main__":  # rudimentary CLI usage
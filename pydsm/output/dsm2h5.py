@@ -1,6 +1,14 @@
+import collections
+import functools
+import os
+import sqlite3
+import threading
+import weakref
+
 import pandas as pd
 import numpy as np
 import h5py
+import diskcache
 
 """
 This module loads h5 files created by a DSM2 hydro or qual run.
@@ -176,54 +184,82 @@ def df_column_values_to_index(df, column_label, matching_values):
     return df[df[column_label].isin(matching_values)].index.values
 
 
-def read_table_as_df(h5, tpath):
+def _is_bytes_dtype(dtype):
+    return dtype.kind == "S"
+
+
+def decode_and_strip(arr):
+    """
+    decodes a numpy array of bytes to str and strips empty spaces,
+    operating on the whole array at once
+    """
+    return np.char.strip(np.char.decode(arr, "utf-8", errors="replace"))
+
+
+def _as_string_column(values, string_dtype):
+    if string_dtype == "category":
+        return pd.Categorical(values)
+    elif string_dtype in ("arrow", "pyarrow"):
+        return pd.array(values, dtype="string[pyarrow]")
+    else:
+        return pd.array(values, dtype=string_dtype)
+
+
+def read_table_as_df(h5, tpath, string_dtype=None):
     """
     reads table as a pandas.DateFrame
     converts byte types to string and strips empty spaces
     all other types are kept as is
 
-    :param h5: [description]
-    :type h5: [type]
-    :param tpath: [description]
-    :type tpath: [type]
-    :return: [description]
-    :rtype: [type]
+    The dataset is read in one call and each field of the compound dtype is
+    sliced out column-wise, so the cost does not grow with per row python
+    work.
+
+    :param h5: open h5py file handle
+    :type h5: h5py.File
+    :param tpath: path to the table inside the file
+    :type tpath: str
+    :param string_dtype: None (default) keeps str columns as read, "category"
+        returns categorical columns and "arrow" (or "pyarrow") returns Arrow
+        backed string columns (requires pyarrow). Any other value is passed to
+        pandas.array as the dtype
+    :type string_dtype: str, optional
+    :return: table contents or None if the path does not exist
+    :rtype: pandas.DataFrame
     """
     x = h5.get(tpath)
     if x is None:
         return None
+    arr = x[()]
     if x.dtype.names:
-        result = pd.DataFrame(
-            [
-                [
-                    (
-                        v[k].astype(str).strip()
-                        if v.dtype.fields[k][0].name.startswith("bytes")
-                        else v[k]
-                    )
-                    for k in v.dtype.fields
-                ]
-                for v in x
-            ],
-            columns=[name for name in x.dtype.names],
-        )
-        result = result.astype(
-            dtype={
-                k: "unicode" if x.dtype[k].name.startswith("bytes") else x.dtype[k].name
-                for k in x.dtype.fields
-            }
-        )
+        columns = {}
+        dtypes = {}
+        for k in x.dtype.names:
+            col = arr[k]
+            if _is_bytes_dtype(x.dtype[k]):
+                col = decode_and_strip(col)
+                if string_dtype is None:
+                    dtypes[k] = "unicode"
+                else:
+                    col = _as_string_column(col, string_dtype)
+            else:
+                dtypes[k] = x.dtype[k].name
+            columns[k] = col
+        result = pd.DataFrame(columns, columns=list(x.dtype.names))
+        result = result.astype(dtype=dtypes)
+    elif _is_bytes_dtype(x.dtype):
+        arr = decode_and_strip(arr)
+        if string_dtype is None:
+            result = pd.DataFrame(arr)
+            result = result.astype(dtype="unicode")
+            result = strip(result)
+        else:
+            result = pd.DataFrame({0: _as_string_column(arr, string_dtype)})
     else:
-        result = pd.DataFrame(
-            [
-                v.astype(str).strip() if x.dtype.name.startswith("bytes") else v
-                for v in x
-            ]
-        )
-        result = result.astype(
-            dtype="unicode" if x.dtype.name.startswith("bytes") else x.dtype.name
-        )
-        result = strip(result)
+        # numeric tables are widened to 64 bits as the row wise reader did
+        if arr.dtype.kind in "fiu":
+            arr = arr.astype(arr.dtype.kind + "8")
+        result = pd.DataFrame(arr)
     return result
 
 
@@ -281,21 +317,109 @@ def read_attributes_from_table(data):
     }
 
 
-def read_time_indexed_table(h5, table_path, timewindow=None, *other_indices):
+# a sequence index is read as separate contiguous runs only if there are
+# at most this many runs and they cover less than this fraction of their span.
+# Otherwise the bounding slice is read in one call and subset in memory.
+_MAX_RUNS = 8
+_DENSE_FRACTION = 0.5
+
+
+def coalesce_indices(indices):
     """
-    returns a pandas DataFrame of time series from the table where
-     - the first index is time (if None retrieves the entire time window)
-        - specified as timewindow in the format of <<start time str>> - <<end time str>>, e.g. 01JAN1990 - 05JUL1992
-     - second index are the ids
-     - third index (if any) is the location identifier within the id aka 3rd dimension
+    sorts and de-duplicates indices and groups them into contiguous runs
 
-    The attributes of the HDF5 data sets contains "start_time" and "interval" for evenly spaced data. This is
-    used to infer the time window if none is given
+    :param indices: sequence of integer indices in any order, repeats allowed
+    :return: (unique, inverse, runs) where unique are the sorted unique indices,
+        unique[inverse] gives back the requested indices and runs is a list of
+        slices, one per contiguous run in unique
     """
-    data = h5.get(table_path)
-    #
-    attrs = read_attributes_from_table(data)
-    #
+    indices = np.asarray(indices, dtype=np.intp).ravel()
+    unique, inverse = np.unique(indices, return_inverse=True)
+    if len(unique) == 0:
+        return unique, inverse, []
+    breaks = np.flatnonzero(np.diff(unique) != 1) + 1
+    starts = np.concatenate(([0], breaks))
+    ends = np.concatenate((breaks, [len(unique)]))
+    runs = [slice(int(unique[s]), int(unique[e - 1]) + 1) for s, e in zip(starts, ends)]
+    return unique, inverse, runs
+
+
+def read_hyperslab(data, *indices):
+    """
+    reads data[indices] from a h5py dataset
+
+    Each index can be an int, a slice or a sequence of ints in any order (with
+    repeats). Sequences are sorted and coalesced into contiguous runs which are
+    read as plain slices, instead of h5py fancy (point) selection, and the
+    result is put back into the requested order. The returned array has the
+    same shape as numpy indexing would give.
+
+    data can also be a numpy.memmap (see get_memmap), which is read without
+    any h5py calls.
+    """
+    selection = []
+    takes = []  # (axis, positions) applied to the array that is read
+    runs_axis = None
+    runs_dim = None
+    axis = 0
+    for dim, index in enumerate(indices):
+        if isinstance(index, (int, np.integer)):
+            selection.append(int(index))
+            continue
+        if isinstance(index, slice):
+            selection.append(index)
+            axis += 1
+            continue
+        unique, inverse, runs = coalesce_indices(index)
+        if len(runs) == 0:
+            selection.append(slice(0, 0))
+        elif len(runs) == 1:
+            selection.append(runs[0])
+            if len(inverse) != len(unique) or np.any(np.diff(inverse) != 1):
+                takes.append((axis, inverse))
+        else:
+            span = runs[-1].stop - runs[0].start
+            if (
+                runs_axis is None
+                and len(runs) <= _MAX_RUNS
+                and len(unique) < _DENSE_FRACTION * span
+            ):
+                runs_axis, runs_dim = axis, dim
+                selection.append(runs)
+                takes.append((axis, inverse))
+            else:
+                selection.append(slice(runs[0].start, runs[-1].stop))
+                takes.append((axis, unique[inverse] - runs[0].start))
+        axis += 1
+    if runs_axis is None:
+        arr = data[tuple(selection)]
+    else:
+        pieces = []
+        for run in selection[runs_dim]:
+            run_selection = list(selection)
+            run_selection[runs_dim] = run
+            pieces.append(data[tuple(run_selection)])
+        arr = np.concatenate(pieces, axis=runs_axis)
+    for axis, positions in takes:
+        arr = np.take(arr, positions, axis=axis)
+    if isinstance(data, np.memmap):
+        # an in memory array, not a read only view of the map
+        arr = np.asarray(arr) if arr.flags.writeable else np.array(arr)
+    return arr
+
+
+def get_time_slice(data, timewindow=None, attrs=None):
+    """
+    returns the slice into the time (first) dimension of the table for the
+    timewindow and the time of the first row of that slice
+
+    :param data: h5py dataset with start_time and interval attributes
+    :param timewindow: <<start time str>> - <<end time str>> or None for all
+    :param attrs: attributes as returned by read_attributes_from_table, read
+        from data if not given
+    """
+    if attrs is None:
+        attrs = read_attributes_from_table(data)
     stime = pd.to_datetime(attrs["start_time"])
     # if start time and end time given use the slice
     if timewindow:
@@ -307,15 +431,574 @@ def read_time_indexed_table(h5, table_path, timewindow=None, *other_indices):
         timeSlice = slice(None)
     if timeSlice.start:
         stime = stime + pd.Timedelta(attrs["interval"]) * timeSlice.start
-    darr = data.__getitem__((timeSlice, *other_indices))
-    df = pd.DataFrame(
-        darr,
-        index=pd.date_range(stime, freq=attrs["interval"], periods=darr.shape[0]),
-        dtype=np.float32,
+    return timeSlice, stime
+
+
+@functools.lru_cache(maxsize=64)
+def get_time_index(start_time, interval, periods):
+    """
+    returns the (cached) pandas.DatetimeIndex for a table with the start_time,
+    interval and number of rows. Slices of it are views so callers pay for
+    the date_range only once per table layout.
+    """
+    return pd.date_range(start_time, freq=interval, periods=periods)
+
+
+def get_table_time_index(data, attrs=None):
+    """returns the DatetimeIndex for all rows of the time indexed table"""
+    if attrs is None:
+        attrs = read_attributes_from_table(data)
+    return get_time_index(attrs["start_time"], attrs["interval"], data.shape[0])
+
+
+def get_dimension_labels(data):
+    """
+    returns the names of the dimensions of the table, time first.
+
+    DSM2 writes these in Fortran order in the DIMENSION_LABELS attribute. If
+    that is missing the names are time, dim_1, dim_2, ...
+    """
+    labels = data.attrs.get("DIMENSION_LABELS")
+    if labels is not None and len(labels) == data.ndim:
+        labels = [decode_if_bytes(label) for label in labels]
+        if labels[-1] == "time":
+            labels = labels[::-1]
+        if labels[0] == "time":
+            return labels
+    return ["time"] + [f"dim_{i}" for i in range(1, data.ndim)]
+
+
+def _result_dimension_labels(data, other_indices):
+    """dimension labels left after indexing with other_indices (ints drop a dimension)"""
+    labels = get_dimension_labels(data)
+    dims = [
+        label
+        for label, index in zip(labels[1:], other_indices)
+        if not isinstance(index, (int, np.integer))
+    ]
+    return ["time"] + dims + labels[1 + len(other_indices) :]
+
+
+def to_dataarray(darr, index, dims, coords=None, name=None):
+    """
+    wraps the array of a time indexed table read in a xarray.DataArray
+    without copying. Requires xarray.
+
+    :param darr: array with time as the first dimension
+    :param index: DatetimeIndex for the time dimension
+    :param dims: names of all dimensions, starting with time
+    :param coords: optional dict of coordinates (dimension or scalar) to add
+    """
+    import xarray as xr
+
+    all_coords = {"time": index}
+    if coords:
+        all_coords.update(coords)
+    return xr.DataArray(darr, dims=dims, coords=all_coords, name=name)
+
+
+def to_lazy_dataarray(data, dims, coords=None, name=None, chunk="30D"):
+    """
+    wraps a whole time indexed table in a dask backed xarray.DataArray.
+    Nothing is read until the array is computed. Requires xarray and dask.
+
+    The dask chunks span get_time_block_rows rows (a whole number of HDF5
+    chunks) and the full extent of the other dimensions. Reads go through the
+    open h5py dataset under a lock, so compute with the default threaded
+    scheduler while the tidefile is open.
+
+    :param data: h5py dataset with time as the first dimension
+    :param dims: names of all dimensions, starting with time
+    :param coords: optional dict of coordinates to add
+    :param chunk: time block length, see get_time_block_rows
+    """
+    import dask.array as da
+    from dask.base import tokenize
+
+    attrs = read_attributes_from_table(data)
+    rows = get_time_block_rows(data, chunk, attrs)
+    darr = da.from_array(
+        data,
+        chunks=(rows,) + data.shape[1:],
+        lock=True,
+        name="dsm2h5-" + tokenize(data.file.filename, data.name, data.shape, rows),
     )
+    return to_dataarray(darr, get_table_time_index(data, attrs), dims, coords, name)
+
+
+# Memory mapped reads
+#
+# Contiguous, unfiltered datasets are stored as one block of bytes in the
+# file, so for files opened read only they can be read through a numpy
+# memmap of that block instead of h5py. The time indexed tables of such files
+# are looked up once per open file and slices of them are then served from
+# the map without any h5py calls. The maps are read only and backed by the
+# OS page cache, which they share with other processes reading the file.
+
+# id(h5py.File) -> {table path: (memmap or dataset, attributes)}
+_time_indexed_tables = {}
+
+
+def get_memmap(data):
+    """
+    returns a read only numpy.memmap of the h5py dataset if it is stored
+    contiguous and unfiltered, in a file opened read only with the default
+    driver, else None. The file stays mapped as long as the memmap is
+    referenced, so prefer get_time_indexed_table, which keeps one per open
+    file.
+    """
+    if (
+        data.chunks is not None
+        or data.is_virtual
+        or data.external
+        or data.dtype.hasobject
+        or data.size == 0
+        or data.file.mode != "r"
+        or data.file.driver != "sec2"
+    ):
+        return None
+    offset = data.id.get_offset()
+    if offset is None:  # storage not allocated
+        return None
+    return np.memmap(
+        data.file.filename, dtype=data.dtype, mode="r", offset=offset, shape=data.shape
+    )
+
+
+def get_time_indexed_table(h5, table_path):
+    """
+    returns the time indexed table as a memmap if possible (see get_memmap) or
+    else as the h5py dataset, and its attributes (see
+    read_attributes_from_table). For files opened read only both are looked up
+    once per open file and are released with it (see
+    release_time_indexed_tables).
+    """
+    tables = _time_indexed_tables.get(id(h5))
+    if tables is not None and table_path in tables:
+        return tables[table_path]
+    data = h5.get(table_path)
+    attrs = read_attributes_from_table(data)
+    if h5.file.mode != "r":
+        return data, attrs
+    if tables is None:
+        tables = _time_indexed_tables[id(h5)] = {}
+        weakref.finalize(h5, _time_indexed_tables.pop, id(h5), None)
+    memmap = get_memmap(data)
+    tables[table_path] = (data if memmap is None else memmap, attrs)
+    return tables[table_path]
+
+
+def release_time_indexed_tables(h5):
+    """
+    drops the tables looked up by get_time_indexed_table for the file, which
+    unmaps them once no array read from them is referenced any more. Call
+    before closing the file, e.g. so it can be deleted on Windows.
+    """
+    _time_indexed_tables.pop(id(h5), None)
+
+
+def read_time_indexed_table(
+    h5,
+    table_path,
+    timewindow=None,
+    *other_indices,
+    as_array=False,
+    as_xarray=False,
+    dims=None,
+    coords=None,
+    columns=None,
+):
+    """
+    returns a pandas DataFrame of time series from the table where
+     - the first index is time (if None retrieves the entire time window)
+        - specified as timewindow in the format of <<start time str>> - <<end time str>>, e.g. 01JAN1990 - 05JUL1992
+     - second index are the ids
+     - third index (if any) is the location identifier within the id aka 3rd dimension
+
+    The attributes of the HDF5 data sets contains "start_time" and "interval" for evenly spaced data. This is
+    used to infer the time window if none is given
+
+    The other indices can be given in any order and may repeat (see read_hyperslab)
+
+    Contiguous, unfiltered tables of files opened read only are read through a
+    memory map (see get_time_indexed_table). Other tables are read through the
+    block cache if it is enabled (see enable_block_cache).
+
+    If as_array is True the array as read is returned without any pandas
+    wrapping. If as_xarray is True a xarray.DataArray over the same array is
+    returned with a time coordinate. Its dimensions are named from dims (the
+    non time dimensions) or else from the table's DIMENSION_LABELS and coords
+    can supply the other coordinates.
+
+    If columns is given, the dimensions after time are flattened (in C order)
+    into these DataFrame columns, e.g. a pandas.MultiIndex.from_product of the
+    labels of the indices read.
+    """
+    data, attrs = get_time_indexed_table(h5, table_path)
+    timeSlice, _ = get_time_slice(data, timewindow, attrs)
+    darr = read_table_slice(data, attrs, timeSlice, *other_indices)
+    if as_array:
+        return darr
+    index = get_table_time_index(data, attrs)[timeSlice]
+    if as_xarray:
+        if dims is None:
+            dims = _result_dimension_labels(h5.get(table_path), other_indices)
+        else:
+            dims = ["time"] + list(dims)
+        return to_dataarray(darr, index, dims, coords)
+    if columns is not None:
+        darr = darr.reshape(darr.shape[0], -1)
+    df = pd.DataFrame(darr, index=index, columns=columns, dtype=np.float32, copy=False)
     return df
 
 
+# Block cache
+#
+# An optional process wide LRU cache of blocks of time indexed tables, for
+# tools that read the same time windows and channels again and again. Reads
+# are split into blocks of whole HDF5 chunks along time and each block is
+# cached for the set of other indices read, keyed by the file path and
+# modification time, so a rewritten file is never served stale blocks.
+
+
+class BlockCache:
+    """
+    LRU cache of numpy blocks bounded by their size in bytes, with an optional
+    diskcache tier that outlives the process and is shared by every process
+    using the same directory.
+
+    hits, disk_hits, misses and evictions count the lookups and evictions of
+    the memory tier (see stats).
+    """
+
+    def __init__(
+        self, max_bytes=2**28, cache_dir=None, disk_size_limit=2**32, block="30D"
+    ):
+        """
+        :param max_bytes: bound on the bytes of the blocks held in memory
+        :param cache_dir: directory of the diskcache tier, None for no disk tier
+        :param disk_size_limit: bound on the bytes of the disk tier
+        :param block: time length of a block (see get_time_block_rows)
+        """
+        self.max_bytes = max_bytes
+        self.block = block
+        self.disk = None
+        if cache_dir is not None:
+            self.disk = diskcache.Cache(
+                cache_dir,
+                size_limit=disk_size_limit,
+                eviction_policy="least-recently-used",
+            )
+        self._blocks = collections.OrderedDict()
+        self._nbytes = 0
+        self._lock = threading.Lock()
+        self.hits = self.disk_hits = self.misses = self.evictions = 0
+
+    def get(self, key):
+        """the block for the key or None"""
+        with self._lock:
+            block = self._blocks.get(key)
+            if block is not None:
+                self._blocks.move_to_end(key)
+                self.hits += 1
+                return block
+        if self.disk is not None:
+            block = self.disk.get(key)
+            if block is not None:
+                with self._lock:
+                    self.disk_hits += 1
+                    self._put(key, block)
+                return block
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key, block):
+        with self._lock:
+            self._put(key, block)
+        if self.disk is not None:
+            self.disk.set(key, block)
+
+    def _put(self, key, block):
+        if block.nbytes > self.max_bytes:
+            return
+        old = self._blocks.pop(key, None)
+        if old is not None:
+            self._nbytes -= old.nbytes
+        self._blocks[key] = block
+        self._nbytes += block.nbytes
+        while self._nbytes > self.max_bytes:
+            _, evicted = self._blocks.popitem(last=False)
+            self._nbytes -= evicted.nbytes
+            self.evictions += 1
+
+    def stats(self):
+        """dict of the hit, disk hit, miss and eviction counts and the size"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "blocks": len(self._blocks),
+                "nbytes": self._nbytes,
+            }
+
+    def clear(self):
+        """empty both tiers and reset the counters"""
+        with self._lock:
+            self._blocks.clear()
+            self._nbytes = 0
+            self.hits = self.disk_hits = self.misses = self.evictions = 0
+        if self.disk is not None:
+            self.disk.clear()
+
+    def close(self):
+        if self.disk is not None:
+            self.disk.close()
+
+
+_block_cache = None
+
+
+def enable_block_cache(
+    max_bytes=2**28, cache_dir=None, disk_size_limit=2**32, block="30D"
+):
+    """
+    enable the block cache for reads of time indexed tables (see BlockCache
+    for the parameters), replacing any cache enabled before. Returns the cache.
+    """
+    global _block_cache
+    disable_block_cache()
+    _block_cache = BlockCache(max_bytes, cache_dir, disk_size_limit, block)
+    return _block_cache
+
+
+def disable_block_cache():
+    global _block_cache
+    if _block_cache is not None:
+        _block_cache.close()
+    _block_cache = None
+
+
+def get_block_cache():
+    """the enabled BlockCache or None"""
+    return _block_cache
+
+
+def _index_key(index):
+    if isinstance(index, (int, np.integer)):
+        return int(index)
+    if isinstance(index, slice):
+        return ("slice", index.start, index.stop, index.step)
+    return tuple(np.asarray(index, dtype=np.intp).ravel().tolist())
+
+
+def read_table_slice(data, attrs, time_slice, *other_indices):
+    """
+    reads data[time_slice, *other_indices] from the time indexed table (h5py
+    dataset or memmap, see get_time_indexed_table), through the block cache
+    if it is enabled and data is an h5py dataset
+    """
+    cache = _block_cache
+    if cache is None or isinstance(data, np.memmap):
+        return read_hyperslab(data, time_slice, *other_indices)
+    start, stop, step = time_slice.indices(data.shape[0])
+    if step != 1 or stop <= start:
+        return read_hyperslab(data, time_slice, *other_indices)
+    filename = os.path.abspath(data.file.filename)
+    prefix = (
+        filename,
+        os.stat(filename).st_mtime_ns,
+        data.name,
+        tuple(_index_key(i) for i in other_indices),
+    )
+    rows = get_time_block_rows(data, cache.block, attrs)
+    first = start // rows
+    pieces = []
+    for block in range(first, (stop - 1) // rows + 1):
+        key = prefix + (rows, block)
+        piece = cache.get(key)
+        if piece is None:
+            block_slice = slice(block * rows, min((block + 1) * rows, data.shape[0]))
+            piece = read_hyperslab(data, block_slice, *other_indices)
+            cache.set(key, piece)
+        pieces.append(piece)
+    # a copy so callers cannot change the cached blocks
+    return np.concatenate(pieces)[start - first * rows : stop - first * rows]
+
+
+def get_time_block_rows(data, chunk="30D", attrs=None):
+    """
+    number of rows (time steps) to read per block when streaming the table
+
+    The block is rounded down to a whole number of the dataset's HDF5 chunks
+    along time (and is at least one chunk) so that no chunk is decompressed
+    twice.
+
+    :param data: h5py dataset with start_time and interval attributes
+    :param chunk: block length as a duration convertible to pandas.Timedelta
+        (e.g. "30D"), an int number of rows, or None for one HDF5 chunk
+    """
+    chunk_rows = data.chunks[0] if data.chunks else 1
+    if chunk is None:
+        return chunk_rows
+    if isinstance(chunk, (int, np.integer)):
+        rows = int(chunk)
+    else:
+        if attrs is None:
+            attrs = read_attributes_from_table(data)
+        rows = int(pd.Timedelta(chunk) / pd.Timedelta(attrs["interval"]))
+    return max(chunk_rows, (rows // chunk_rows) * chunk_rows)
+
+
+def iter_time_slices(data, timewindow=None, chunk="30D", attrs=None):
+    """
+    yields slices along the time (first) dimension of the table covering the
+    timewindow in blocks of get_time_block_rows rows. Block boundaries are at
+    multiples of the block size from the start of the table, so every block
+    except possibly the first and last is aligned with the HDF5 chunks.
+    """
+    if attrs is None:
+        attrs = read_attributes_from_table(data)
+    time_slice, _ = get_time_slice(data, timewindow, attrs)
+    start, stop, _ = time_slice.indices(data.shape[0])
+    rows = get_time_block_rows(data, chunk, attrs)
+    block_start = start
+    while block_start < stop:
+        block_end = min(stop, (block_start // rows + 1) * rows)
+        yield slice(block_start, block_end)
+        block_start = block_end
+
+
+def iter_time_indexed_table(
+    h5, table_path, timewindow=None, *other_indices, chunk="30D", columns=None
+):
+    """
+    generator version of read_time_indexed_table. Yields time indexed
+    DataFrames of consecutive blocks of the timewindow (see iter_time_slices
+    for chunk), so only one block is held in memory at a time. columns are
+    as for read_time_indexed_table.
+    """
+    data = h5.get(table_path)
+    source, attrs = get_time_indexed_table(h5, table_path)
+    index = get_table_time_index(data, attrs)
+    for time_slice in iter_time_slices(data, timewindow, chunk, attrs):
+        darr = read_hyperslab(source, time_slice, *other_indices)
+        if columns is not None:
+            darr = darr.reshape(darr.shape[0], -1)
+        yield pd.DataFrame(
+            darr, index=index[time_slice], columns=columns, dtype=np.float32, copy=False
+        )
+
+
+# Catalog reads
+#
+# A catalog entry is one column of a time indexed table: an index along each
+# dimension after time. Entries that differ only along one of those (e.g.
+# the channel) are read together in one hyperslab read.
+
+ColumnRequest = collections.namedtuple(
+    "ColumnRequest", ["table_path", "indices", "axis", "column", "offset"]
+)
+ColumnRequest.__doc__ = """
+one column of a time indexed table: the index along each dimension after time,
+the dimension (axis into indices) along which requests are read together, the
+column name of the result and a value added to it (e.g. the channel bottom)
+"""
+
+
+def iter_column_groups(h5, requests, timewindow=None):
+    """
+    read the ColumnRequests with one read per group of requests that differ
+    only along their axis, yielding the positions of the requests in the
+    group, the time index and the (time, request) values with their offsets
+    """
+    groups = {}
+    for i, request in enumerate(requests):
+        fixed = request.indices[: request.axis] + request.indices[request.axis + 1 :]
+        key = (request.table_path, request.axis, fixed)
+        groups.setdefault(key, []).append(i)
+    for (table_path, axis, fixed), members in groups.items():
+        data, attrs = get_time_indexed_table(h5, table_path)
+        time_slice, _ = get_time_slice(data, timewindow, attrs)
+        wanted = [requests[i].indices[axis] for i in members]
+        unique = np.unique(wanted)
+        other = list(fixed)
+        other.insert(axis, unique.tolist())
+        darr = read_table_slice(data, attrs, time_slice, *other)
+        values = darr[:, np.searchsorted(unique, wanted)]
+        offsets = np.array([requests[i].offset for i in members], dtype=darr.dtype)
+        if offsets.any():
+            values += offsets
+        yield members, get_table_time_index(data, attrs)[time_slice], values
+
+
+def read_column_requests(h5, requests, timewindow=None):
+    """
+    read the ColumnRequests (see iter_column_groups), returning a one column
+    DataFrame per request
+    """
+    frames = [None] * len(requests)
+    for members, index, values in iter_column_groups(h5, requests, timewindow):
+        for i, column in zip(members, values.T):
+            frames[i] = pd.DataFrame(
+                {requests[i].column: column}, index=index, dtype=np.float32
+            )
+    return frames
+
+
+def get_data_for_catalog(tidef, catalog, time_window=None, as_dict=False):
+    """
+    data for the entries of the catalog of a HydroH5 or QualH5 tidefile
+
+    :param tidef: HydroH5 or QualH5, which maps a catalog entry to a
+        ColumnRequest with _catalog_column_request
+    :param catalog: DataFrame of catalog entries (see create_catalog)
+    :param time_window: optional DSM2 style window "START-END"
+    :param as_dict: return a dict of (id, variable) to DataFrame instead
+    :return: DataFrame with an (id, variable) column per entry
+    """
+    entries = catalog[["id", "variable"]].to_dict("records")
+    requests = [tidef._catalog_column_request(entry) for entry in entries]
+    if as_dict:
+        frames = read_column_requests(tidef.h5, requests, time_window)
+        keys = zip(catalog["id"], catalog["variable"])
+        return dict(zip(keys, frames))
+    columns = pd.MultiIndex.from_arrays(
+        [catalog["id"].to_numpy(), catalog["variable"].to_numpy()],
+        names=["id", "variable"],
+    )
+    groups = list(iter_column_groups(tidef.h5, requests, time_window))
+    if not groups:
+        return pd.DataFrame(columns=columns, dtype=np.float32)
+    index = groups[0][1]
+    if all(group_index.equals(index) for _, group_index, _ in groups):
+        # the usual case of tables on the same time steps, filled in place
+        values = np.empty((len(index), len(requests)), dtype=np.float32)
+        for members, _, group_values in groups:
+            values[:, members] = group_values
+        return pd.DataFrame(values, index=index, columns=columns, copy=False)
+    df = pd.concat(
+        [
+            pd.DataFrame(group_values, index=group_index, columns=members)
+            for members, group_index, group_values in groups
+        ],
+        axis=1,
+    )
+    df = df[list(range(len(requests)))].astype(np.float32)
+    df.columns = columns
+    return df
+
+
+def get_position(values, name, kind):
+    """position of name in values (of a table column) or a KeyError"""
+    positions = np.flatnonzero(np.asarray(values).astype(str) == name)
+    if len(positions) == 0:
+        raise KeyError(f"{kind} {name} not found")
+    return int(positions[0])
+
+
 # Utility funcs
 
 
@@ -367,6 +1050,43 @@ def create_catalog_entry(
     return catalog.reset_index(drop=True)
 
 
+def get_catalog_cache_dir(filename):
+    """directory of the catalog cache shared by the tidefiles next to filename"""
+    return os.path.join(os.path.dirname(os.path.abspath(filename)), ".cache-catalog")
+
+
+def get_cached_catalog(filename, build_catalog, cache_dir=None):
+    """
+    returns the catalog of the tidefile from an on-disk diskcache, calling
+    build_catalog() to create (and store) it when the file has no entry or has
+    been modified since the entry was stored.
+
+    Entries are keyed by the absolute path of the tidefile and hold its
+    modification time and size, so each file has at most one entry. If the
+    cache directory cannot be created or opened the catalog is built as usual.
+
+    :param filename: tidefile the catalog is for
+    :param build_catalog: callable returning the catalog DataFrame
+    :param cache_dir: cache directory, defaults to get_catalog_cache_dir
+    """
+    path = os.path.abspath(filename)
+    stat = os.stat(path)
+    signature = (stat.st_mtime_ns, stat.st_size)
+    try:
+        cache = diskcache.Cache(cache_dir or get_catalog_cache_dir(filename))
+    except (OSError, sqlite3.Error):
+        return build_catalog()
+    with cache:
+        entry = cache.get(path)
+        if entry is not None and entry[0] == signature:
+            catalog = entry[1]
+            catalog["filename"] = filename
+        else:
+            catalog = build_catalog()
+            cache.set(path, (signature, catalog))
+    return catalog
+
+
 def decode_if_bytes(x):
     if isinstance(x, bytes):
         try:
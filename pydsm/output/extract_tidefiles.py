@@ -0,0 +1,352 @@
+"""
+Parallel extraction of the same channel time series from many tidefiles.
+
+`extract_tidefiles` reads a channel variable (hydro) or constituent (qual)
+for a set of channels from each tidefile (study) and writes them to one
+output keyed by study:
+
+    .parquet    one table with study, time and one column per channel
+    .h5/.hdf5   one dataset per study shaped (time, channel) with the
+                start_time and interval attributes and the channel names
+
+h5py serializes reads within a process, so the tidefiles are read in a
+process pool. The work is split into blocks of time steps and only a bounded
+number of blocks are in flight at once, so memory use does not depend on the
+number or length of the tidefiles.
+"""
+
+import concurrent.futures
+import functools
+import glob
+import os
+
+import click
+import h5py
+import numpy as np
+import pandas as pd
+
+from pydsm.output import dsm2h5
+from pydsm.output.hydroh5 import HydroH5
+from pydsm.output.tidefile_pool import get_tidefile_pool
+
+# number of blocks in flight per worker
+_BLOCKS_PER_WORKER = 2
+
+
+def get_study_names(files):
+    """
+    study names for the tidefiles: the file name without extension, prefixed
+    with its directory name where that is needed to tell the files apart
+    """
+    names = [os.path.splitext(os.path.basename(f))[0] for f in files]
+    if len(set(names)) == len(names):
+        return names
+    return [
+        os.path.basename(os.path.dirname(os.path.abspath(f))) + "_" + name
+        for f, name in zip(files, names)
+    ]
+
+
+def _table_path(model, variable, location):
+    # no reader is opened here so that forked workers inherit no open files
+    if model == "hydro":
+        return HydroH5._channel_table_path(variable)
+    elif location is None:
+        return "/output/channel avg concentration"
+    else:
+        return "/output/channel concentration"
+
+
+def _timewindow(index, interval, time_slice):
+    """DSM2 style timewindow covering exactly the rows of the slice"""
+    start = index[time_slice.start]
+    end = start + pd.Timedelta(interval) * (time_slice.stop - time_slice.start)
+    return f"{start:%d%b%Y %H%M} - {end:%d%b%Y %H%M}"
+
+
+def get_extract_tasks(
+    studies, variable, location="upstream", timewindow=None, chunk="365D"
+):
+    """
+    split the extraction into blocks of time steps
+
+    :param studies: dict of study name to tidefile
+    :return: list of (study, filename, timewindow, row offset in the study)
+        tuples and a dict of study name to (number of rows, start time,
+        interval)
+    """
+    tasks = []
+    extents = {}
+    for study, filename in studies.items():
+        with h5py.File(filename, "r") as h5:
+            model = dsm2h5.get_model(h5)
+            data = h5.get(_table_path(model, variable, location))
+            if data is None:
+                raise ValueError(f"{filename} has no data for {variable}")
+            attrs = dsm2h5.read_attributes_from_table(data)
+            index = dsm2h5.get_table_time_index(data, attrs)
+            first = None
+            for time_slice in dsm2h5.iter_time_slices(data, timewindow, chunk, attrs):
+                first = time_slice.start if first is None else first
+                tasks.append(
+                    (
+                        study,
+                        filename,
+                        _timewindow(index, attrs["interval"], time_slice),
+                        time_slice.start - first,
+                    )
+                )
+            rows = 0 if first is None else time_slice.stop - first
+            start_time = index[first] if rows else attrs["start_time"]
+            extents[study] = (rows, start_time, attrs["interval"])
+    return tasks, extents
+
+
+def read_block(filename, variable, channels, location, timewindow):
+    """
+    read the channels for the timewindow from the tidefile. variable is flow,
+    area, stage or avg area for hydro and the constituent name for qual.
+    """
+    # kept open in the (worker) process for the blocks that follow
+    tidef = get_tidefile_pool().get(filename)
+    if isinstance(tidef, HydroH5):
+        return tidef.read_many([(variable, channels, location)], timewindow)[0]
+    elif location is None:
+        return tidef.get_channel_avg_concentration(variable, channels, timewindow)
+    else:
+        return tidef.get_channel_concentration(variable, channels, location, timewindow)
+
+
+def _read_task(task, variable, channels, location):
+    study, filename, timewindow, offset = task
+    return study, offset, read_block(filename, variable, channels, location, timewindow)
+
+
+def _iter_results(read, tasks, jobs):
+    """
+    results of read for the tasks in order of completion, with at most
+    _BLOCKS_PER_WORKER tasks per worker submitted but not yet consumed
+    """
+    if jobs == 1:
+        yield from map(read, tasks)
+        return
+    jobs = jobs or os.cpu_count() or 1
+    with concurrent.futures.ProcessPoolExecutor(jobs) as pool:
+        pending = set()
+        for task in tasks:
+            pending.add(pool.submit(read, task))
+            if len(pending) < jobs * _BLOCKS_PER_WORKER:
+                continue
+            finished, pending = concurrent.futures.wait(
+                pending, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in finished:
+                yield future.result()
+        for future in concurrent.futures.as_completed(pending):
+            yield future.result()
+
+
+class _ParquetOutput:
+    def __init__(self, filename, extents):
+        self.filename = filename
+        self.writer = None
+
+    def write(self, study, offset, df):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        df = df.rename_axis("time").reset_index()
+        df.insert(0, "study", study)
+        if self.writer is None:
+            schema = pa.Schema.from_pandas(df, preserve_index=False)
+            self.writer = pq.ParquetWriter(self.filename, schema, compression="zstd")
+        self.writer.write_table(
+            pa.Table.from_pandas(df, schema=self.writer.schema, preserve_index=False)
+        )
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+class _HDF5Output:
+    def __init__(self, filename, extents):
+        self.h5 = h5py.File(filename, "w")
+        self.extents = extents
+
+    def write(self, study, offset, df):
+        if study not in self.h5:
+            rows, start_time, interval = self.extents[study]
+            data = self.h5.create_dataset(
+                study,
+                shape=(rows, df.shape[1]),
+                dtype=np.float32,
+                chunks=(min(rows, max(1, len(df))), df.shape[1]),
+                compression="gzip",
+                shuffle=True,
+            )
+            data.attrs["start_time"] = np.array([str(start_time).encode("utf-8")])
+            data.attrs["interval"] = np.array([interval.encode("utf-8")])
+            data.attrs["columns"] = np.array([c.encode("utf-8") for c in df.columns])
+        self.h5[study][offset : offset + len(df)] = df.to_numpy(dtype=np.float32)
+
+    def close(self):
+        self.h5.close()
+
+
+def _get_output(outfile, extents):
+    ext = os.path.splitext(outfile)[1].lower()
+    if ext == ".parquet":
+        return _ParquetOutput(outfile, extents)
+    elif ext in (".h5", ".hdf5"):
+        return _HDF5Output(outfile, extents)
+    raise ValueError(f"output should end in .parquet, .h5 or .hdf5: {outfile}")
+
+
+def extract_tidefiles(
+    files,
+    channels,
+    variable="flow",
+    location="upstream",
+    timewindow=None,
+    outfile="extract.parquet",
+    jobs=None,
+    chunk="365D",
+    progress=None,
+):
+    """
+    Extract the same channel time series from many tidefiles into one output.
+
+    Parameters
+    ----------
+    files : list[str] | dict[str, str]
+        Tidefiles, or a dict of study name to tidefile. By default the study
+        names are the file names (see get_study_names).
+    channels : str | list[str]
+        Channel numbers or "all".
+    variable : str, default "flow"
+        flow, area, stage or avg area for hydro tidefiles; the constituent
+        name (e.g. "ec") for qual tidefiles.
+    location : str | None, default "upstream"
+        "upstream" or "downstream", or None for avg area and avg
+        concentration.
+    timewindow : str | None
+        Optional DSM2 style window "START-END".
+    outfile : str, default "extract.parquet"
+        Output ending in .parquet (requires pyarrow), .h5 or .hdf5.
+    jobs : int | None
+        Number of worker processes, defaults to the number of CPUs. With 1 the
+        tidefiles are read in this process.
+    chunk : str | int, default "365D"
+        Time length of the blocks read at a time (see
+        dsm2h5.get_time_block_rows).
+    progress : callable | None
+        Called with the number of blocks done and the total after each block.
+
+    Returns
+    -------
+    str
+        outfile
+    """
+    if not isinstance(files, dict):
+        files = dict(zip(get_study_names(files), files))
+    if location is None and variable in ("flow", "area", "stage"):
+        raise ValueError(f"a location is needed for {variable}")
+    if location is not None and variable == "avg area":
+        location = None
+    tasks, extents = get_extract_tasks(files, variable, location, timewindow, chunk)
+    output = _get_output(outfile, extents)
+    read = functools.partial(
+        _read_task, variable=variable, channels=channels, location=location
+    )
+    try:
+        for done, result in enumerate(_iter_results(read, tasks, jobs), 1):
+            output.write(*result)
+            if progress:
+                progress(done, len(tasks))
+    finally:
+        output.close()
+    return outfile
+
+
+def expand_file_patterns(patterns):
+    """expand glob patterns (for shells that do not) keeping the given order"""
+    files = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+        if not matches:
+            raise click.BadParameter(f"no files match {pattern}")
+        files.extend(matches)
+    return files
+
+
+@click.command(name="extract-tidefiles")
+@click.argument("files", nargs=-1, required=True)
+@click.option(
+    "--channels",
+    required=True,
+    help="Comma separated channel numbers, e.g. 441,1,2 or all.",
+)
+@click.option(
+    "--variable",
+    default="flow",
+    show_default=True,
+    help="flow, area, stage or 'avg area' for hydro; constituent (e.g. ec) for qual.",
+)
+@click.option(
+    "--location",
+    default="upstream",
+    show_default=True,
+    type=click.Choice(["upstream", "downstream", "none"]),
+    help="Channel end, none for average values.",
+)
+@click.option(
+    "--timewindow",
+    default=None,
+    help='Time window, e.g. "01JAN2014 - 01JAN2015" (quoted on command line)',
+)
+@click.option(
+    "-o",
+    "--output",
+    default="extract.parquet",
+    show_default=True,
+    help="Output file (.parquet, .h5 or .hdf5).",
+)
+@click.option(
+    "-j", "--jobs", default=None, type=int, help="Worker processes [default: CPUs]"
+)
+@click.option(
+    "--chunk",
+    default="365D",
+    show_default=True,
+    help="Time length of the blocks read at a time.",
+)
+def extract_tidefiles_cmd(
+    files, channels, variable, location, timewindow, output, jobs, chunk
+):
+    """Extract the same channels from many hydro or qual tidefiles.
+
+    FILES: Tidefiles or glob patterns (e.g. "runs/*.h5"). Each file is a study
+    keyed by its file name in the output.
+    """
+    files = expand_file_patterns(files)
+    if channels.lower() != "all":
+        channels = [c.strip() for c in channels.split(",")]
+    with click.progressbar(length=1, label="Extracting") as bar:
+
+        def progress(done, total):
+            bar.length = total
+            bar.update(1)
+
+        extract_tidefiles(
+            files,
+            channels,
+            variable=variable,
+            location=None if location == "none" else location,
+            timewindow=timewindow,
+            outfile=output,
+            jobs=jobs,
+            chunk=chunk,
+            progress=progress,
+        )
+    click.echo(f"Wrote {len(files)} studies to: {output}")
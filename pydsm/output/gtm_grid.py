@@ -5,8 +5,12 @@ import pandas as pd
 from io import StringIO 
 import numpy as np
 import h5py
+from collections import namedtuple
 from pydsm.input import parser
 
+NodeAdjacency = namedtuple('NodeAdjacency',
+                           ['nodes', 'up_ptr', 'upcells', 'down_ptr', 'downcells'])
+
 class gtm_grid:
    def __init__(self,hdf_fn,hydro_echo_fn):
       self.hdf_fn = hdf_fn
@@ -21,6 +25,8 @@ class gtm_grid:
       self._ncell = None
       self._res_name = None
       self._nres = None
+      self._cell_search = None
+      self._adjacency = None
 
    @property
    def segments(self):
@@ -98,36 +104,60 @@ class gtm_grid:
       self._segments = df_seg
 
    def cell_dataframe(self):
+      """
+      Create the cell table from the segments, each segment of nx cells
+      numbered from its start_cell_no
+      """
       df_seg = self.segments
       ncell = int(df_seg.iloc[-1]['end_cell_no'])
-      cells = np.linspace(1, ncell, ncell).astype(int)
-      v = np.asarray([df_seg[(df_seg.start_cell_no<=i) & 
-                          (df_seg.end_cell_no>=i) ][['segm_no','chan_num','chan_no']].values[0] for i in cells])
-      segm_no = v[:,0]
-      chan_num = v[:,1]
-      chan_no = v[:,2]
-
-      start_distance = []
-      end_distance = []
-      for i in cells:
-         chan_i = chan_num[i-1]
-         segm_i = segm_no[i-1]
-         df_seg_i = df_seg[df_seg.segm_no==segm_i]
-         dx_i = df_seg_i['delta_x'].values[0]    
-         start_cell_no_i = df_seg_i['start_cell_no'].values[0]
-         up_distance_i = df_seg_i['up_distance'].values[0]
-         start_distance_i = (i - start_cell_no_i)*dx_i + up_distance_i
-         start_distance.append(start_distance_i)
-         end_distance.append(start_distance_i+dx_i)
+      cells = np.arange(1, ncell+1)
+      nx = df_seg['nx'].values.astype(np.int64)
+      start_cell_no = df_seg['start_cell_no'].values.astype(np.int64)
+      # segment and position within it of each cell of each segment
+      seg_of = np.repeat(np.arange(len(df_seg)), nx)
+      offset = np.arange(nx.sum()) - np.repeat(np.cumsum(nx)-nx, nx)
+      seg_cells = np.repeat(start_cell_no, nx) + offset
+      # a cell in more than one segment belongs to the first of them
+      keep = (seg_cells>=1) & (seg_cells<=ncell)
+      seg_cells, seg_of, offset = seg_cells[keep], seg_of[keep], offset[keep]
+      first = np.unique(seg_cells, return_index=True)[1]
+      if len(first) != ncell:
+         raise ValueError('cells 1 to %d are not all in a segment'%ncell)
+      seg = seg_of[first]
+      dx = df_seg['delta_x'].values[seg]
+      start_distance = offset[first]*dx + df_seg['up_distance'].values[seg]
       df_cell = pd.DataFrame()
       df_cell['cell']= cells
-      df_cell['segm_no']=segm_no.astype(int)
-      df_cell['chan_num'] = chan_num.astype(int)
-      df_cell['chan_no'] = chan_no.astype(int)
+      df_cell['segm_no']=df_seg['segm_no'].values[seg].astype(int)
+      df_cell['chan_num'] = df_seg['chan_num'].values[seg].astype(int)
+      df_cell['chan_no'] = df_seg['chan_no'].values[seg].astype(int)
       df_cell['start_distance'] = np.float32(start_distance)
-      df_cell['end_distance'] = np.float32(end_distance)   
+      df_cell['end_distance'] = np.float32(start_distance+dx)
       self._cells = df_cell
       self._ncell = ncell
+      self._cell_search = None
+
+   def _channel_cell_search(self):
+      """
+      the order of the cells sorted by channel and end distance, the channels
+      with the position and number of their cells in that order and the
+      sorted search key of channel and end distance
+      """
+      if self._cell_search is None:
+         df_cell = self.cells
+         chan = df_cell['chan_num'].values
+         end = df_cell['end_distance'].values.astype(np.float64)
+         order = np.lexsort((df_cell['cell'].values, end, chan))
+         channels, first, count = np.unique(chan[order], return_index=True,
+                                            return_counts=True)
+         # channel rank times a span longer than any channel plus the end
+         # distance orders the cells like (channel, end distance). Distances
+         # are float32 so the float64 sum keeps them apart.
+         span = 2.0*max(1.0, float(np.abs(end).max(initial=0)))+1.0
+         rank = np.repeat(np.arange(len(channels)), count)
+         key = rank*span + end[order]
+         self._cell_search = (order, channels, first, count, span, key)
+      return self._cell_search
 
    def channel_to_cell(self, chan_no,distance):
       """
@@ -135,32 +165,49 @@ class gtm_grid:
       distance could be a numeric value indicating distance
       or a string 'length' indicate the maximum length. 
       """
-      df_cell = self.cells
-      try:
-         distance = np.float32(distance)
-         if distance == 0:
-            # note that 'chan_no' in input files = 'chan_num' in internal dsm2. 
-            df_i = df_cell[ (df_cell.chan_num==chan_no) ].iloc[0] # use the first cell
-            cell_no = int(df_i.cell)
-         else: 
-            df_i = df_cell[ (df_cell.chan_num==chan_no) & \
-                            (df_cell.start_distance<distance) & \
-                            (df_cell.end_distance>=distance)]
-            cell_no = int(df_i.cell.values[0])
-      except ValueError:
-         if distance == 'length':
-            df_i = df_cell[ (df_cell.chan_num==chan_no) ].iloc[-1] # use the last cell
-            cell_no = int(df_i.cell)
-         else:
-            raise Exception('%s is not recognized in the obs_fn'%distance) 
-      return cell_no
+      return int(self.channel_to_cell_arr([chan_no], [distance])[0])
 
    def channel_to_cell_arr(self, chan_no_arr, distance_arr):
-      cells = []
-      for c, d in zip(chan_no_arr,distance_arr):
-         cell_no = self.channel_to_cell(c,d)
-         cells.append(cell_no)
-      return cells     
+      """
+      convert arrays of chan_no, distance pairs to an array of cell numbers
+      (see channel_to_cell), searching the cells of each channel sorted by
+      distance
+      """
+      # note that 'chan_no' in input files = 'chan_num' in internal dsm2.
+      chan_no_arr = np.asarray(chan_no_arr).astype(np.int64)
+      distance_arr = np.asarray(distance_arr, dtype=object)
+      distance = pd.to_numeric(pd.Series(distance_arr), errors='coerce')
+      distance = distance.values.astype(np.float32)
+      is_length = np.isnan(distance) & (distance_arr.astype(str) == 'length')
+      unknown = np.isnan(distance) & ~is_length
+      if unknown.any():
+         raise Exception('%s is not recognized in the obs_fn'%distance_arr[unknown][0])
+      order, channels, first, count, span, key = self._channel_cell_search()
+      rank = np.searchsorted(channels, chan_no_arr)
+      rank = np.minimum(rank, len(channels)-1)
+      found = channels[rank] == chan_no_arr
+      if not found.all():
+         raise ValueError('channel %d has no cells'%chan_no_arr[~found][0])
+      # first cell with end_distance >= distance (start_distance < distance)
+      pos = np.searchsorted(key, rank*span + distance.astype(np.float64))
+      pos = np.clip(pos, first[rank], first[rank]+count[rank]-1)
+      df_cell = self.cells
+      cells = df_cell['cell'].values[order]
+      start = df_cell['start_distance'].values[order]
+      end = df_cell['end_distance'].values[order]
+      missing = ~((start[pos] < distance) & (end[pos] >= distance))
+      # distance 0 is the first and 'length' the last cell of the channel
+      chan_first = np.minimum.reduceat(cells, first)
+      chan_last = np.maximum.reduceat(cells, first)
+      result = cells[pos]
+      result = np.where(distance == 0, chan_first[rank], result)
+      result = np.where(is_length, chan_last[rank], result)
+      missing &= (distance != 0) & ~is_length
+      if missing.any():
+         i = np.flatnonzero(missing)[0]
+         raise ValueError('no cell of channel %d at distance %s'%(
+            chan_no_arr[i], distance_arr[i]))
+      return result.astype(int)
 
    def obs_cells(self,fn,unique=False):
       """
@@ -207,89 +254,72 @@ class gtm_grid:
       Create a cell table with upnodes and downnodes
       """
       df_cell = self.cells
-      channel_tables = self.channels
+      channel_tables = self.channels.drop_duplicates('CHAN_NO')
+      chan_num = df_cell.chan_num.values
       cells = df_cell.cell.values
-      cell_upnode = []
-      cell_downnode = []
-      for c in cells:
-         upnode = -99
-         downnode = -99
-         df = df_cell[df_cell.cell==c]
-         chan_num = df.chan_num
-         cell_num = df.cell
-         min_dist = 0.0
-         max_dist = channel_tables[channel_tables.CHAN_NO==int(chan_num)].LENGTH.values[0]
-         chan_upnode = channel_tables[channel_tables.CHAN_NO==int(chan_num)].UPNODE.values[0]
-         chan_downnode = channel_tables[channel_tables.CHAN_NO==int(chan_num)].DOWNNODE.values[0]
-         if df.start_distance.values == min_dist:
-             upnode = chan_upnode
-         if df.end_distance.values == max_dist:
-             downnode = chan_downnode
-         if upnode==-99: #upnode not assigned yet
-             upnode = '%d_%d'%(chan_num,cell_num-1)
-         if downnode ==-99: # downnode not assigned yet
-             downnode = '%d_%d'%(chan_num,cell_num)
-         cell_upnode.append(upnode)
-         cell_downnode.append(downnode)
+      chan = pd.Index(channel_tables.CHAN_NO.values).get_indexer(chan_num)
+      if (chan < 0).any():
+         raise ValueError('channel %d is not in the hydro echo file'%
+                          chan_num[chan < 0][0])
+      max_dist = channel_tables.LENGTH.values[chan]
+      # the channel nodes at the channel ends, '<chan>_<cell>' between cells
+      upnode = (pd.Series(chan_num).astype(str) + '_' +
+                pd.Series(cells-1).astype(str)).values.astype(object)
+      downnode = (pd.Series(chan_num).astype(str) + '_' +
+                  pd.Series(cells).astype(str)).values.astype(object)
+      at_start = df_cell.start_distance.values == 0.0
+      at_end = df_cell.end_distance.values == max_dist
+      upnode[at_start] = channel_tables.UPNODE.values[chan][at_start]
+      downnode[at_end] = channel_tables.DOWNNODE.values[chan][at_end]
       df_cell['length'] = df_cell['end_distance']-df_cell['start_distance']        
-      df_cell['upnode'] = cell_upnode
-      df_cell['downnode'] = cell_downnode
+      df_cell['upnode'] = upnode
+      df_cell['downnode'] = downnode
       self._cell_node = df_cell
+      self._adjacency = None
 
+   @property
+   def node_adjacency(self):
+      """
+      node to cell adjacency in compressed sparse row form: the nodes and for
+      node i the cells flowing into it (downnode), upcells[up_ptr[i]:up_ptr[i+1]],
+      and out of it (upnode), downcells[down_ptr[i]:down_ptr[i+1]], in cell
+      order
+      """
+      if self._adjacency is None:
+         df_cell = self.cell_node
+         ncell = len(df_cell)
+         codes, nodes = pd.factorize(np.concatenate([
+            df_cell.downnode.values, df_cell.upnode.values]))
+         into, out_of = codes[:ncell], codes[ncell:]
+         nnode = len(nodes)
+         cells = df_cell.cell.values
+         up_ptr = np.concatenate([[0], np.cumsum(np.bincount(into, minlength=nnode))])
+         down_ptr = np.concatenate([[0], np.cumsum(np.bincount(out_of, minlength=nnode))])
+         self._adjacency = NodeAdjacency(
+            np.asarray(nodes, dtype=object),
+            up_ptr, cells[np.argsort(into, kind='stable')],
+            down_ptr, cells[np.argsort(out_of, kind='stable')])
+      return self._adjacency
 
    def get_node_cell(self):
       """
-      Create a node table with upcell and downcell. 
+      Create a node table with upcell and downcell, a row for each pair of
+      cells flowing into and out of a node
       """
       df_cell = self.cell_node
-      nodes = list( set(df_cell.upnode.values).intersection(
-         set(df_cell.downnode.values) ) ) # find overlapping nodes
-      upcell = []
-      downcell = []
-      length = []
-      conn = [] 
-      for n in nodes:
-         node_upcell = df_cell[df_cell.downnode==n].cell.values
-         node_downcell = df_cell[df_cell.upnode==n].cell.values
-         if len(node_upcell)==1 and len(node_downcell)==1:
-            upcell.append(node_upcell[0])
-            downcell.append(node_downcell[0])
-            node_length = ( 
-                df_cell[df_cell.cell==node_upcell[0]].length.values + 
-                df_cell[df_cell.cell==node_downcell[0]].length.values 
-                )/2.0
-            length.append(node_length[0])
-            conn.append(n)
-         elif len(node_upcell)>1 and len(node_downcell)==1:
-            upcell += node_upcell.tolist()
-            downcell += [node_downcell[0]]*len(node_upcell)  
-            node_length = (
-                df_cell[df_cell.cell.isin(node_upcell)].length.values + 
-                df_cell[df_cell.cell==node_downcell[0]].length.values
-                )/2.0 
-            length += node_length.tolist()     
-            conn += [n]*len(node_upcell)     
-         elif len(node_upcell)==1 and len(node_downcell)>1:
-            upcell += [node_upcell[0]]*len(node_downcell) 
-            downcell += node_downcell.tolist()
-            node_length = (
-                df_cell[df_cell.cell==node_upcell[0]].length.values + 
-                df_cell[df_cell.cell.isin(node_downcell)].length.values
-                )/2.0 
-            length += node_length.tolist() 
-            conn += [n]*len(node_downcell)
-         else: # when multiple upcells and downcells exist       
-            ud = np.array([ [u, d] for u in node_upcell for d in node_downcell]) 
-            upcell += ud[:,0].tolist()
-            downcell += ud[:,1].tolist()
-            up_length = df_cell[df_cell.cell.isin(node_upcell)].length.values
-            down_length = df_cell[df_cell.cell.isin(node_downcell)].length.values
-            node_length = [0.5*(ul+dl) for ul in up_length for dl in down_length]
-            length += node_length     
-            conn += [n]*len(ud) 
-            
+      adj = self.node_adjacency
+      nup = np.diff(adj.up_ptr)
+      ndown = np.diff(adj.down_ptr)
+      npair = nup*ndown
+      node = np.repeat(np.arange(len(adj.nodes)), npair)
+      pair = np.arange(npair.sum()) - np.repeat(np.cumsum(npair)-npair, npair)
+      upcell = adj.upcells[adj.up_ptr[node] + pair//ndown[node]]
+      downcell = adj.downcells[adj.down_ptr[node] + pair%ndown[node]]
+      # cells are numbered from 1 in order
+      cell_length = df_cell.length.values
+      length = ((cell_length[upcell-1] + cell_length[downcell-1])/2.0).astype(np.float64)
       df_node_cells = pd.DataFrame({})
-      df_node_cells['node'] = conn  # with multiple nodes for multiple connections
+      df_node_cells['node'] = adj.nodes[node]  # with multiple nodes for multiple connections
       df_node_cells['upcell'] = upcell
       df_node_cells['downcell'] = downcell
       df_node_cells['length'] = length
@@ -301,20 +331,21 @@ class gtm_grid:
       set channel as upnodes and reservior as downnodes
       """    
       df_rc = self.rc
-      df_cell = self.cell_node
+      adj = self.node_adjacency
+      index = pd.Index(adj.nodes)
+      res_at_node = df_rc.groupby('NODE', sort=False).RES_NAME.apply(list)
       node = []
       chan_cell = []
       rc_cell = []
-      for i in range(len(df_rc)):
-         df = df_rc.iloc[i]
-         rn = df.RES_NAME
-         n = df.NODE
-         chan_list = np.concatenate([
-             df_cell[df_cell.upnode==n].cell.values, 
-             df_cell[df_cell.downnode==n].cell.values,
-             df_rc[df_rc.NODE==n].RES_NAME.values]   #include possible res to res connections
-             ) 
-         chan_list = set(chan_list) - set([rn])
+      for rn, n in zip(df_rc.RES_NAME.values, df_rc.NODE.values):
+         i = index.get_indexer([n])[0]
+         chan_list = []
+         if i >= 0:
+            chan_list += adj.downcells[adj.down_ptr[i]:adj.down_ptr[i+1]].tolist()
+            chan_list += adj.upcells[adj.up_ptr[i]:adj.up_ptr[i+1]].tolist()
+         #include possible res to res connections
+         chan_list += res_at_node[n]
+         chan_list = [c for c in dict.fromkeys(chan_list) if c != rn]
          chan_cell += chan_list 
          rc_cell += [rn]*len(chan_list)
          node += [n]*len(chan_list)
@@ -331,18 +362,10 @@ class gtm_grid:
       """
       df_cell = self.cell_node
       df_obs = self.obs_cells(obs_fn,unique=True)      
-      upnode = []
-      downnode = []
-      obs_names = df_obs.NAME.values
-      for s in obs_names:
-         df = df_obs[df_obs.NAME==s]
-         cell_no = df.cell
-         cell_upnode = df_cell[df_cell.cell==int(cell_no)].upnode.values[0]
-         cell_downnode = df_cell[df_cell.cell==int(cell_no)].downnode.values[0]
-         upnode.append(cell_upnode)
-         downnode.append(cell_downnode)
-      df_obs['upnode'] = upnode
-      df_obs['downnode'] = downnode
+      # cells are numbered from 1 in order
+      cell_no = df_obs.cell.values.astype(int)
+      df_obs['upnode'] = df_cell.upnode.values[cell_no-1]
+      df_obs['downnode'] = df_cell.downnode.values[cell_no-1]
       return df_obs
 
 
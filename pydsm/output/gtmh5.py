@@ -7,13 +7,17 @@ and by users.
 
 from __future__ import annotations
 
+import functools
+import os
 from datetime import datetime
 from typing import Tuple
 
 import numpy as np
 import pandas as pd
+import scipy.sparse
 
-from . import qualh5
+from . import dsm2h5, qualh5
+from .tidefile_pool import get_tidefile_pool
 
 _DSM2_TIME_FORMAT = "%d%b%Y %H%M"
 
@@ -115,7 +119,7 @@ def build_timewindow_for_time(
     Parameters
     ----------
     tidefile : str
-        Path to GTM/Qual HDF5 file.
+        Path to GTM/Qual HDF5 file, opened from the shared tidefile pool.
     time : datetime | str
         Requested (approximate) time.
 
@@ -124,7 +128,7 @@ def build_timewindow_for_time(
     (timewindow, model_time)
         timewindow is 'START-END' using DSM2 format; model_time is datetime.
     """
-    qualt = qualh5.QualH5(tidefile)
+    qualt = get_tidefile_pool().get(tidefile, qualh5.QualH5)
     output_freq = qualt.get_output_freq()
     start_date, end_date = qualt.get_start_end_dates()
 
@@ -138,59 +142,159 @@ def build_timewindow_for_time(
     return timewindow, model_time
 
 
-def get_interpolated_cell_concentrations(
+def build_cell_interpolation_operator(
+    channel_table: pd.DataFrame, channel_ids
+) -> scipy.sparse.csr_matrix:
+    """Build the sparse operator from channel end to cell concentrations.
+
+    The cells of a channel are interpolated linearly between the upstream and
+    downstream concentrations of the channel, cell ``i`` (from 0) of ``n``
+    with weight ``(i + 1) / (n + 1)`` on the downstream end.
+
+    Parameters
+    ----------
+    channel_table : pandas.DataFrame
+        The ``/geometry/channel`` table (channel_num, start_cell, end_cell),
+        cells numbered from 1.
+    channel_ids : sequence of int
+        Channel numbers in the order of the channel concentration table.
+
+    Returns
+    -------
+    scipy.sparse.csr_matrix
+        Shape (2 * num_channels, num_cells). Row ``2 * i`` is the upstream and
+        row ``2 * i + 1`` the downstream end of channel ``i``, so a
+        (time, channel, location) array reshaped to (time, 2 * num_channels)
+        is interpolated to (time, cells) with ``values @ operator``.
+    """
+    position = {int(c): i for i, c in enumerate(channel_ids)}
+    try:
+        channel_index = np.array(
+            [position[int(c)] for c in channel_table["channel_num"]], dtype=np.int64
+        )
+    except KeyError as e:
+        raise ValueError(f"channel {e} of /geometry/channel has no output") from None
+    start_cell = channel_table["start_cell"].to_numpy(dtype=np.int64)
+    end_cell = channel_table["end_cell"].to_numpy(dtype=np.int64)
+    ncells = end_cell - start_cell + 1
+    # position of each cell within its channel
+    offset = np.arange(ncells.sum()) - np.repeat(np.cumsum(ncells) - ncells, ncells)
+    cells = np.repeat(start_cell - 1, ncells) + offset
+    weight = (offset + 1) / np.repeat(ncells + 1, ncells)
+    upstream = 2 * np.repeat(channel_index, ncells)
+    return scipy.sparse.csr_matrix(
+        (
+            np.concatenate([1.0 - weight, weight]),
+            (np.concatenate([upstream, upstream + 1]), np.concatenate([cells, cells])),
+        ),
+        shape=(2 * len(position), int(end_cell.max()) if len(end_cell) else 0),
+    )
+
+
+@functools.lru_cache(maxsize=32)
+def _cell_interpolation_operator(filename: str, mtime_ns: int):
+    qualt = get_tidefile_pool().get(filename, qualh5.QualH5)
+    return build_cell_interpolation_operator(
+        qualt.get_input_table("/geometry/channel"),
+        qualt.get_channel_numbers()["channel_number"],
+    )
+
+
+def get_cell_interpolation_operator(tidefile: str) -> scipy.sparse.csr_matrix:
+    """The cell interpolation operator of the tidefile.
+
+    Built once per file (and again if it changes) from ``/geometry/channel``,
+    see `build_cell_interpolation_operator`.
+    """
+    path = os.path.abspath(tidefile)
+    return _cell_interpolation_operator(path, os.stat(path).st_mtime_ns)
+
+
+def iter_cell_concentrations(
     tidefile: str,
-    timewindow: str,
+    timewindow: str | None = None,
     constituent: str = "ec",
-) -> np.ndarray:
-    """Compute per-cell interpolated concentrations for a provided timewindow.
+    chunk="30D",
+):
+    """Iterate over per-cell interpolated concentrations in blocks of time.
 
-    Produces an array shape (1, total_cells) combining upstream and downstream
-    concentrations with linear interpolation across channel cells.
-    """
-    qualt = qualh5.QualH5(tidefile)
-    ct = qualt.get_input_table("/geometry/channel")
-    channel_ids = list(qualt.get_channel_numbers().values.flatten())
+    Each block of channel end concentrations is read with one hyperslab read
+    and interpolated to the cells with one sparse product (see
+    `get_cell_interpolation_operator`), so only one block is held in memory at
+    a time.
 
-    upconc = (
-        qualt.get_channel_concentration(
-            constituent, channel_ids, "upstream", timewindow
+    Parameters
+    ----------
+    tidefile : str
+        Path to GTM/Qual HDF5 file, opened from the shared tidefile pool.
+    timewindow : str | None
+        Optional DSM2 style window "START-END".
+    constituent : str
+        Constituent name, e.g. "ec".
+    chunk : str | int | None, default "30D"
+        Block length (see dsm2h5.get_time_block_rows).
+
+    Yields
+    ------
+    pandas.DataFrame
+        Time-indexed block of float64 concentrations with a column per cell,
+        numbered from 1.
+    """
+    operator = get_cell_interpolation_operator(tidefile)
+    cells = pd.RangeIndex(1, operator.shape[1] + 1, name="cell")
+    with get_tidefile_pool().open(tidefile, qualh5.QualH5) as qualt:
+        data = qualt.h5.get("/output/channel concentration")
+        source, attrs = dsm2h5.get_time_indexed_table(
+            qualt.h5, "/output/channel concentration"
         )
-        .values.flatten()
-        .astype(float)
-    )
-    dnconc = (
-        qualt.get_channel_concentration(
-            constituent, channel_ids, "downstream", timewindow
+        index = dsm2h5.get_table_time_index(data, attrs)
+        other_indices = (
+            qualt._names_to_constituent_indices(constituent),
+            slice(None),
+            qualt._channel_locations_to_indicies(["upstream", "downstream"]),
         )
-        .values.flatten()
-        .astype(float)
-    )
+        for time_slice in dsm2h5.iter_time_slices(data, timewindow, chunk, attrs):
+            ends = dsm2h5.read_table_slice(source, attrs, time_slice, *other_indices)
+            ends = ends.reshape(len(ends), -1).astype(np.float64)
+            yield pd.DataFrame(
+                np.asarray(ends @ operator), index=index[time_slice], columns=cells
+            )
+
+
+def get_cell_concentrations(
+    tidefile: str,
+    timewindow: str | None = None,
+    constituent: str = "ec",
+    chunk="30D",
+) -> pd.DataFrame:
+    """Per-cell interpolated concentrations over a timewindow.
 
-    num_channels = len(channel_ids)
-    num_cells = int(ct["end_cell"].max())
-
-    channel_cell_mask = np.zeros((num_channels, num_cells), dtype=float)
-    interp_weights = np.zeros((num_channels, num_cells), dtype=float)
-
-    for _, row in ct.iterrows():
-        ch_num = int(row["channel_num"])
-        ch_index = channel_ids.index(ch_num)
-        start_cell = int(row["start_cell"])
-        end_cell = int(row["end_cell"])
-        ncells = end_cell - start_cell + 1
-        factor = 1.0 / (ncells + 1)
-        interp_weights[ch_index, start_cell - 1 : end_cell] = np.linspace(
-            factor, 1.0, ncells, endpoint=False
+    See `iter_cell_concentrations`, of which this is the concatenation.
+    """
+    blocks = list(iter_cell_concentrations(tidefile, timewindow, constituent, chunk))
+    if not blocks:
+        operator = get_cell_interpolation_operator(tidefile)
+        return pd.DataFrame(
+            np.empty((0, operator.shape[1])),
+            index=pd.DatetimeIndex([]),
+            columns=pd.RangeIndex(1, operator.shape[1] + 1, name="cell"),
         )
-        channel_cell_mask[ch_index, start_cell - 1 : end_cell] = 1.0
+    return pd.concat(blocks)
 
-    conc_matrix = (
-        upconc[:, None] * channel_cell_mask
-        + (dnconc - upconc)[:, None] * interp_weights
-    )
-    single_row = conc_matrix.max(axis=0, keepdims=True)
-    return single_row
+
+def get_interpolated_cell_concentrations(
+    tidefile: str,
+    timewindow: str,
+    constituent: str = "ec",
+) -> np.ndarray:
+    """Compute per-cell interpolated concentrations for a provided timewindow.
+
+    Produces an array shape (time steps, total_cells), (1, total_cells) for a
+    single-interval timewindow (see `build_timewindow_for_time`), combining
+    upstream and downstream concentrations with linear interpolation across
+    channel cells. The tidefile is opened from the shared tidefile pool.
+    """
+    return get_cell_concentrations(tidefile, timewindow, constituent).to_numpy()
 
 
 __all__ = [
@@ -199,5 +303,9 @@ __all__ = [
     "_format_time",
     "_nearest_time",
     "build_timewindow_for_time",
+    "build_cell_interpolation_operator",
+    "get_cell_interpolation_operator",
+    "iter_cell_concentrations",
+    "get_cell_concentrations",
     "get_interpolated_cell_concentrations",
 ]
@@ -0,0 +1,229 @@
+"""
+Node mass balance of a DSM2 Hydro tidefile for the whole network.
+
+DSM2 nodes hold no water, so at every node the flows in and out of the
+connected channels, reservoirs, external flows (boundary and source flows)
+and transfers add up to zero, apart from solver tolerance and the flows
+leaving through stage boundaries. The imbalance at a node is
+
+    sum of downstream channel flows of the channels ending at the node
+    - sum of upstream channel flows of the channels starting at the node
+    + reservoir connection flows into the node (reservoir to node positive)
+    + external flows attached to the node
+    + transfer flows to the node - transfer flows from the node
+
+`get_node_incidence` writes these terms as a sparse node x flow incidence
+matrix built from the channel, reservoir connection, external flow and
+transfer tables in the tidefile. The imbalance at all nodes for a block of
+time steps is then one sparse matrix product with the flows read for that
+block, and `iter_node_imbalance` streams it over the tidefile a block at a
+time.
+"""
+
+import logging
+
+import numpy as np
+import pandas as pd
+import scipy.sparse
+
+from pydsm.output import dsm2h5
+from pydsm.output.hydroh5 import HydroH5
+
+logger = logging.getLogger(__name__)
+
+# DSM2 object types of the objects external flows attach to
+OBJ_NODE = 2
+OBJ_RESERVOIR = 3
+
+# the flow tables in the order of the columns of the incidence matrix
+# (channel flow contributes its upstream and then its downstream end)
+FLOW_TABLES = ["channel flow", "reservoir flow", "qext flow", "transfer flow"]
+
+
+def _transfer_nodes(hydro):
+    """
+    from and to nodes of the transfers (None where the end is not a node),
+    read from the transfer input table if the tidefile has it
+    """
+    transfers = hydro.get_input_table(HydroH5._INPUT_PATH + "/transfer")
+    if transfers is None:
+        if len(hydro.transfers if hydro.transfers is not None else []):
+            logger.warning(
+                "No transfer input table in %s, transfers are left out of the "
+                "node balance",
+                hydro.filename,
+            )
+        return [], []
+    transfers.columns = [c.lower() for c in transfers.columns]
+
+    def nodes(end):
+        return [
+            int(identifier) if str(obj_type).strip().lower() == "node" else None
+            for obj_type, identifier in zip(
+                transfers[f"{end}_obj_type"], transfers[f"{end}_identifier"]
+            )
+        ]
+
+    return nodes("from"), nodes("to")
+
+
+def get_node_incidence(hydro):
+    """
+    Sparse incidence matrix of the nodes and the flows in the tidefile.
+
+    The columns are the flows in the order they are read by
+    `read_flow_block`: the upstream channel flows, the downstream channel
+    flows, then the reservoir connection, external and transfer flows in
+    data table order. Entries are +1 for flows into and -1 for flows out of
+    the node.
+
+    Parameters
+    ----------
+    hydro : HydroH5
+        Open HydroH5 instance.
+
+    Returns
+    -------
+    tuple(numpy.ndarray, scipy.sparse.csr_matrix)
+        The (external) node numbers in row order and the matrix.
+    """
+    channels = hydro.channels
+    nchan = len(channels)
+    rnc = hydro.reservoir_node_connections
+    qext = hydro.qext
+    nqext = 0 if qext is None else len(qext)
+    from_nodes, to_nodes = _transfer_nodes(hydro)
+    ntransfer = 0 if hydro.transfers is None else len(hydro.transfers)
+    # (node, column, sign) of every term
+    terms = [
+        (channels["upnode"].to_numpy(), np.arange(nchan), -1.0),
+        (channels["downnode"].to_numpy(), nchan + np.arange(nchan), 1.0),
+    ]
+    offset = 2 * nchan
+    terms.append((rnc["ext_node_no"].to_numpy(), offset + np.arange(len(rnc)), 1.0))
+    offset += len(rnc)
+    if nqext:
+        at_node = (qext["attached_obj_type"] == OBJ_NODE).to_numpy()
+        terms.append(
+            (
+                qext["attach_obj_name"][at_node].astype(int).to_numpy(),
+                offset + np.flatnonzero(at_node),
+                1.0,
+            )
+        )
+    offset += nqext
+    for nodes, sign in ((from_nodes, -1.0), (to_nodes, 1.0)):
+        columns = [i for i, node in enumerate(nodes) if node is not None]
+        terms.append(
+            (
+                np.array([nodes[i] for i in columns], dtype=int),
+                offset + np.array(columns, dtype=int),
+                sign,
+            )
+        )
+    offset += ntransfer
+    node_numbers = np.unique(np.concatenate([t[0] for t in terms]))
+    rows = np.concatenate([np.searchsorted(node_numbers, t[0]) for t in terms])
+    columns = np.concatenate([t[1] for t in terms])
+    values = np.concatenate([np.full(len(t[0]), t[2]) for t in terms])
+    incidence = scipy.sparse.csr_matrix(
+        (values, (rows, columns)), shape=(len(node_numbers), offset)
+    )
+    return node_numbers, incidence
+
+
+def read_flow_block(hydro, time_slice):
+    """
+    flows for the time slice as a (time, flow) array with the columns of the
+    node incidence matrix
+    """
+    upstream = hydro._channel_locations_to_indicies("upstream")
+    downstream = hydro._channel_locations_to_indicies("downstream")
+    blocks = []
+    for table in FLOW_TABLES:
+        data = hydro.h5.get(HydroH5._DATA_PATH + "/" + table)
+        if data is None or 0 in data.shape[1:]:
+            continue
+        values = data[time_slice]
+        if table == "channel flow":
+            blocks += [values[:, :, upstream], values[:, :, downstream]]
+        else:
+            blocks.append(values)
+    return np.hstack(blocks).astype(np.float64)
+
+
+def _check_time_axes(hydro, data):
+    attrs = dsm2h5.read_attributes_from_table(data)
+    for table in FLOW_TABLES[1:]:
+        other = hydro.h5.get(HydroH5._DATA_PATH + "/" + table)
+        if other is None or 0 in other.shape[1:]:
+            continue
+        other_attrs = dsm2h5.read_attributes_from_table(other)
+        if (other.shape[0], other_attrs["start_time"], other_attrs["interval"]) != (
+            data.shape[0],
+            attrs["start_time"],
+            attrs["interval"],
+        ):
+            raise ValueError(
+                f"{table} does not have the time steps of channel flow in "
+                f"{hydro.filename}"
+            )
+    return attrs
+
+
+def iter_node_imbalance(hydro, timewindow=None, chunk="30D"):
+    """Iterate over the flow imbalance at every node in blocks of time.
+
+    Parameters
+    ----------
+    hydro : HydroH5
+        Open HydroH5 instance.
+    timewindow : str | None
+        Optional DSM2 style window "START-END".
+    chunk : str | int | None, default "30D"
+        Block length, rounded to whole HDF5 chunks (see
+        dsm2h5.get_time_block_rows).
+
+    Yields
+    ------
+    pandas.DataFrame
+        Time-indexed block of the imbalance (flow units) with one column per
+        node number (str).
+    """
+    node_numbers, incidence = get_node_incidence(hydro)
+    columns = node_numbers.astype(str)
+    data = hydro.h5[HydroH5._DATA_PATH + "/channel flow"]
+    attrs = _check_time_axes(hydro, data)
+    index = dsm2h5.get_table_time_index(data, attrs)
+    for time_slice in dsm2h5.iter_time_slices(data, timewindow, chunk, attrs):
+        flows = read_flow_block(hydro, time_slice)
+        if flows.shape[1] != incidence.shape[1]:
+            raise ValueError(
+                f"The flow tables in {hydro.filename} do not match its channel, "
+                "reservoir connection, external flow and transfer tables"
+            )
+        yield pd.DataFrame(
+            (incidence @ flows.T).T,
+            index=index[time_slice],
+            columns=columns,
+        )
+
+
+def get_node_imbalance(hydro, timewindow=None, chunk="30D"):
+    """Return the flow imbalance at every node (see iter_node_imbalance).
+
+    Parameters
+    ----------
+    hydro : HydroH5
+        Open HydroH5 instance.
+    timewindow : str | None
+        Optional DSM2 style window "START-END".
+    chunk : str | int | None, default "30D"
+        Time length of the blocks read at a time.
+
+    Returns
+    -------
+    pandas.DataFrame
+        Time-indexed imbalance with one column per node number (str).
+    """
+    return pd.concat(list(iter_node_imbalance(hydro, timewindow, chunk)))
@@ -39,13 +39,16 @@ def mins_since_origin(dstr, origin_date="1899-12-31"):
     return delt.total_seconds() / 60.0
 
 
+def copy_table(tpath, fromhf, tohf):
+    tbl = fromhf[tpath]
+    tohf[tpath] = tbl[()]
+    ntbl = tohf[tpath]
+    copy_attrs_table(tbl, ntbl)
+
+
 def copy_path(path, fromhf, tohf):
     for tname in fromhf[path]:
-        tpath = "%s/%s" % (path, tname)
-        tbl = fromhf[tpath]
-        tohf[tpath] = fromhf[tpath][:]
-        ntbl = tohf[tpath]
-        copy_attrs_table(ntbl, tbl)
+        copy_table("%s/%s" % (path, tname), fromhf, tohf)
 
 
 # infile='historical_v8.h5'
@@ -11,10 +11,16 @@ Unit conversion factors (relative to cubic feet):
 """
 
 import click
+import collections
+import concurrent.futures
+import os
 import sys
+import numpy as np
 import pandas as pd
 
+from pydsm.output import dsm2h5
 from pydsm.output.hydroh5 import HydroH5
+from pydsm.output.tidefile_pool import get_tidefile_pool
 from pydsm.output.utils import write_csv_with_meta
 
 # ---------------------------------------------------------------------------
@@ -135,6 +141,258 @@ def get_reservoir_volumes(hydro, reservoirs=None, timewindow=None, unit="acre-fe
     return convert_volume(vol_cft, unit)
 
 
+# ---------------------------------------------------------------------------
+# Streamed calculation
+# ---------------------------------------------------------------------------
+#
+# The functions above hold the whole time window in memory. The streamed
+# versions below read "channel avg area" and "reservoir height" one block of
+# time steps at a time (optionally in worker processes), so memory use only
+# depends on the block size.
+
+VolumePart = collections.namedtuple(
+    "VolumePart", ["name", "table_path", "indices", "factors", "labels"]
+)
+
+
+def get_volume_parts(
+    hydro,
+    channels=None,
+    reservoirs=None,
+    unit="acre-feet",
+    no_channels=False,
+    no_reservoirs=False,
+):
+    """
+    Describe the channel and reservoir volume calculations for the streamed
+    functions: the table, the indices into it and the factors converting its
+    values to volumes in *unit*.
+
+    Parameters are as for get_channel_volumes and get_reservoir_volumes; None
+    or an empty list means all channels (reservoirs).
+
+    Returns
+    -------
+    list of VolumePart
+        name is "channel" or "reservoir", labels the channel numbers (str) or
+        reservoir names.
+    """
+    factor = UNITS[unit]
+    parts = []
+    if not no_channels:
+        chan_lengths = hydro.channel_length.astype(float)
+        if channels:
+            labels = [str(c) for c in channels]
+            indices = np.atleast_1d(hydro._channel_ids_to_indicies(labels))
+            chan_lengths = chan_lengths[indices]
+        else:
+            labels = list(hydro.channel_numbers)
+            indices = slice(None)
+        parts.append(
+            VolumePart(
+                "channel",
+                HydroH5._DATA_PATH + "/channel avg area",
+                indices,
+                chan_lengths * factor,
+                labels,
+            )
+        )
+    if not no_reservoirs:
+        names = hydro.reservoirs["name"].astype(str).tolist()
+        # areas stored in millions of square feet
+        res_areas = hydro.reservoir_area.astype(float) * 1e6
+        if reservoirs:
+            labels = [str(r) for r in reservoirs]
+            missing = [r for r in labels if r not in names]
+            if missing:
+                raise ValueError(f"Unknown reservoirs: {missing}")
+            indices = np.array([names.index(r) for r in labels])
+            res_areas = res_areas[indices]
+        else:
+            labels = names
+            indices = slice(None)
+        parts.append(
+            VolumePart(
+                "reservoir",
+                HydroH5._DATA_PATH + "/reservoir height",
+                indices,
+                res_areas * factor,
+                labels,
+            )
+        )
+    return parts
+
+
+def _read_volume_block(h5, time_slice, parts):
+    """per item volumes of the parts for the time slice, h5 may be a filename"""
+    if isinstance(h5, str):
+        h5 = get_tidefile_pool().get(h5, HydroH5).h5
+    return [
+        dsm2h5.read_hyperslab(h5[part.table_path], time_slice, part.indices)
+        * part.factors
+        for part in parts
+    ]
+
+
+def _map_ordered(function, tasks, jobs):
+    """
+    map in worker processes keeping the order of the tasks, with at most two
+    tasks per worker submitted but not yet consumed
+    """
+    if jobs == 1:
+        yield from (function(*task) for task in tasks)
+        return
+    jobs = jobs or os.cpu_count() or 1
+    with concurrent.futures.ProcessPoolExecutor(jobs) as pool:
+        pending = collections.deque()
+        for task in tasks:
+            pending.append(pool.submit(function, *task))
+            if len(pending) >= 2 * jobs:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def iter_volumes(
+    hydro,
+    channels=None,
+    reservoirs=None,
+    timewindow=None,
+    unit="acre-feet",
+    no_channels=False,
+    no_reservoirs=False,
+    per_item=False,
+    chunk="365D",
+    jobs=1,
+):
+    """
+    Iterate over the channel, reservoir and total volumes in blocks of time.
+
+    Parameters
+    ----------
+    hydro : HydroH5
+        Open HydroH5 instance.
+    channels, reservoirs : list of str | None
+        Channels and reservoirs to include, None or empty for all.
+    timewindow : str | None
+        DSM2 style time window e.g. '01JAN2014 - 01JAN2015'.
+    unit : str
+        Output unit: 'cubic-feet', 'acre-feet', or 'maf'.
+    no_channels, no_reservoirs : bool
+        Leave out the channel (reservoir) volumes.
+    per_item : bool
+        Also return the volume of every channel (column channel_<number>) and
+        reservoir (column reservoir_<name>).
+    chunk : str | int, default "365D"
+        Time length of the blocks (see dsm2h5.get_time_block_rows).
+    jobs : int | None, default 1
+        Number of worker processes reading blocks, None for the number of
+        CPUs. With 1 the blocks are read in this process.
+
+    Yields
+    ------
+    pandas.DataFrame
+        Time-indexed block with channel_volume and/or reservoir_volume and
+        total_volume columns (and the per item volumes), in *unit*. A single
+        empty block if the time window has no time steps.
+    """
+    parts = get_volume_parts(
+        hydro, channels, reservoirs, unit, no_channels, no_reservoirs
+    )
+    if not parts:
+        raise ValueError("Nothing to calculate: no channels and no reservoirs")
+    data = hydro.h5[parts[0].table_path]
+    attrs = dsm2h5.read_attributes_from_table(data)
+    for part in parts[1:]:
+        other = hydro.h5[part.table_path]
+        other_attrs = dsm2h5.read_attributes_from_table(other)
+        if (other.shape[0], other_attrs["start_time"], other_attrs["interval"]) != (
+            data.shape[0],
+            attrs["start_time"],
+            attrs["interval"],
+        ):
+            raise ValueError(
+                f"{part.table_path} does not have the time steps of {parts[0].table_path}"
+            )
+    index = dsm2h5.get_table_time_index(data, attrs)
+    time_slices = list(dsm2h5.iter_time_slices(data, timewindow, chunk, attrs))
+    if not time_slices:
+        # no time steps in the window: one empty block still has the columns
+        time_slices = [slice(0, 0)]
+    source = hydro.h5 if jobs == 1 else hydro.filename
+    tasks = [(source, time_slice, parts) for time_slice in time_slices]
+    for time_slice, volumes in zip(
+        time_slices, _map_ordered(_read_volume_block, tasks, jobs)
+    ):
+        columns = {}
+        for part, values in zip(parts, volumes):
+            columns[f"{part.name}_volume"] = values.sum(axis=1)
+        columns["total_volume"] = sum(columns.values())
+        if per_item:
+            for part, values in zip(parts, volumes):
+                for label, item_values in zip(part.labels, values.T):
+                    columns[f"{part.name}_{label}"] = item_values
+        df = pd.DataFrame(columns, index=index[time_slice])
+        df.index.name = "datetime"
+        yield df
+
+
+def write_volumes(output, blocks, meta=None):
+    """
+    Write the volume blocks (see iter_volumes) to a CSV or Parquet file as they
+    are produced.
+
+    Parameters
+    ----------
+    output : str
+        Output path. Paths ending in .parquet are written as Parquet (requires
+        pyarrow), with meta in the file metadata; others as CSV with meta in
+        leading comment lines (see write_csv_with_meta).
+    blocks : iterable of pandas.DataFrame
+        Blocks with the same columns, in time order.
+    meta : dict | None
+        Metadata key/value pairs.
+
+    Returns
+    -------
+    pandas.Series
+        Mean of every column over all blocks, NaN if there are no rows (only
+        the header or schema is written then).
+    """
+    meta = meta or {}
+    sums = 0.0
+    count = 0
+    writer = None
+    try:
+        for i, df in enumerate(blocks):
+            if output.lower().endswith(".parquet"):
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+
+                table = pa.Table.from_pandas(df, preserve_index=True)
+                if writer is None:
+                    table = table.replace_schema_metadata(
+                        {
+                            **(table.schema.metadata or {}),
+                            **{str(k): str(v) for k, v in meta.items()},
+                        }
+                    )
+                    writer = pq.ParquetWriter(output, table.schema)
+                writer.write_table(table.cast(writer.schema))
+            elif i == 0:
+                write_csv_with_meta(output, df, meta)
+            else:
+                df.to_csv(output, mode="a", header=False)
+            sums = sums + df.sum()
+            count += len(df)
+    finally:
+        if writer is not None:
+            writer.close()
+    if count == 0:
+        return pd.Series(np.nan, index=getattr(sums, "index", []), dtype=float)
+    return sums / count
+
+
 # ---------------------------------------------------------------------------
 # CLI
 # ---------------------------------------------------------------------------
@@ -187,21 +445,43 @@ def get_reservoir_volumes(hydro, reservoirs=None, timewindow=None, unit="acre-fe
     default=False,
     help="Skip reservoir volume calculation.",
 )
+@click.option(
+    "--per-item",
+    is_flag=True,
+    default=False,
+    help="Also write the volume of every channel and reservoir.",
+)
+@click.option(
+    "--chunk",
+    default="365D",
+    show_default=True,
+    help="Time length of the blocks read at a time.",
+)
+@click.option(
+    "-j",
+    "--jobs",
+    default=1,
+    show_default=True,
+    type=int,
+    help="Worker processes reading blocks (0 for the number of CPUs).",
+)
 @click.option(
     "-o",
     "--output",
     default="volumes.csv",
     show_default=True,
-    help="Output CSV file path.",
+    help="Output CSV (or .parquet) file path.",
 )
 def calc_volumes_cmd(
-    hydrofile, timewindow, channel, channel_file, reservoir, reservoir_file, unit, no_channels, no_reservoirs, output
+    hydrofile, timewindow, channel, channel_file, reservoir, reservoir_file, unit, no_channels, no_reservoirs, per_item, chunk, jobs, output
 ):
     """Calculate DSM2 channel and/or reservoir volumes from a Hydro HDF5 tidefile.
 
     Volume is reported as a time series summed over the selected channels and
     reservoirs. Use --channel / --reservoir to restrict to specific items;
-    omitting them includes everything in the file.
+    omitting them includes everything in the file. The tidefile is processed
+    and written a block of --chunk time at a time, so long runs do not need
+    to fit in memory.
 
     \b
     Examples
@@ -214,6 +494,9 @@ def calc_volumes_cmd(
 
     # Reservoirs only
     pydsm calc-volumes hist.h5 --no-channels --unit maf -o res_vols.csv
+
+    # Per channel volumes as Parquet, 4 worker processes
+    pydsm calc-volumes hist.h5 --per-item --jobs 4 -o vols.parquet
     """
     unit = unit.lower()
     label = UNIT_LABELS[unit]
@@ -228,46 +511,42 @@ def calc_volumes_cmd(
         with open(reservoir_file) as f:
             res_list.extend(line.strip() for line in f if line.strip())
 
-    hydro = HydroH5(hydrofile)
-
-    result_parts = {}
-
-    if not no_channels:
-        try:
-            chan_vols = get_channel_volumes(hydro, chan_list or None, timewindow, unit)
-            result_parts["channel_volume"] = chan_vols.sum(axis=1)
-            click.echo(
-                f"Channels: {len(chan_vols.columns)} included, "
-                f"mean total = {result_parts['channel_volume'].mean():.4g} {label}"
-            )
-        except Exception as e:
-            raise click.ClickException(f"Failed to calculate channel volumes: {e}")
-
-    if not no_reservoirs:
-        try:
-            res_vols = get_reservoir_volumes(hydro, res_list or None, timewindow, unit)
-            result_parts["reservoir_volume"] = res_vols.sum(axis=1)
-            click.echo(
-                f"Reservoirs: {len(res_vols.columns)} included, "
-                f"mean total = {result_parts['reservoir_volume'].mean():.4g} {label}"
-            )
-        except Exception as e:
-            raise click.ClickException(f"Failed to calculate reservoir volumes: {e}")
-
-    if not result_parts:
+    if no_channels and no_reservoirs:
         raise click.ClickException("Nothing to calculate: both --no-channels and --no-reservoirs were set.")
 
-    df_out = pd.DataFrame(result_parts)
-    df_out["total_volume"] = df_out.sum(axis=1)
-    df_out.index.name = "datetime"
+    hydro = HydroH5(hydrofile)
+    try:
+        parts = get_volume_parts(hydro, chan_list or None, res_list or None, unit, no_channels, no_reservoirs)
+    except Exception as e:
+        raise click.ClickException(f"Failed to calculate volumes: {e}")
 
     meta = {
         "command": " ".join(sys.argv),
         "hydrofile": hydrofile,
         "unit": label,
         "timewindow": timewindow or "all",
-        "channels": ", ".join(chan_list) if chan_list else "all",
+        "channels": ", ".join(chan_list) if chan_list else ("none" if no_channels else "all"),
         "reservoirs": ", ".join(res_list) if res_list else ("none" if no_reservoirs else "all"),
     }
-    write_csv_with_meta(output, df_out, meta)
+    blocks = iter_volumes(
+        hydro,
+        chan_list or None,
+        res_list or None,
+        timewindow,
+        unit,
+        no_channels,
+        no_reservoirs,
+        per_item=per_item,
+        chunk=chunk,
+        jobs=jobs or None,
+    )
+    try:
+        means = write_volumes(output, blocks, meta)
+    except Exception as e:
+        raise click.ClickException(f"Failed to calculate volumes: {e}")
+    for part in parts:
+        click.echo(
+            f"{part.name.capitalize()}s: {len(part.labels)} included, "
+            f"mean total = {means[part.name + '_volume']:.4g} {label}"
+        )
     click.echo(f"Volumes ({label}) written to {output}")
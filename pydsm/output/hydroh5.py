@@ -45,11 +45,18 @@ class HydroH5:
                 + dsm2h5.get_model(self.h5)
                 + " ?"
             )
-        # -- initialization code -- FIXME: be more lazy
-        self.get_channels()
-        self.get_channel_locations()
-        self.get_reservoirs()
-        self.get_qext()
+        # metadata tables are read lazily on first use and cached for the
+        # lifetime of this instance (see the properties below)
+        self._channels = None
+        self._channel_numbers = None
+        self._channel_number2index = None
+        self._channel_locs = None
+        self._channel_location2index = None
+        self._reservoirs = None
+        self._reservoir_node_connections = None
+        self._qext = None
+        self._transfers = None
+        self._channel_bottom = None
 
     def __del__(self):
         """
@@ -58,6 +65,19 @@ class HydroH5:
         if hasattr(self, 'h5'):
             self.h5.close()
 
+    def close(self):
+        """
+        closes the file, after which the instance can no longer read it
+        """
+        dsm2h5.release_time_indexed_tables(self.h5)
+        self.h5.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
     def get_start_end_dates(self):
         """
         return the start and end dates of the simulation
@@ -67,37 +87,136 @@ class HydroH5:
     def get_input_tables(self):
         return dsm2h5.get_paths_for_group_path(self.h5, "/hydro/input")
 
-    def get_input_table(self, table_path):
+    def get_input_table(self, table_path, string_dtype=None):
         """See get_input_tables for a list of table paths
-        Returns a dataframe for the contents of the table at the path"""
-        return dsm2h5.read_table_as_df(self.h5, table_path)
+        Returns a dataframe for the contents of the table at the path
+        (see dsm2h5.read_table_as_df for string_dtype)"""
+        return dsm2h5.read_table_as_df(self.h5, table_path, string_dtype)
 
     def get_geometry_tables(self):
         return dsm2h5.get_paths_for_group_path(self.h5, "/hydro/geometry")
 
-    def get_geometry_table(self, table_path):
-        return dsm2h5.read_table_as_df(self.h5, table_path)
+    def get_geometry_table(self, table_path, string_dtype=None):
+        return dsm2h5.read_table_as_df(self.h5, table_path, string_dtype)
+
+    # -- lazily loaded metadata --
+
+    @property
+    def channels(self):
+        """channel input table, read once on first access"""
+        if self._channels is None:
+            channels = dsm2h5.read_table_as_df(
+                self.h5, HydroH5._INPUT_PATH + "/channel"
+            )
+            self._channels = channels.astype({"chan_no": str})
+        return self._channels
+
+    @property
+    def channel_numbers(self):
+        """ndarray of channel numbers (str) in data table index order"""
+        if self._channel_numbers is None:
+            self._channel_numbers = self.channels["chan_no"].to_numpy(dtype=str)
+        return self._channel_numbers
+
+    @property
+    def channel_number2index(self):
+        """dict of channel number (str) to index into the data tables"""
+        if self._channel_number2index is None:
+            self._channel_number2index = {
+                number: index for index, number in enumerate(self.channel_numbers)
+            }
+        return self._channel_number2index
+
+    @property
+    def channel_index2number(self):
+        return dict(enumerate(self.channel_numbers))
+
+    @property
+    def channel_locs(self):
+        if self._channel_locs is None:
+            locs = pd.DataFrame(self.h5.get(HydroH5._GEOM_PATH + "/channel_location"))
+            self._channel_locs = pd.DataFrame(locs.iloc[:, 0].str.decode("utf-8"))
+        return self._channel_locs
+
+    @property
+    def channel_location2number(self):
+        return self.channel_locs[0].to_dict()
+
+    @property
+    def channel_location2index(self):
+        if self._channel_location2index is None:
+            self._channel_location2index = {
+                value: key for key, value in self.channel_location2number.items()
+            }
+        return self._channel_location2index
+
+    @property
+    def reservoirs(self):
+        if self._reservoirs is None:
+            self._reservoirs = dsm2h5.read_table_as_df(
+                self.h5, HydroH5._INPUT_PATH + "/reservoir"
+            )
+        return self._reservoirs
+
+    @property
+    def reservoir_node_connections(self):
+        if self._reservoir_node_connections is None:
+            self._reservoir_node_connections = dsm2h5.read_table_as_df(
+                self.h5, HydroH5._GEOM_PATH + "/reservoir_node_connect"
+            )
+        return self._reservoir_node_connections
+
+    @property
+    def qext(self):
+        if self._qext is None:
+            self._qext = dsm2h5.read_table_as_df(self.h5, HydroH5._GEOM_PATH + "/qext")
+        return self._qext
+
+    @property
+    def transfers(self):
+        if self._transfers is None:
+            self._transfers = dsm2h5.read_table_as_df(
+                self.h5, HydroH5._GEOM_PATH + "/transfer_names"
+            )
+        return self._transfers
+
+    # -- cached geometry --
+
+    @property
+    def channel_bottom(self):
+        """ndarray (location, channel) of channel bottom elevations, read once"""
+        if self._channel_bottom is None:
+            self._channel_bottom = self.h5[HydroH5._GEOM_PATH + "/channel_bottom"][()]
+        return self._channel_bottom
+
+    @property
+    def channel_length(self):
+        """ndarray of channel lengths in data table index order"""
+        return self.channels["length"].to_numpy()
+
+    @property
+    def reservoir_area(self):
+        """ndarray of reservoir areas in data table index order"""
+        return self.reservoirs["area"].to_numpy()
+
+    def _channel_bottom_values(self, location_index, channel_indices):
+        """float32 bottom elevations to add to depth to get stage"""
+        # FIXME: See issue DSM2-164 (stage is really depth!!!)
+        return self.channel_bottom[location_index, channel_indices].astype(np.float32)
 
     def get_channels_internal_to_external_numbers(self):
         """
         return pandas DataFrame of channel ids as indexed
         """
-        channels = pd.DataFrame(
+        return pd.DataFrame(
             self.h5.get(HydroH5._GEOM_PATH + "/channel_number"), dtype=str
         )
-        self.channel_index2number = channels[0].to_dict()
-        self.channel_number2index = {
-            value: key for key, value in self.channel_index2number.items()
-        }
-        return channels
 
     def get_channels(self):
         """
         return pandas Dataframe as read from the input table
         """
-        channels = dsm2h5.read_table_as_df(self.h5, HydroH5._INPUT_PATH + "/channel")
-        channels = channels.astype({"chan_no": str})
-        return channels
+        return self.channels.copy()
 
     def get_channel_indices(self, df, chan_no_list):
         """
@@ -113,65 +232,60 @@ class HydroH5:
         """
         return pandas DataFrame of channel locations ( upstream or downstream)
         """
-        self.channel_locs = pd.DataFrame(
-            self.h5.get(HydroH5._GEOM_PATH + "/channel_location")
-        )
-        self.channel_locs = pd.DataFrame(
-            self.channel_locs.iloc[:, 0].str.decode("utf-8")
-        )
-        self.channel_location2number = self.channel_locs[0].to_dict()
-        self.channel_location2index = {
-            value: key for key, value in self.channel_location2number.items()
-        }
-        return self.channel_locs
+        return self.channel_locs.copy()
 
     def get_reservoirs(self):
         """
         return pandas DataFrame of reservoirs
         """
-        self.reservoirs = dsm2h5.read_table_as_df(
-            self.h5, HydroH5._INPUT_PATH + "/reservoir"
-        )
-        self.reservoir_node_connections = dsm2h5.read_table_as_df(
-            self.h5, HydroH5._GEOM_PATH + "/reservoir_node_connect"
-        )
-        return self.reservoirs
+        return self.reservoirs.copy()
 
     def get_reservoir_node_connections(self):
-        return self.reservoir_node_connections
+        return self.reservoir_node_connections.copy()
 
     def get_qext(self):
         """
         return external flows as defined in DSM2 Hydro
         """
-        self.qext = dsm2h5.read_table_as_df(self.h5, HydroH5._GEOM_PATH + "/qext")
-        return self.qext
+        return self.qext.copy() if self.qext is not None else None
 
     def get_transfer_names(self):
         """
         return transfer names as defined in DSM2 Hydro
         """
-        self.transfers = dsm2h5.read_table_as_df(
-            self.h5, HydroH5._GEOM_PATH + "/transfer_names"
-        )
-        return self.transfers
+        return self.transfers.copy() if self.transfers is not None else None
 
     def get_channel_bottom(self, channels):
         if isinstance(channels, list):
             channels = [str(c) for c in channels]
         else:
             channels = str(channels)
-        cids = self._channel_ids_to_indicies(channels)
-        df = self.get_geometry_table("/hydro/geometry/channel_bottom")[cids]
-        df.columns = [f"{id}" for id in self._channel_ids_to_sequence(channels)]
-        df = df.T
-        df.columns = ["upstream", "downstream"]
-        return df
+        cids = np.atleast_1d(self._channel_ids_to_indicies(channels))
+        return pd.DataFrame(
+            # widened to 64 bits as read by get_geometry_table
+            self.channel_bottom[:, cids].T.astype(np.float64),
+            index=[f"{id}" for id in self._channel_ids_to_sequence(channels)],
+            columns=["upstream", "downstream"],
+        )
 
     def get_data_tables(self):
         return HydroH5._DATA_TABLES
 
-    def create_catalog(self):
+    def create_catalog(self, use_cache=False, cache_dir=None):
+        """
+        return a DataFrame cataloging the time series in the tidefile
+
+        With use_cache the catalog is kept in an on-disk cache next to the
+        tidefile (or in cache_dir) and is only rebuilt when the file changes
+        (see dsm2h5.get_cached_catalog).
+        """
+        if use_cache:
+            return dsm2h5.get_cached_catalog(
+                self.filename, self._build_catalog, cache_dir
+            )
+        return self._build_catalog()
+
+    def _build_catalog(self):
         dfc = self.get_channels()
 
         cat_flow = dsm2h5.create_catalog_entry(self.filename, dfc, "flow", "cfs")
@@ -191,7 +305,6 @@ class HydroH5:
             id_column="name",
         )
         dfrn = self.get_reservoir_node_connections()
-        self.get_input_table("/hydro/input/reservoir_connection")
         dfrn["id"] = (
             "RES_"
             + dfrn["res_name"].astype(str).str.upper()
@@ -311,6 +424,89 @@ class HydroH5:
         else:
             raise ValueError("Unknown type: " + catalog_entry)
 
+    def get_data_for_catalog(self, catalog, time_window=None, as_dict=False):
+        """Get the data for many catalog entries at once.
+
+        Entries of the same data table (and location) are read with one
+        hyperslab read, so this is much faster than calling
+        `get_data_for_catalog_entry` for each entry.
+
+        Parameters
+        ----------
+        catalog : pandas.DataFrame
+            Rows of the catalog (see `create_catalog`).
+        time_window : str | None
+            Optional DSM2 style window "START-END".
+        as_dict : bool, default False
+            Return a dict of (id, variable) to a one column DataFrame, as
+            returned by `get_data_for_catalog_entry`, instead.
+
+        Returns
+        -------
+        pandas.DataFrame
+            Time-indexed data with an (id, variable) column per entry.
+        """
+        return dsm2h5.get_data_for_catalog(self, catalog, time_window, as_dict)
+
+    def _catalog_column_request(self, catalog_entry):
+        """the dsm2h5.ColumnRequest for a catalog entry"""
+        entry_id = catalog_entry["id"]
+        variable = catalog_entry["variable"].lower()
+        objtype, _, name = entry_id.partition("_")
+        objtype = objtype.upper()
+        if objtype == "CHAN":
+            idfields = name.split("_")
+            channel_index = self._channel_ids_to_indicies(idfields[0])
+            if len(idfields) == 1 and variable == "area":
+                return dsm2h5.ColumnRequest(
+                    HydroH5._channel_table_path("avg area"),
+                    (channel_index,),
+                    0,
+                    idfields[0],
+                    0,
+                )
+            if len(idfields) == 2 and variable in ("flow", "area", "stage"):
+                location = idfields[1].lower() + "stream"
+                location_index = self._channel_locations_to_indicies(location)
+                offset = 0
+                if variable == "stage":
+                    # FIXME: See issue DSM2-164 (stage is really depth!!!)
+                    offset = self.channel_bottom[location_index, channel_index]
+                return dsm2h5.ColumnRequest(
+                    HydroH5._channel_table_path(variable),
+                    (channel_index, location_index),
+                    0,
+                    f"{idfields[0]}-{location}",
+                    offset,
+                )
+        elif objtype == "RES" and variable == "height":
+            index = dsm2h5.get_position(self.reservoirs["name"], name, "reservoir")
+            return dsm2h5.ColumnRequest(
+                HydroH5._DATA_PATH + "/reservoir height", (index,), 0, name, 0
+            )
+        elif objtype == "RES" and variable == "flow":
+            rnc = self.reservoir_node_connections
+            ids = (
+                rnc["res_name"].astype(str).str.upper()
+                + "_NODE_"
+                + rnc["ext_node_no"].astype(str)
+            )
+            index = dsm2h5.get_position(ids, name, "reservoir connection")
+            return dsm2h5.ColumnRequest(
+                HydroH5._DATA_PATH + "/reservoir flow", (index,), 0, entry_id, 0
+            )
+        elif objtype == "QEXT" and variable == "flow":
+            index = dsm2h5.get_position(self.qext["name"], name, "qext")
+            return dsm2h5.ColumnRequest(
+                HydroH5._DATA_PATH + "/qext flow", (index,), 0, name, 0
+            )
+        elif objtype == "TRANSFER" and variable == "flow":
+            index = dsm2h5.get_position(self.transfers.iloc[:, 0], name, "transfer")
+            return dsm2h5.ColumnRequest(
+                HydroH5._DATA_PATH + "/transfer flow", (index,), 0, name, 0
+            )
+        raise ValueError(f"Unknown catalog entry: {entry_id} {variable}")
+
     def _channel_ids_to_sequence(self, channel_id_slice):
         """
         convert a slice of channel ids to a slice of channel indices into data table
@@ -326,29 +522,21 @@ class HydroH5:
         :param channel_id_slice: string, sequence of strings or slice
         :return: list of indices of matching rows, if channel_id_slice is a string or int it returns a single index else it returns a list of indices
         """
-        channels = self.get_channels()
-        if isinstance(channel_id_slice, str):
-            return self.get_channel_indices(channels, [channel_id_slice])[0]
-        elif isinstance(channel_id_slice, int):
-            return self.get_channel_indices(channels, str(channel_id_slice))[0]
+        number2index = self.channel_number2index
+        if isinstance(channel_id_slice, (str, int, np.integer)):
+            return number2index[str(channel_id_slice)]
         elif dsm2h5.is_sequence_like(channel_id_slice):
-            return self.get_channel_indices(
-                channels, [str(id) for id in channel_id_slice]
-            )
+            return [number2index[str(id)] for id in channel_id_slice]
         elif isinstance(channel_id_slice, slice):
-            return (
-                [
-                    str(id)
-                    for id in self.get_channel_indices(
-                        channels,
-                        range(
-                            channel_id_slice.start,
-                            channel_id_slice.stop,
-                            channel_id_slice.step,
-                        ),
-                    )
-                ],
-            )
+            return [
+                number2index[str(id)]
+                for id in range(
+                    channel_id_slice.start or 0,
+                    channel_id_slice.stop,
+                    channel_id_slice.step or 1,
+                )
+                if str(id) in number2index
+            ]
         else:
             raise RuntimeError(
                 f"Channel id should be string, sequence of strings or slice: Called with: {channel_id_slice!r} of type {type(channel_id_slice)}"
@@ -370,7 +558,13 @@ class HydroH5:
             )
 
     def _get_channel_ts(
-        self, table_path, channels, location="upstream", timewindow=None
+        self,
+        table_path,
+        channels,
+        location="upstream",
+        timewindow=None,
+        as_array=False,
+        as_xarray=False,
     ):
         """
         return a pandas DataFrame of time series from the table for the given
@@ -392,6 +586,12 @@ class HydroH5:
         timewindow : str | None
             Optional DSM2 style time window "START-END". If provided the
             returned DataFrame will be subset to this interval.
+        as_array : bool, default False
+            Return the array as read (time x channel, or time only for a
+            single channel id) without any pandas wrapping.
+        as_xarray : bool, default False
+            Return a xarray.DataArray over the array as read with time,
+            channel and location coordinates.
 
         Returns
         -------
@@ -399,15 +599,23 @@ class HydroH5:
             Time-indexed data with one column per requested channel (and
             location suffix when applicable, e.g. CHANID-upstream).
         """
-        if isinstance(channels, list):
-            channels = [str(c) for c in channels]
-        else:
-            channels = str(channels)
-        # Expand special keyword 'all' to every channel (ordered as in input table)
-        if isinstance(channels, str) and channels.lower() == "all":
-            all_df = self.get_channels()
-            channels = list(all_df["chan_no"].astype(str).values)
-        channel_indices = self._channel_ids_to_indicies(channels)
+        channels, channel_indices = self._channel_ids_and_indices(channels)
+        if as_array or as_xarray:
+            other_indices = (channel_indices,)
+            coords = {"channel": channels}
+            if location:
+                other_indices += (self._channel_locations_to_indicies(location),)
+                coords["location"] = location
+            return dsm2h5.read_time_indexed_table(
+                self.h5,
+                table_path,
+                timewindow,
+                *other_indices,
+                as_array=as_array,
+                as_xarray=as_xarray,
+                dims=() if isinstance(channels, str) else ("channel",),
+                coords=coords,
+            )
         if location:
             location_indices = self._channel_locations_to_indicies(location)
             df = dsm2h5.read_time_indexed_table(
@@ -423,11 +631,195 @@ class HydroH5:
             df.columns = [f"{id}" for id in self._channel_ids_to_sequence(channels)]
         return df
 
+    def _channel_ids_and_indices(self, channels):
+        """
+        normalize channel ids to str (or list of str) and return them with the
+        indices into the data tables. The keyword "all" expands to every channel
+        in input order and is read as a plain slice.
+        """
+        if isinstance(channels, list):
+            channels = [str(c) for c in channels]
+        else:
+            channels = str(channels)
+        # Expand special keyword 'all' to every channel (ordered as in input table)
+        if isinstance(channels, str) and channels.lower() == "all":
+            return list(self.channel_numbers), slice(None)
+        return channels, self._channel_ids_to_indicies(channels)
+
+    @staticmethod
+    def _channel_table_path(variable):
+        """
+        path to the channel data table for variable, one of flow, area, stage or
+        avg area (with or without the "channel " prefix)
+        """
+        name = variable.strip().lower().replace("_", " ")
+        if not name.startswith("channel "):
+            name = "channel " + name
+        if name not in HydroH5._DATA_TABLES:
+            raise ValueError(f"Unknown channel variable: {variable}")
+        return HydroH5._DATA_PATH + "/" + name
+
+    def read_many(self, requests, timewindow=None):
+        """Read several channel time series requests in one pass.
+
+        Requests for the same dataset are combined so that each dataset is
+        read once for the time window, using the union of the requested
+        channels (a plain slice when any request is for "all"). The result
+        is then scattered back into one DataFrame per request.
+
+        Parameters
+        ----------
+        requests : list[tuple]
+            ``(variable, channels, location)`` tuples. ``variable`` is one of
+            "flow", "area", "stage" or "avg area" (the "channel " prefix of
+            the dataset name is optional). ``channels`` is as for
+            `get_channel_flow`, including "all". ``location`` is "upstream"
+            or "downstream" and is omitted (or None) for "avg area".
+        timewindow : str | None
+            Optional DSM2 style window "START-END".
+
+        Returns
+        -------
+        list[pandas.DataFrame]
+            One DataFrame per request in request order, with the same columns
+            as the corresponding ``get_channel_*`` method returns.
+
+        Examples
+        --------
+        >>> flow_up, area_up, stage_down = hydro.read_many(
+        ...     [("flow", chans, "upstream"), ("area", chans, "upstream"),
+        ...      ("stage", chans, "downstream")], "01JAN1990 - 01FEB1990")
+        """
+        parsed = []
+        table_indices = {}
+        table_locations = {}
+        for request in requests:
+            variable, channels = request[0], request[1]
+            location = request[2] if len(request) > 2 else None
+            table_path = HydroH5._channel_table_path(variable)
+            channels, channel_indices = self._channel_ids_and_indices(channels)
+            if isinstance(channel_indices, slice):
+                table_indices[table_path] = slice(None)
+            else:
+                channel_indices = np.atleast_1d(channel_indices)
+                if not isinstance(table_indices.get(table_path), slice):
+                    table_indices.setdefault(table_path, []).append(channel_indices)
+            if self.h5[table_path].ndim == 3:
+                location = location or "upstream"
+                table_locations.setdefault(table_path, set()).add(location)
+            parsed.append(
+                (
+                    table_path,
+                    self._channel_ids_to_sequence(channels),
+                    channel_indices,
+                    location,
+                )
+            )
+        # one read per dataset for the union of requested channels (and only
+        # the requested location when there is just one)
+        tables = {}
+        for table_path, indices in table_indices.items():
+            data, attrs = dsm2h5.get_time_indexed_table(self.h5, table_path)
+            time_slice, stime = dsm2h5.get_time_slice(data, timewindow, attrs)
+            if isinstance(indices, slice):
+                unique = None
+            else:
+                unique = np.unique(np.concatenate(indices))
+                indices = list(unique)
+            locations = table_locations.get(table_path, ())
+            if data.ndim == 2:
+                other = (indices,)
+            elif len(locations) == 1:
+                other = (indices, self._channel_locations_to_indicies(*locations))
+            else:
+                other = (indices, slice(None))
+            darr = dsm2h5.read_table_slice(data, attrs, time_slice, *other)
+            index = pd.date_range(stime, freq=attrs["interval"], periods=darr.shape[0])
+            tables[table_path] = (darr, unique, index)
+        frames = []
+        for table_path, channels, channel_indices, location in parsed:
+            darr, unique, index = tables[table_path]
+            if unique is None:
+                positions = channel_indices
+            else:
+                positions = np.searchsorted(unique, channel_indices)
+            if location is not None:
+                location_index = self._channel_locations_to_indicies(location)
+                if darr.ndim == 3:
+                    values = darr[:, positions, location_index]
+                else:
+                    values = darr[:, positions]
+                if table_path.endswith("channel stage"):
+                    values = values + self._channel_bottom_values(
+                        location_index, channel_indices
+                    )
+                columns = [f"{id}-{location}" for id in channels]
+            else:
+                values = darr[:, positions]
+                columns = [f"{id}" for id in channels]
+            frames.append(
+                pd.DataFrame(values, index=index, columns=columns, dtype=np.float32)
+            )
+        return frames
+
+    def iter_channel_ts(
+        self, variable, channels, location="upstream", timewindow=None, chunk="30D"
+    ):
+        """Iterate over channel time series in consecutive blocks of time.
+
+        Only one block is read and held in memory at a time, so statistics,
+        filters and volumes can be computed over long tidefiles out of core.
+        Blocks are aligned with the HDF5 chunks of the dataset.
+
+        Parameters
+        ----------
+        variable : str
+            "flow", "area", "stage" or "avg area" (see `read_many`).
+        channels : str | int | list[str|int]
+            Channel identifier(s) or "all".
+        location : str | None, default "upstream"
+            Channel end; ignored for "avg area".
+        timewindow : str | None
+            Optional DSM2 style window "START-END".
+        chunk : str | int | None, default "30D"
+            Block length as a duration, a number of time steps, or None for
+            a single HDF5 chunk. Rounded to a whole number of HDF5 chunks.
+
+        Yields
+        ------
+        pandas.DataFrame
+            Time-indexed block with the same columns as the corresponding
+            ``get_channel_*`` method returns.
+        """
+        table_path = HydroH5._channel_table_path(variable)
+        channels, channel_indices = self._channel_ids_and_indices(channels)
+        channels = self._channel_ids_to_sequence(channels)
+        if self.h5[table_path].ndim == 3:
+            location = location or "upstream"
+            location_index = self._channel_locations_to_indicies(location)
+            other_indices = (channel_indices, location_index)
+            columns = [f"{id}-{location}" for id in channels]
+        else:
+            other_indices = (channel_indices,)
+            columns = [f"{id}" for id in channels]
+        channel_bottom = None
+        if table_path.endswith("channel stage"):
+            channel_bottom = self._channel_bottom_values(
+                location_index, channel_indices
+            )
+        for df in dsm2h5.iter_time_indexed_table(
+            self.h5, table_path, timewindow, *other_indices, chunk=chunk
+        ):
+            df.columns = columns
+            if channel_bottom is not None:
+                df = df + channel_bottom
+            yield df
+
     def _get_reservoir_ts(
         self, table_path, reservoirs_names, connection_ids=None, timewindow=None
     ):
         """ """
-        res = self.get_reservoirs()
+        res = self.reservoirs
         rnc = self.reservoir_node_connections
         res_names = dsm2h5.normalize_to_slice(reservoirs_names)
         if connection_ids is None:
@@ -450,7 +842,7 @@ class HydroH5:
 
     def _get_qext_ts(self, table_path, qext_names, timewindow=None):
         """ """
-        qext = self.get_qext()
+        qext = self.qext
         qext_norm = dsm2h5.normalize_to_slice(qext_names)
         qext_indicies = qext[qext.name.isin(qext_norm)].index.values
         df = dsm2h5.read_time_indexed_table(
@@ -460,12 +852,17 @@ class HydroH5:
         return df
 
     def get_channel_bottoms(self):
-        """Get the channel bottom for a given channel ID."""
-        return dsm2h5.read_table_as_df(
-            self.get_geometry_table(HydroH5._GEOM_PATH + "/channel_bottom")
-        )
+        """Get the channel bottoms of all channels (see get_channel_bottom)."""
+        return self.get_channel_bottom(list(self.channel_numbers))
 
-    def get_channel_flow(self, channel_id, location_id="upstream", timewindow=None):
+    def get_channel_flow(
+        self,
+        channel_id,
+        location_id="upstream",
+        timewindow=None,
+        as_array=False,
+        as_xarray=False,
+    ):
         """Return channel flow time series.
 
         Parameters
@@ -478,6 +875,11 @@ class HydroH5:
             Channel end: "upstream" or "downstream".
         timewindow : str | None
             Optional DSM2 style window "START-END" (e.g. "05JAN1990 - 07JAN1990").
+        as_array : bool, default False
+            Return the numpy array as read instead of a DataFrame.
+        as_xarray : bool, default False
+            Return a xarray.DataArray (time, channel) with a location
+            coordinate instead of a DataFrame. Requires xarray.
 
         Returns
         -------
@@ -486,41 +888,70 @@ class HydroH5:
             include the location suffix when applicable).
         """
         return self._get_channel_ts(
-            "/hydro/data/channel flow", channel_id, location_id, timewindow
+            "/hydro/data/channel flow",
+            channel_id,
+            location_id,
+            timewindow,
+            as_array=as_array,
+            as_xarray=as_xarray,
         )
 
-    def get_channel_area(self, channel_id, location_id="upstream", timewindow=None):
+    def get_channel_area(
+        self,
+        channel_id,
+        location_id="upstream",
+        timewindow=None,
+        as_array=False,
+        as_xarray=False,
+    ):
         """Return channel area time series.
 
-        Supports the same channel selection and timewindow semantics as
+        Supports the same channel selection, timewindow and return modes as
         `get_channel_flow` (including the "all" keyword).
         """
         return self._get_channel_ts(
-            "/hydro/data/channel area", channel_id, location_id, timewindow
+            "/hydro/data/channel area",
+            channel_id,
+            location_id,
+            timewindow,
+            as_array=as_array,
+            as_xarray=as_xarray,
         )
 
-    def get_channel_stage(self, channel_id, location_id="upstream", timewindow=None):
+    def get_channel_stage(
+        self,
+        channel_id,
+        location_id="upstream",
+        timewindow=None,
+        as_array=False,
+        as_xarray=False,
+    ):
         """Return channel stage time series (computed from depth + bottom).
 
-        Parameters mirror `get_channel_flow`. The "all" channel keyword and
-        upstream/downstream `location_id` are supported.
+        Parameters mirror `get_channel_flow`. The "all" channel keyword,
+        upstream/downstream `location_id` and the array return modes are
+        supported. The DataFrame is read through `read_many`, so stage for
+        all channels costs the same as flow.
         """
+        if not (as_array or as_xarray):
+            return self.read_many([("stage", channel_id, location_id)], timewindow)[0]
         channel_depth = self._get_channel_ts(
-            "/hydro/data/channel stage", channel_id, location_id, timewindow
+            "/hydro/data/channel stage",
+            channel_id,
+            location_id,
+            timewindow,
+            as_array=as_array,
+            as_xarray=as_xarray,
         )
-        # FIXME: See issue DSM2-164 (stage is really depth!!!). Fix this when we fix that issue.
-        if isinstance(channel_id, list):
-            channel_id = [str(c) for c in channel_id]
-        else:
-            channel_id = str(channel_id)
-        channel_indices = self._channel_ids_to_indicies(channel_id)
-        location_indices = self._channel_locations_to_indicies(location_id)
-        channel_bottom = self.get_geometry_table(HydroH5._GEOM_PATH + "/channel_bottom")
-        channel_bottom = channel_bottom.iloc[location_indices, channel_indices]
-        channel_stage = channel_depth + channel_bottom
-        return channel_stage
-
-    def get_channel_avg_area(self, channel_id, timewindow=None):
+        _, channel_indices = self._channel_ids_and_indices(channel_id)
+        location_index = self._channel_locations_to_indicies(location_id)
+        return channel_depth + self._channel_bottom_values(
+            location_index, channel_indices
+        )
+
+    def get_channel_avg_area(
+        self, channel_id, timewindow=None, as_array=False, as_xarray=False
+    ):
         """Return channel average area time series (no location dimension).
 
         Parameters
@@ -529,16 +960,19 @@ class HydroH5:
             Channel identifier(s) or "all".
         timewindow : str | None
             Optional DSM2 style window "START-END".
+        as_array, as_xarray : bool
+            Return modes as for `get_channel_flow`.
         """
         return self._get_channel_ts(
             "/hydro/data/channel avg area",
             channel_id,
             location=None,
             timewindow=timewindow,
+            as_array=as_array,
+            as_xarray=as_xarray,
         )
 
     def get_reservoir_flow(self, reservoir_name, timewindow=None):
-        res = self.get_reservoirs()
         rt = self.reservoir_node_connections[
             self.reservoir_node_connections.res_name == reservoir_name
         ]
@@ -561,3 +995,83 @@ class HydroH5:
         return self._get_channel_ts(
             "/hydro/data/transfer flow", transfer_id, timewindow
         )
+
+    def get_data_table_layout(self):
+        """
+        return a dict of data table name to the names of its dimensions after
+        time and a dict of coordinates labelling them (from the input and
+        geometry tables)
+        """
+        channel = self.channel_numbers
+        location = self.channel_locs[0].to_numpy(dtype=str)
+        rnc = self.reservoir_node_connections
+        channel_location = {"channel": channel, "location": location}
+        return {
+            "channel flow": (("channel", "location"), channel_location),
+            "channel area": (("channel", "location"), channel_location),
+            "channel stage": (("channel", "location"), channel_location),
+            "channel avg area": (("channel",), {"channel": channel}),
+            "reservoir height": (
+                ("reservoir",),
+                {"reservoir": self.reservoirs["name"].to_numpy(dtype=str)},
+            ),
+            "reservoir flow": (
+                ("reservoir_connection",),
+                {
+                    "reservoir_connection": [
+                        f"{name}/{index}"
+                        for name, index in zip(rnc.res_name, rnc.connect_index)
+                    ],
+                    "connection_node": ("reservoir_connection", rnc.ext_node_no),
+                },
+            ),
+            "qext flow": (("qext",), {"qext": self.qext["name"].to_numpy(dtype=str)}),
+            "transfer flow": (
+                ("transfer",),
+                {"transfer": self.transfers.iloc[:, 0].to_numpy(dtype=str)},
+            ),
+        }
+
+    def to_xarray(self, chunk="30D"):
+        """Return all data tables as a lazily loaded xarray.Dataset.
+
+        Each table becomes a dask backed variable named after the table
+        (e.g. "channel_flow") with time, channel, location, reservoir,
+        reservoir_connection, qext and transfer coordinates taken from the
+        input and geometry tables. channel_stage is computed lazily from the
+        depth in the tidefile and the channel bottom. Nothing is read until
+        the variables are computed, and the tidefile must stay open until
+        then. Requires xarray and dask.
+
+        Parameters
+        ----------
+        chunk : str | int | None, default "30D"
+            Time length of each dask chunk, rounded to whole HDF5 chunks
+            (see dsm2h5.get_time_block_rows).
+        """
+        import xarray as xr
+
+        channel = self.channel_numbers
+        location = self.channel_locs[0].to_numpy(dtype=str)
+        data_vars = {}
+        for table, (dims, coords) in self.get_data_table_layout().items():
+            data = self.h5.get(f"{HydroH5._DATA_PATH}/{table}")
+            if data is None:
+                continue
+            name = table.replace(" ", "_")
+            data_vars[name] = dsm2h5.to_lazy_dataarray(
+                data, ("time",) + dims, coords, name=name, chunk=chunk
+            )
+        if "channel_stage" in data_vars:
+            # FIXME: See issue DSM2-164 (stage is really depth!!!).
+            bottom = xr.DataArray(
+                self.channel_bottom.T,
+                dims=("channel", "location"),
+                coords={"channel": channel, "location": location},
+            )
+            data_vars["channel_stage"] = (
+                data_vars["channel_stage"] + bottom.astype(np.float32)
+            ).rename("channel_stage")
+        return xr.Dataset(
+            data_vars, attrs={"filename": self.filename, "model": "hydro"}
+        )
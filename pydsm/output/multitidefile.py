@@ -0,0 +1,268 @@
+"""
+Concatenation of consecutive DSM2 tidefiles along time.
+
+Long runs are often split into several tidefiles, e.g. one per year of a
+restarted run. `build_virtual_tidefile` writes a small tidefile whose time
+indexed tables are HDF5 virtual datasets mapping consecutive blocks of time
+steps to the same table in each of the tidefiles, and whose other tables are
+copied from the first tidefile. `open_multitidefile` opens such a virtual
+tidefile with HydroH5 or QualH5, so every reader method works on the whole
+period and reads that cross file boundaries are served by HDF5 hyperslab
+reads of each file. No data is copied or concatenated in memory.
+
+The tidefiles must be of the same model, have the same interval, table shapes
+(apart from time) and channel layout, and follow each other without gaps.
+Where consecutive files overlap the later file is used.
+"""
+
+import os
+import tempfile
+import weakref
+
+import h5py
+import numpy as np
+import pandas as pd
+
+from pydsm.output import dsm2h5
+from pydsm.output.hydroh5 import HydroH5
+from pydsm.output.qualh5 import QualH5
+from pydsm.output.tidefile_repack import (
+    attach_dimension_scales,
+    copy_attrs,
+    copy_dataset,
+    is_time_indexed_table,
+)
+
+# tables labelling the dimensions of the data tables, which must match
+_LAYOUT_TABLES = {
+    "hydro": [
+        "/hydro/geometry/channel_number",
+        "/hydro/geometry/channel_location",
+        "/hydro/geometry/reservoir_node_connect",
+        "/hydro/geometry/qext",
+        "/hydro/geometry/transfer_names",
+    ],
+    "qual": [
+        "/output/channel_number",
+        "/output/channel_location",
+        "/output/constituent_names",
+        "/output/reservoir_names",
+    ],
+}
+_LAYOUT_TABLES["gtm"] = _LAYOUT_TABLES["qual"]
+
+_SCALAR_TABLES = {"hydro": "/hydro/input/scalar", "qual": "/input/scalar"}
+_SCALAR_TABLES["gtm"] = _SCALAR_TABLES["qual"]
+
+
+def get_time_indexed_tables(h5):
+    """paths of the time indexed tables in the open tidefile"""
+    paths = []
+
+    def visit(name, item):
+        if isinstance(item, h5py.Dataset) and is_time_indexed_table(item):
+            paths.append("/" + name)
+
+    h5.visititems(visit)
+    return paths
+
+
+def _check_tables(first, other):
+    if other.model != first.model:
+        raise ValueError(
+            f"{other.filename} is a {other.model} tidefile, expected {first.model}"
+        )
+    if other.tables != first.tables:
+        raise ValueError(
+            f"{other.filename} does not have the time indexed tables, intervals "
+            f"and shapes of {first.filename}"
+        )
+    for path in _LAYOUT_TABLES[first.model]:
+        a, b = first.h5.get(path), other.h5.get(path)
+        if (a is None) != (b is None) or (
+            a is not None and not np.array_equal(a[()], b[()])
+        ):
+            raise ValueError(
+                f"{path} differs between {first.filename} and {other.filename}"
+            )
+
+
+def get_time_blocks(filenames):
+    """
+    order the tidefiles by start time and check that they can be concatenated
+
+    :param filenames: hydro, qual or gtm tidefiles
+    :return: model, table paths and a list of (filename, rows) in time order
+        where rows is the number of leading time steps used from the file
+    """
+    files = []
+    try:
+        for filename in filenames:
+            files.append(_TidefileTables(os.path.abspath(filename)))
+        files.sort(key=lambda f: f.start_time)
+        first = files[0]
+        for f in files[1:]:
+            _check_tables(first, f)
+        interval = pd.Timedelta(first.interval)
+        blocks = []
+        for f, next_f in zip(files, files[1:] + [None]):
+            rows = f.nrows
+            if next_f is not None:
+                steps = (next_f.start_time - f.start_time) / interval
+                if steps == 0 or steps != int(steps) or steps > rows:
+                    raise ValueError(
+                        f"{next_f.filename} starting at {next_f.start_time} does "
+                        f"not continue {f.filename} starting at {f.start_time}"
+                    )
+                rows = int(steps)
+            blocks.append((f.filename, rows))
+    finally:
+        for f in files:
+            f.close()
+    return first.model, list(first.tables), blocks
+
+
+class _TidefileTables:
+    """model, start time, interval and time indexed tables of a tidefile"""
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.h5 = h5py.File(filename, "r")
+        try:
+            self.model = dsm2h5.get_model(self.h5)
+            if self.model not in _LAYOUT_TABLES:
+                raise ValueError(f"{filename} is not a hydro or qual tidefile")
+            paths = get_time_indexed_tables(self.h5)
+            if not paths:
+                raise ValueError(f"{filename} has no time indexed tables")
+            self.tables = {}
+            for path in paths:
+                data = self.h5[path]
+                attrs = dsm2h5.read_attributes_from_table(data)
+                self.tables[path] = (attrs["interval"], data.shape[1:])
+                if path == paths[0]:
+                    self.start_time = attrs["start_time"]
+                    self.interval = attrs["interval"]
+                    self.nrows = data.shape[0]
+                elif (attrs["start_time"], data.shape[0]) != (
+                    self.start_time,
+                    self.nrows,
+                ):
+                    raise ValueError(
+                        f"{path} in {filename} does not have the time steps of {paths[0]}"
+                    )
+        except Exception:
+            self.h5.close()
+            raise
+
+    def close(self):
+        self.h5.close()
+
+
+def build_virtual_tidefile(filenames, outfile):
+    """
+    Write a tidefile that concatenates the tidefiles along time.
+
+    The time indexed tables are virtual datasets referring to the tidefiles by
+    absolute path, so those must stay in place. The other tables, all
+    attributes and the dimension scales are copied from the earliest
+    tidefile, except that the run end date and time in the scalar input table
+    are taken from the latest.
+
+    Parameters
+    ----------
+    filenames : list[str]
+        Hydro, qual or gtm tidefiles in any order.
+    outfile : str
+        Path for the virtual tidefile. It must not exist.
+
+    Returns
+    -------
+    str
+        outfile
+    """
+    return _write_virtual_tidefile(*get_time_blocks(filenames), outfile)
+
+
+def _write_virtual_tidefile(model, paths, blocks, outfile):
+    total = sum(rows for _, rows in blocks)
+    first_file, last_file = blocks[0][0], blocks[-1][0]
+    with h5py.File(first_file, "r") as hf, h5py.File(outfile, "w-") as nhf:
+        copy_attrs(hf, nhf)
+
+        def copy_group(group):
+            for item in group.values():
+                if isinstance(item, h5py.Group):
+                    copy_attrs(item, nhf.create_group(item.name))
+                    copy_group(item)
+                elif item.name not in paths:
+                    copy_dataset(item.name, hf, nhf)
+
+        copy_group(hf)
+        for path in paths:
+            data = hf[path]
+            layout = h5py.VirtualLayout(
+                shape=(total,) + data.shape[1:], dtype=data.dtype
+            )
+            offset = 0
+            for filename, rows in blocks:
+                with h5py.File(filename, "r") as f:
+                    shape = f[path].shape
+                source = h5py.VirtualSource(filename, path, shape=shape)
+                layout[offset : offset + rows] = source[:rows]
+                offset += rows
+            ntbl = nhf.create_virtual_dataset(path, layout)
+            copy_attrs(data, ntbl)
+        attach_dimension_scales(hf, nhf)
+        scalar_path = _SCALAR_TABLES[model]
+        if scalar_path in nhf and nhf[scalar_path].dtype.names == ("name", "value"):
+            with h5py.File(last_file, "r") as lf:
+                last = lf[scalar_path][()]
+            scalar = nhf[scalar_path][()]
+            for name in (b"run_end_date", b"run_end_time"):
+                scalar["value"][scalar["name"] == name] = last["value"][
+                    last["name"] == name
+                ]
+            nhf[scalar_path][...] = scalar
+    return outfile
+
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def open_multitidefile(filenames, outfile=None):
+    """
+    Open consecutive tidefiles as one HydroH5 or QualH5 reader over the
+    concatenated time axis (see build_virtual_tidefile).
+
+    Parameters
+    ----------
+    filenames : list[str]
+        Hydro, qual or gtm tidefiles in any order.
+    outfile : str | None
+        Path to write the virtual tidefile to (must not exist), so it can be
+        reopened later. By default a temporary file is used, which is removed
+        when the reader is.
+
+    Returns
+    -------
+    HydroH5 | QualH5
+        The reader, with the tidefiles in time order as its filenames
+    """
+    model, paths, blocks = get_time_blocks(filenames)
+    temporary = outfile is None
+    if temporary:
+        fd, outfile = tempfile.mkstemp(suffix=".h5", prefix="multitidefile-")
+        os.close(fd)
+        os.remove(outfile)
+    _write_virtual_tidefile(model, paths, blocks, outfile)
+    tidef = HydroH5(outfile) if model == "hydro" else QualH5(outfile)
+    tidef.filenames = [filename for filename, _ in blocks]
+    if temporary:
+        # runs after the reader has closed the file in __del__
+        weakref.finalize(tidef, _remove_quietly, outfile)
+    return tidef
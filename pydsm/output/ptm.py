@@ -1,30 +1,176 @@
 '''
 This module contains functions for Particle Tracking Model 
 '''
+import warnings
 import pandas as pd
 import numpy as np
-def load_ptm_trace(trace_file):
+
+# PTM trace files are whitespace separated integers, a header line of start
+# and end julian minutes, time step and number of particles, then one line
+# per particle event
+TRACE_COLUMNS=['julianmin','particle_id','node_id','waterbody_id']
+TRACE_DTYPES={'julianmin':np.int32,'particle_id':np.int32,'node_id':np.int16,'waterbody_id':np.int32}
+_TRACE_EPOCH=np.datetime64('1899-12-31','m')
+
+def read_ptm_trace_header(trace_file):
+    '''
+    Reads the header line of the PTM trace file
+    returns a dictionary containing the start_date, end_date, timestep and number of particles
+    '''
+    with open(trace_file,'rb') as fh:
+        return _parse_trace_header(fh.readline())
+
+def _parse_trace_header(line):
+    values=np.array(line.split(),dtype=np.int64)
+    if len(values)!=4:
+        raise ValueError('PTM trace header should have 4 values: %r'%line)
+    t0=pd.Timestamp('1899-12-31')
+    return {'start_date':t0+pd.to_timedelta(values[0],'m'),
+            'end_date':t0+pd.to_timedelta(values[1],'m'),
+            'timestep':values[2],
+            'nparticles':values[3]}
+
+def _trace_frame(values):
+    '''
+    DataFrame of the trace events in values (rows of TRACE_COLUMNS) in TRACE_DTYPES,
+    or int64 where a value does not fit, indexed by datetime
+    '''
+    columns={}
+    for i,name in enumerate(TRACE_COLUMNS):
+        column=values[:,i]
+        dtype=TRACE_DTYPES[name]
+        if len(column) and (column.min()<np.iinfo(dtype).min or column.max()>np.iinfo(dtype).max):
+            dtype=np.int64
+        columns[name]=column.astype(dtype)
+    index=pd.DatetimeIndex((_TRACE_EPOCH+columns['julianmin'].astype('timedelta64[m]')).astype('datetime64[ns]'),name='datetime')
+    return pd.DataFrame(columns,index=index)
+
+def iter_ptm_trace(trace_file,chunk_bytes=2**26):
+    '''
+    Iterates over the particle events of the PTM trace file in chunks, so that traces larger than
+    memory can be analysed. Each chunk of about chunk_bytes of the file is parsed with numpy in one call.
+    yields DataFrames as returned by load_ptm_trace (without the header)
+
+    Example Usage:
+    for df in iter_ptm_trace('trace.out'):
+        counts=counts.add(df.groupby('node_id').size(),fill_value=0)
+    '''
+    with open(trace_file,'rb') as fh:
+        _parse_trace_header(fh.readline())
+        rest=b''
+        while True:
+            block=fh.read(chunk_bytes)
+            if not block:
+                break
+            block=rest+block
+            last=block.rfind(b'\n')
+            if last<0:
+                rest=block
+                continue
+            rest=block[last+1:]
+            yield _parse_trace_block(block[:last+1])
+        if rest.strip():
+            yield _parse_trace_block(rest)
+
+def _parse_trace_block(block):
+    with warnings.catch_warnings():
+        # numpy warns, instead of failing, when it stops at text that is not an integer
+        warnings.simplefilter('error',DeprecationWarning)
+        try:
+            values=np.fromstring(block,dtype=np.int64,sep=' ')
+        except DeprecationWarning:
+            raise ValueError('PTM trace lines should only have integers')
+    counts=_count_line_values(block)
+    if (counts[counts>0]!=len(TRACE_COLUMNS)).any() or counts.sum()!=len(values):
+        raise ValueError('PTM trace lines should have %d integers'%len(TRACE_COLUMNS))
+    return _trace_frame(values.reshape(-1,len(TRACE_COLUMNS)))
+
+def _count_line_values(block):
+    '''
+    number of whitespace separated values on each line of the block, counted with numpy
+    '''
+    chars=np.frombuffer(block,dtype=np.uint8)
+    # whitespace and control characters, the latter are not valid in a trace anyway
+    blank=chars<=ord(' ')
+    starts=~blank
+    starts[1:]&=blank[:-1]
+    ends=np.append(np.flatnonzero(chars==ord('\n')),len(chars))
+    return np.diff(np.searchsorted(np.flatnonzero(starts),ends),prepend=0)
+
+def load_ptm_trace(trace_file,chunk_bytes=2**26):
     '''
     Loads the trace file output from PTM as a pandas dataframe and associate meta data as a dictionary
     returns the data frame and a dictionary containing the start_date, end_date, timestep and number of particles 
 
+    The file is read in chunks (see iter_ptm_trace) into int32 columns (int16 for node_id)
 
     Example Usage: 
     df,meta_info=load_ptm_trace('./dsm2_v8.2.0b1/studies/historical/output/trace.out')
 
     '''
-    column_names=['julianmin','particle_id','node_id','waterbody_id']
-    df=pd.read_csv(trace_file,sep=r'\s+',names=column_names)
-    t0=pd.Timestamp('1899-12-31')
-    row0=df.iloc[0]
-    start_date=t0+pd.to_timedelta(row0.julianmin,'m')
-    end_date=t0+pd.to_timedelta(row0.particle_id,'m') # really just misnamed
-    timestep=row0.node_id
-    nparticles=row0.waterbody_id
-    df=df[1:]
-    df.index=t0+pd.to_timedelta(df['julianmin'],'m')
-    df.index.name='datetime'
-    return df,{'start_date':start_date,'end_date':end_date,'timestep':timestep,'nparticles':nparticles}
+    meta=read_ptm_trace_header(trace_file)
+    chunks=list(iter_ptm_trace(trace_file,chunk_bytes))
+    if not chunks:
+        chunks=[_trace_frame(np.empty((0,len(TRACE_COLUMNS)),dtype=np.int64))]
+    return pd.concat(chunks),meta
+
+def ptm_trace_to_parquet(trace_file,out_dir,chunk_bytes=2**26,compression='zstd'):
+    '''
+    Converts the PTM trace file to a directory of Parquet files, one per chunk of the trace
+    (see iter_ptm_trace) so each holds a consecutive span of time. The header is kept in the
+    schema metadata. Requires pyarrow.
+    returns the list of Parquet files written
+
+    Read back with read_ptm_trace_parquet, or any Parquet reader, e.g. only some columns
+    or times with pd.read_parquet(out_dir,columns=[...],filters=[...])
+
+    All files have the same schema, with int32 columns (also for node_id). A value that
+    does not fit raises a ValueError.
+    '''
+    import json
+    import os
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    meta=read_ptm_trace_header(trace_file)
+    meta_json=json.dumps({k:str(v) for k,v in meta.items()})
+    os.makedirs(out_dir,exist_ok=True)
+    # one schema for every file, not the dtypes of each chunk, so the files read as one dataset
+    schema=pa.schema([(name,pa.int32()) for name in TRACE_COLUMNS]+[('datetime',pa.timestamp('ns'))])
+    files=[]
+    for i,df in enumerate(iter_ptm_trace(trace_file,chunk_bytes)):
+        table=pa.Table.from_pandas(df,schema=schema,preserve_index=True)
+        table=table.replace_schema_metadata({**table.schema.metadata,b'ptm_trace':meta_json.encode('utf-8')})
+        filename=os.path.join(out_dir,'part-%05d.parquet'%i)
+        pq.write_table(table,filename,compression=compression)
+        files.append(filename)
+    return files
+
+def read_ptm_trace_parquet(out_dir,columns=None,filters=None):
+    '''
+    Reads the Parquet files written by ptm_trace_to_parquet
+    returns the data frame and the dictionary of the header as load_ptm_trace does,
+    with node_id as int16 if the values fit
+    columns and filters select columns and rows as for pandas.read_parquet
+    '''
+    import glob
+    import json
+    import os
+    import pyarrow.parquet as pq
+    files=sorted(glob.glob(os.path.join(out_dir,'part-*.parquet')))
+    if not files:
+        raise FileNotFoundError('no PTM trace Parquet files in %s'%out_dir)
+    header=json.loads(pq.read_schema(files[0]).metadata[b'ptm_trace'])
+    meta={'start_date':pd.Timestamp(header['start_date']),
+          'end_date':pd.Timestamp(header['end_date']),
+          'timestep':np.int64(header['timestep']),
+          'nparticles':np.int64(header['nparticles'])}
+    df=pd.concat([pd.read_parquet(f,columns=columns,filters=filters) for f in files])
+    if 'node_id' in df:
+        node_id=df['node_id']
+        dtype=TRACE_DTYPES['node_id']
+        if not len(node_id) or (node_id.min()>=np.iinfo(dtype).min and node_id.max()<=np.iinfo(dtype).max):
+            df['node_id']=node_id.astype(dtype)
+    return df,meta
 
 # Reads ptm animation binary file. needs swap to small endians
 def load_anim_data(ptm_file):
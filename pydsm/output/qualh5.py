@@ -8,6 +8,7 @@ import pandas as pd
 import numpy as np
 
 from . import dsm2h5
+from .gtm_grid import gtm_grid
 
 
 class QualH5:
@@ -24,6 +25,7 @@ class QualH5:
      - /channel concentration (channel id, upstream/downstream)
      - /channel avg concentration  (channel id)
      - /reservoir concentration (reservoir name)
+     - /cell concentration (constituent, cell), GTM only
 
 
     """
@@ -57,6 +59,19 @@ class QualH5:
         if hasattr(self, 'h5'):
             self.h5.close()
 
+    def close(self):
+        """
+        closes the file, after which the instance can no longer read it
+        """
+        dsm2h5.release_time_indexed_tables(self.h5)
+        self.h5.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
     def is_gtm(self):
         return dsm2h5.get_model(self.h5) == "gtm"
 
@@ -100,17 +115,21 @@ class QualH5:
     def get_input_tables(self):
         return dsm2h5.get_paths_for_group_path(self.h5, "/input")
 
-    def get_input_table(self, table_path):
+    def get_input_table(self, table_path, string_dtype=None):
         """See get_input_tables for a list of table paths
-        Returns a dataframe for the contents of the table at the path"""
-        return dsm2h5.read_table_as_df(self.h5, table_path)
+        Returns a dataframe for the contents of the table at the path
+        (see dsm2h5.read_table_as_df for string_dtype)"""
+        return dsm2h5.read_table_as_df(self.h5, table_path, string_dtype)
 
     def get_data_tables(self):
-        return [
+        tables = [
             "channel avg concentration",
             "channel concentration",
             "reservoir concentration",
         ]
+        if "/output/cell concentration" in self.h5:
+            tables.append("cell concentration")
+        return tables
 
     def get_constituents(self):
         """
@@ -167,7 +186,21 @@ class QualH5:
         df.columns = ["channel_number"]
         return df
 
-    def create_catalog(self):
+    def create_catalog(self, use_cache=False, cache_dir=None):
+        """
+        return a DataFrame cataloging the time series in the tidefile
+
+        With use_cache the catalog is kept in an on-disk cache next to the
+        tidefile (or in cache_dir) and is only rebuilt when the file changes
+        (see dsm2h5.get_cached_catalog).
+        """
+        if use_cache:
+            return dsm2h5.get_cached_catalog(
+                self.filename, self._build_catalog, cache_dir
+            )
+        return self._build_catalog()
+
+    def _build_catalog(self):
         dfc = self.get_channels()
         dfr = self.get_reservoirs()
         dfcon = self.get_constituents()
@@ -176,10 +209,10 @@ class QualH5:
                 dsm2h5.create_catalog_entry(
                     self.filename,
                     dfc,
-                    r["constituent_names"],
+                    name,
                     "mg/L",
                 )
-                for _, r in dfcon.iterrows()
+                for name in dfcon["constituent_names"]
             ]
         )
         if dsm2h5.get_model(self.h5) == "qual":  # no avg concentration for gtm
@@ -188,12 +221,12 @@ class QualH5:
                     dsm2h5.create_catalog_entry(
                         self.filename,
                         dfc,
-                        r["constituent_names"],
+                        name,
                         "mg/L",
                         updown=False,
                         prefix="CHAN_",
                     )
-                    for _, r in dfcon.iterrows()
+                    for name in dfcon["constituent_names"]
                 ]
             )
         res_chat = pd.concat(
@@ -201,13 +234,13 @@ class QualH5:
                 dsm2h5.create_catalog_entry(
                     self.filename,
                     dfr,
-                    r["constituent_names"],
+                    name,
                     "mg/L",
                     updown=False,
                     prefix="RES_",
                     id_column="name",
                 )
-                for _, r in dfcon.iterrows()
+                for name in dfcon["constituent_names"]
             ]
         )
         if dsm2h5.get_model(self.h5) == "qual":
@@ -245,6 +278,73 @@ class QualH5:
         else:
             raise ValueError("Unknown type: " + catalog_entry["type"])
 
+    def get_data_for_catalog(self, catalog, time_window=None, as_dict=False):
+        """Get the data for many catalog entries at once.
+
+        Entries of the same data table, constituent (and location) are read
+        with one hyperslab read, so this is much faster than calling
+        `get_data_for_catalog_entry` for each entry.
+
+        Parameters
+        ----------
+        catalog : pandas.DataFrame
+            Rows of the catalog (see `create_catalog`).
+        time_window : str | None
+            Optional DSM2 style window "START-END".
+        as_dict : bool, default False
+            Return a dict of (id, variable) to a one column DataFrame, as
+            returned by `get_data_for_catalog_entry`, instead.
+
+        Returns
+        -------
+        pandas.DataFrame
+            Time-indexed data with an (id, variable) column per entry.
+        """
+        return dsm2h5.get_data_for_catalog(self, catalog, time_window, as_dict)
+
+    def _catalog_column_request(self, catalog_entry):
+        """the dsm2h5.ColumnRequest for a catalog entry"""
+        entry_id = catalog_entry["id"]
+        constituent_index = self._names_to_constituent_indices(
+            catalog_entry["variable"]
+        )
+        objtype, _, name = entry_id.partition("_")
+        if objtype == "CHAN":
+            idfields = name.split("_")
+            channel_index = self._channel_ids_to_indicies(idfields[0])
+            if len(idfields) == 1:
+                return dsm2h5.ColumnRequest(
+                    "/output/channel avg concentration",
+                    (constituent_index, channel_index),
+                    1,
+                    idfields[0],
+                    0,
+                )
+            location = idfields[1].lower() + "stream"
+            return dsm2h5.ColumnRequest(
+                "/output/channel concentration",
+                (
+                    constituent_index,
+                    channel_index,
+                    self._channel_locations_to_indicies(location),
+                ),
+                1,
+                f"{idfields[0]}-{location}",
+                0,
+            )
+        elif objtype == "RES":
+            index = dsm2h5.get_position(
+                self.get_reservoirs()["name"], name, "reservoir"
+            )
+            return dsm2h5.ColumnRequest(
+                "/output/reservoir concentration",
+                (constituent_index, index),
+                1,
+                name,
+                0,
+            )
+        raise ValueError(f"Unknown catalog entry: {entry_id}")
+
     def _names_to_constituent_indices(self, constituent_name):
         if isinstance(constituent_name, str):
             return self.constituents[constituent_name]
@@ -306,6 +406,8 @@ class QualH5:
         channels,
         location="upstream",
         timewindow=None,
+        as_array=False,
+        as_xarray=False,
     ):
         """
         return a pandas DataFrame of time series from the table for the given
@@ -330,6 +432,11 @@ class QualH5:
         timewindow : str | None
             Optional DSM2 style time window "START-END". If provided the
             result is limited to that interval.
+        as_array : bool, default False
+            Return the array as read without any pandas wrapping.
+        as_xarray : bool, default False
+            Return a xarray.DataArray over the array as read with time,
+            constituent, channel and location coordinates.
 
         Returns
         -------
@@ -350,6 +457,35 @@ class QualH5:
                 for i in sorted(self.channel_index2number.keys())
             ]
         channel_indices = self._channel_ids_to_indicies(channels)
+        if as_array or as_xarray:
+            other_indices = (constituent_indices, channel_indices)
+            coords = {"constituent": constituent_names, "channel": channels}
+            dims = [
+                dim
+                for dim, index in zip(["constituent", "channel"], other_indices)
+                if not isinstance(index, (int, np.integer))
+            ]
+            if location:
+                other_indices += (self._channel_locations_to_indicies(location),)
+                coords["location"] = location
+                if not isinstance(location, str):
+                    dims.append("location")
+            return dsm2h5.read_time_indexed_table(
+                self.h5,
+                table_path,
+                timewindow,
+                *other_indices,
+                as_array=as_array,
+                as_xarray=as_xarray,
+                dims=dims,
+                coords=coords,
+            )
+        if not isinstance(constituent_names, str) or (
+            location and not isinstance(location, str)
+        ):
+            return self._get_multi_channel_ts(
+                table_path, constituent_names, channels, location, timewindow
+            )
         if location:
             location_indices = self._channel_locations_to_indicies(location)
             df = dsm2h5.read_time_indexed_table(
@@ -370,6 +506,99 @@ class QualH5:
             df.columns = [f"{id}" for id in self._channel_ids_to_sequence(channels)]
         return df
 
+    def _get_multi_channel_ts(
+        self, table_path, constituent_names, channels, location, timewindow=None
+    ):
+        """
+        return a DataFrame of the constituents x channels (x locations) read
+        with one hyperslab read, with (constituent, channel[, location])
+        MultiIndex columns
+        """
+        constituents = list(dsm2h5.normalize_to_slice(constituent_names))
+        channels = list(self._channel_ids_to_sequence(channels))
+        other_indices = [
+            self._names_to_constituent_indices(constituents),
+            self._channel_ids_to_indicies(channels),
+        ]
+        labels = [constituents, channels]
+        names = ["constituent", "channel"]
+        if location:
+            locations = list(dsm2h5.normalize_to_slice(location))
+            other_indices.append(self._channel_locations_to_indicies(locations))
+            labels.append(locations)
+            names.append("location")
+        return dsm2h5.read_time_indexed_table(
+            self.h5,
+            table_path,
+            timewindow,
+            *other_indices,
+            columns=pd.MultiIndex.from_product(labels, names=names),
+        )
+
+    def iter_channel_ts(
+        self,
+        constituent_name,
+        channels,
+        location="upstream",
+        timewindow=None,
+        chunk="30D",
+    ):
+        """Iterate over channel concentrations in consecutive blocks of time.
+
+        Only one block is read and held in memory at a time. Blocks are
+        aligned with the HDF5 chunks of the dataset.
+
+        Parameters
+        ----------
+        constituent_name : str
+            Constituent identifier (e.g. 'ec').
+        channels : str | int | list[str|int]
+            Channel identifier(s) or "all".
+        location : str | None, default "upstream"
+            Channel end; None reads the channel avg concentration instead.
+        timewindow : str | None
+            Optional DSM2 style window "START-END".
+        chunk : str | int | None, default "30D"
+            Block length as a duration, a number of time steps, or None for
+            a single HDF5 chunk. Rounded to a whole number of HDF5 chunks.
+
+        Yields
+        ------
+        pandas.DataFrame
+            Time-indexed block with the same columns as
+            `get_channel_concentration` (or `get_channel_avg_concentration`).
+        """
+        constituent_indices = self._names_to_constituent_indices(constituent_name)
+        if isinstance(channels, list):
+            channels = [str(c) for c in channels]
+        else:
+            channels = str(channels)
+        if isinstance(channels, str) and channels.lower() == "all":
+            channels = [
+                self.channel_index2number[i]
+                for i in sorted(self.channel_index2number.keys())
+            ]
+        channel_indices = self._channel_ids_to_indicies(channels)
+        if location:
+            table_path = "/output/channel concentration"
+            other_indices = (
+                constituent_indices,
+                channel_indices,
+                self._channel_locations_to_indicies(location),
+            )
+            columns = [
+                f"{id}-{location}" for id in self._channel_ids_to_sequence(channels)
+            ]
+        else:
+            table_path = "/output/channel avg concentration"
+            other_indices = (constituent_indices, channel_indices)
+            columns = [f"{id}" for id in self._channel_ids_to_sequence(channels)]
+        for df in dsm2h5.iter_time_indexed_table(
+            self.h5, table_path, timewindow, *other_indices, chunk=chunk
+        ):
+            df.columns = columns
+            yield df
+
     def _get_reservoir_ts(
         self, table_path, constituent_names, reservoirs_names, timewindow=None
     ):
@@ -378,6 +607,20 @@ class QualH5:
         res = self.get_reservoirs()
         res_names = dsm2h5.normalize_to_slice(reservoirs_names)
         indices = res[res.name.isin(res_names)].index.values
+        if not isinstance(constituent_names, str):
+            # one read for all constituents
+            columns = pd.MultiIndex.from_product(
+                [list(constituent_names), res.name[indices].tolist()],
+                names=["constituent", "reservoir"],
+            )
+            return dsm2h5.read_time_indexed_table(
+                self.h5,
+                table_path,
+                timewindow,
+                constituent_indices,
+                indices,
+                columns=columns,
+            )
         df = dsm2h5.read_time_indexed_table(
             self.h5, table_path, timewindow, constituent_indices, indices
         )
@@ -385,27 +628,47 @@ class QualH5:
         return df
 
     def get_channel_concentration(
-        self, constituent_name, channel_id, location_id="upstream", timewindow=None
+        self,
+        constituent_name,
+        channel_id,
+        location_id="upstream",
+        timewindow=None,
+        as_array=False,
+        as_xarray=False,
     ):
         """Return channel concentration time series for a constituent.
 
         Parameters
         ----------
-        constituent_name : str
-            Constituent identifier (e.g. 'ec').
+        constituent_name : str | list[str]
+            Constituent identifier (e.g. 'ec') or a list of them.
         channel_id : str | int | list[str|int]
             Channel identifier(s) or the special keyword "all" for every
             channel. Lists can mix ints/strings.
-        location_id : str, default "upstream"
-            Channel end: "upstream" or "downstream".
+        location_id : str | list[str], default "upstream"
+            Channel end: "upstream" or "downstream", or a list of both.
         timewindow : str | None
             Optional DSM2 style window "START-END" (e.g. "15JAN2020 - 31JAN2020").
+        as_array : bool, default False
+            Return the numpy array as read instead of a DataFrame.
+        as_xarray : bool, default False
+            Return a xarray.DataArray (time, channel) with constituent and
+            location coordinates instead of a DataFrame. Requires xarray.
+            Lists of constituents or locations add those dimensions.
 
         Returns
         -------
         pandas.DataFrame
             Time-indexed concentrations with one column per requested channel
-            (location suffix included when applicable).
+            (location suffix included when applicable). For a list of
+            constituents or locations all are read in one pass into
+            (constituent, channel, location) MultiIndex columns.
+
+        Examples
+        --------
+        >>> df = qual.get_channel_concentration(
+        ...     ["ec", "doc", "temp"], "all", ["upstream", "downstream"])
+        >>> df["ec"]  # (channel, location) columns of ec
         """
         return self._get_channel_ts(
             "/output/channel concentration",
@@ -413,21 +676,31 @@ class QualH5:
             channel_id,
             location_id,
             timewindow,
+            as_array=as_array,
+            as_xarray=as_xarray,
         )
 
     def get_channel_avg_concentration(
-        self, constituent_name, channel_id, timewindow=None
+        self,
+        constituent_name,
+        channel_id,
+        timewindow=None,
+        as_array=False,
+        as_xarray=False,
     ):
         """Return channel average concentration time series (no location dimension).
 
         Parameters
         ----------
-        constituent_name : str
-            Constituent identifier.
+        constituent_name : str | list[str]
+            Constituent identifier, or a list of them read in one pass into
+            (constituent, channel) MultiIndex columns.
         channel_id : str | int | list[str|int]
             Channel identifier(s) or "all".
         timewindow : str | None
             Optional DSM2 style window.
+        as_array, as_xarray : bool
+            Return modes as for `get_channel_concentration`.
         """
         return self._get_channel_ts(
             "/output/channel avg concentration",
@@ -435,13 +708,16 @@ class QualH5:
             channel_id,
             None,
             timewindow,
+            as_array=as_array,
+            as_xarray=as_xarray,
         )
 
     def get_reservoir_concentration(
         self, constituent_name, reservoir_name, timewindow=None
     ):
         """
-        get reservoir concentration
+        get reservoir concentration. For a list of constituents all are read
+        in one pass into (constituent, reservoir) MultiIndex columns.
         """
         return self._get_reservoir_ts(
             "/output/reservoir concentration",
@@ -449,3 +725,245 @@ class QualH5:
             reservoir_name,
             timewindow,
         )
+
+    def _get_cell_table(self):
+        """
+        return the cell concentration table and the names of its dimensions
+        after time, ("constituent", "cell") unless its DIMENSION_LABELS put the
+        cells first
+        """
+        data = self.h5.get("/output/cell concentration")
+        if data is None:
+            raise ValueError(
+                f"{self.filename} has no cell concentration (GTM tidefiles only)"
+            )
+        labels = [label.lower() for label in dsm2h5.get_dimension_labels(data)[1:]]
+        if len(labels) == 2 and labels[1].startswith("constituent"):
+            return data, ("cell", "constituent")
+        return data, ("constituent", "cell")
+
+    def get_grid(self, hydro_echo_fn=None):
+        """
+        return the gtm_grid of the cells, segments and channels of the tidefile.
+        The hydro echo file is needed for its node and reservoir tables only.
+        """
+        if getattr(self, "_grid", None) is None or (
+            hydro_echo_fn is not None and self._grid.hydro_echo_fn != hydro_echo_fn
+        ):
+            self._grid = gtm_grid(self.filename, hydro_echo_fn)
+        return self._grid
+
+    def get_channel_cells(self, channel_id):
+        """
+        return the cell numbers (from 1) of the channel(s), in the order of the
+        channels and along each channel from upstream, through get_grid
+        """
+        cells = self.get_grid().cells
+        if isinstance(channel_id, str) and channel_id.lower() == "all":
+            return cells["cell"].to_numpy()
+        channels = np.atleast_1d(np.asarray(channel_id)).astype(int)
+        by_channel = cells.groupby("chan_num", sort=False)["cell"]
+        try:
+            return np.concatenate(
+                [by_channel.get_group(c).to_numpy() for c in channels]
+            )
+        except KeyError as e:
+            raise ValueError(f"channel {e} has no cells in {self.filename}")
+
+    def _cell_read_args(self, constituent_name, cells, channel_id):
+        """
+        return the indices to read from the cell concentration table, the
+        cell numbers and the dimension names in table order
+        """
+        data, dims = self._get_cell_table()
+        ncell = data.shape[1 + dims.index("cell")]
+        if channel_id is not None:
+            cells = self.get_channel_cells(channel_id)
+        if isinstance(cells, str) and cells.lower() == "all":
+            cell_numbers = np.arange(1, ncell + 1)
+            cell_index = slice(None)
+        else:
+            cell_numbers = np.atleast_1d(np.asarray(cells)).astype(int)
+            if len(cell_numbers) and (
+                cell_numbers.min() < 1 or cell_numbers.max() > ncell
+            ):
+                raise ValueError(f"cells should be in 1 to {ncell}: {cells}")
+            cell_index = (cell_numbers - 1).tolist()
+        index = {
+            "constituent": self._names_to_constituent_indices(constituent_name),
+            "cell": cell_index,
+        }
+        return [index[dim] for dim in dims], cell_numbers, dims
+
+    def _cell_columns(self, constituent_name, cell_numbers, dims):
+        cells = pd.Index(cell_numbers, name="cell")
+        if isinstance(constituent_name, str):
+            return cells
+        labels = {"constituent": list(constituent_name), "cell": cells}
+        return pd.MultiIndex.from_product([labels[dim] for dim in dims], names=dims)
+
+    def get_cell_concentration(
+        self,
+        constituent_name,
+        cells="all",
+        timewindow=None,
+        channel_id=None,
+        as_array=False,
+        as_xarray=False,
+    ):
+        """Return GTM cell concentration time series.
+
+        The cells and constituents are read with one hyperslab read, through a
+        memory map when the table is contiguous (see
+        dsm2h5.read_time_indexed_table).
+
+        Parameters
+        ----------
+        constituent_name : str | list[str]
+            Constituent identifier (e.g. 'ec') or a list of them.
+        cells : int | list[int] | "all", default "all"
+            Cell numbers, from 1.
+        timewindow : str | None
+            Optional DSM2 style window "START-END".
+        channel_id : str | int | list[str|int] | None
+            Read the cells of these channels instead of cells, from upstream
+            (see get_channel_cells).
+        as_array : bool, default False
+            Return the numpy array as read, in the dimension order of the table,
+            instead of a DataFrame.
+        as_xarray : bool, default False
+            Return a xarray.DataArray with time, cell and (for a list)
+            constituent dimensions in table order. Requires xarray.
+
+        Returns
+        -------
+        pandas.DataFrame
+            Time-indexed concentrations with a column per cell number, or
+            (constituent, cell) MultiIndex columns for a list of constituents.
+        """
+        other_indices, cell_numbers, dims = self._cell_read_args(
+            constituent_name, cells, channel_id
+        )
+        if as_array or as_xarray:
+            return dsm2h5.read_time_indexed_table(
+                self.h5,
+                "/output/cell concentration",
+                timewindow,
+                *other_indices,
+                as_array=as_array,
+                as_xarray=as_xarray,
+                dims=[
+                    dim
+                    for dim, index in zip(dims, other_indices)
+                    if not isinstance(index, (int, np.integer))
+                ],
+                coords={"constituent": constituent_name, "cell": cell_numbers},
+            )
+        df = dsm2h5.read_time_indexed_table(
+            self.h5,
+            "/output/cell concentration",
+            timewindow,
+            *other_indices,
+            columns=self._cell_columns(constituent_name, cell_numbers, dims),
+        )
+        if isinstance(df.columns, pd.MultiIndex) and dims[0] == "cell":
+            df.columns = df.columns.reorder_levels(["constituent", "cell"])
+        return df
+
+    def iter_cell_concentration(
+        self,
+        constituent_name,
+        cells="all",
+        timewindow=None,
+        channel_id=None,
+        chunk="30D",
+    ):
+        """Iterate over GTM cell concentrations in consecutive blocks of time.
+
+        Only one block is read and held in memory at a time. Parameters are as
+        for `get_cell_concentration` with chunk as for `iter_channel_ts`.
+
+        Yields
+        ------
+        pandas.DataFrame
+            Time-indexed block with the columns of `get_cell_concentration`.
+        """
+        other_indices, cell_numbers, dims = self._cell_read_args(
+            constituent_name, cells, channel_id
+        )
+        columns = self._cell_columns(constituent_name, cell_numbers, dims)
+        for df in dsm2h5.iter_time_indexed_table(
+            self.h5,
+            "/output/cell concentration",
+            timewindow,
+            *other_indices,
+            chunk=chunk,
+            columns=columns,
+        ):
+            if isinstance(columns, pd.MultiIndex) and dims[0] == "cell":
+                df.columns = columns.reorder_levels(["constituent", "cell"])
+            yield df
+
+    def get_data_table_layout(self):
+        """
+        return a dict of data table name to the names of its dimensions after
+        time and a dict of coordinates labelling them (from the output tables)
+        """
+        constituent = self.get_constituents()["constituent_names"].to_numpy(dtype=str)
+        channel = self.get_channels()[0].to_numpy(dtype=str)
+        location = self.get_channel_locations()[0].to_numpy(dtype=str)
+        reservoir = self.get_reservoirs()["name"].to_numpy(dtype=str)
+        layout = {
+            "channel concentration": (
+                ("constituent", "channel", "location"),
+                {"constituent": constituent, "channel": channel, "location": location},
+            ),
+            "channel avg concentration": (
+                ("constituent", "channel"),
+                {"constituent": constituent, "channel": channel},
+            ),
+            "reservoir concentration": (
+                ("constituent", "reservoir"),
+                {"constituent": constituent, "reservoir": reservoir},
+            ),
+        }
+        if "/output/cell concentration" in self.h5:
+            data, dims = self._get_cell_table()
+            cell = np.arange(1, data.shape[1 + dims.index("cell")] + 1)
+            layout["cell concentration"] = (
+                dims,
+                {"constituent": constituent, "cell": cell},
+            )
+        return layout
+
+    def to_xarray(self, chunk="30D"):
+        """Return all data tables as a lazily loaded xarray.Dataset.
+
+        The channel concentration, channel avg concentration and reservoir
+        concentration tables become dask backed variables (e.g.
+        "channel_concentration") with time, constituent, channel, location and
+        reservoir coordinates from the output tables. Nothing is read until the
+        variables are computed, and the tidefile must stay open until then.
+        Requires xarray and dask.
+
+        Parameters
+        ----------
+        chunk : str | int | None, default "30D"
+            Time length of each dask chunk, rounded to whole HDF5 chunks
+            (see dsm2h5.get_time_block_rows).
+        """
+        import xarray as xr
+
+        data_vars = {}
+        for table, (dims, coords) in self.get_data_table_layout().items():
+            data = self.h5.get(f"/output/{table}")
+            if data is None:
+                continue
+            name = table.replace(" ", "_")
+            data_vars[name] = dsm2h5.to_lazy_dataarray(
+                data, ("time",) + dims, coords, name=name, chunk=chunk
+            )
+        return xr.Dataset(
+            data_vars,
+            attrs={"filename": self.filename, "model": dsm2h5.get_model(self.h5)},
+        )
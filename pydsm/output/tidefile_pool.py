@@ -0,0 +1,197 @@
+"""
+Process local pool of open tidefile readers.
+
+HydroH5 and QualH5 open the tidefile and read its metadata tables when they
+are created. Helpers that take a tidefile path and open their own reader pay
+that cost again for every call. `TidefilePool` keeps readers open by path
+instead:
+
+    pool = TidefilePool(max_open=16)
+    with pool.open("hist_qual.h5") as qualt:
+        ...
+
+The pool holds at most max_open readers and closes the least recently used
+reader that is not in use (inside a `with pool.open(...)` block) when another
+is opened. A file that changed since it was opened is reopened, and the
+reader of the old file closed once it is no longer in use. HDF5 handles
+must not be shared with forked child processes, so a pool used in a child
+(e.g. a multiprocessing worker) drops the readers inherited from its parent
+and opens its own.
+
+`get_tidefile_pool` returns the pool shared by the pydsm helpers and
+`open_tidefile` opens from it.
+"""
+
+import collections
+import contextlib
+import os
+import threading
+
+from pydsm.output import dsm2h5
+from pydsm.output.hydroh5 import HydroH5
+from pydsm.output.qualh5 import QualH5
+
+
+def _reader_class(filename):
+    if dsm2h5.get_model_from_file(filename) == "hydro":
+        return HydroH5
+    return QualH5
+
+
+class TidefilePool:
+    """
+    LRU pool of HydroH5 and QualH5 readers opened read only, keyed by the
+    absolute path of the tidefile.
+
+    opens, hits and closes count the readers opened, the requests served by an
+    open reader and the readers closed (see stats).
+    """
+
+    def __init__(self, max_open=16):
+        """
+        :param max_open: bound on the number of open readers. Readers in use
+            are never closed, so more may be open while they are.
+        """
+        self.max_open = max_open
+        self._readers = collections.OrderedDict()
+        self._in_use = collections.Counter()
+        # reader -> number of open() blocks, for readers replaced while in use
+        self._retired = {}
+        self._lock = threading.RLock()
+        self._pid = os.getpid()
+        self.opens = self.hits = self.closes = 0
+
+    def _check_fork(self):
+        if os.getpid() != self._pid:
+            # the handles belong to the parent process, open new ones here
+            self._readers = collections.OrderedDict()
+            self._in_use = collections.Counter()
+            self._retired = {}
+            self._lock = threading.RLock()
+            self._pid = os.getpid()
+
+    def get(self, filename, reader_class=None):
+        """
+        an open reader for the tidefile, opened if needed
+
+        The reader may be closed once max_open other tidefiles are opened from
+        the pool, so use open() to hold on to it.
+
+        :param filename: hydro, qual or gtm tidefile
+        :param reader_class: HydroH5 or QualH5, by default chosen by the model
+            of the tidefile
+        """
+        self._check_fork()
+        path = os.path.abspath(filename)
+        mtime = os.stat(path).st_mtime_ns
+        with self._lock:
+            entry = self._readers.get(path)
+            if entry is not None:
+                reader, opened_mtime = entry
+                if opened_mtime == mtime and (
+                    reader_class is None or isinstance(reader, reader_class)
+                ):
+                    self._readers.move_to_end(path)
+                    self.hits += 1
+                    return reader
+                if self._in_use[path]:
+                    # closed when the last open() block using it exits
+                    self._retired[reader] = self._in_use.pop(path)
+                    del self._readers[path]
+                else:
+                    self._close(path)
+            reader = (reader_class or _reader_class(path))(path)
+            self._readers[path] = (reader, mtime)
+            self._readers.move_to_end(path)
+            self.opens += 1
+            self._evict(keep=path)
+            return reader
+
+    @contextlib.contextmanager
+    def open(self, filename, reader_class=None):
+        """
+        context manager for an open reader for the tidefile (see get), which is
+        not closed by the pool while in the with block
+        """
+        self._check_fork()
+        path = os.path.abspath(filename)
+        with self._lock:
+            # marked in use before releasing the lock so no other thread can
+            # close the reader in between
+            reader = self.get(filename, reader_class)
+            self._in_use[path] += 1
+        try:
+            yield reader
+        finally:
+            with self._lock:
+                if reader in self._retired:
+                    self._retired[reader] -= 1
+                    if not self._retired[reader]:
+                        del self._retired[reader]
+                        reader.close()
+                        self.closes += 1
+                else:
+                    self._in_use[path] -= 1
+                    if not self._in_use[path]:
+                        del self._in_use[path]
+                self._evict()
+
+    def _evict(self, keep=None):
+        for path in list(self._readers):
+            if len(self._readers) <= self.max_open:
+                break
+            if path != keep and not self._in_use[path]:
+                self._close(path)
+
+    def _close(self, path):
+        reader, _ = self._readers.pop(path)
+        reader.close()
+        self.closes += 1
+
+    def close(self, filename=None):
+        """close the reader for the tidefile, or all readers not in use"""
+        self._check_fork()
+        with self._lock:
+            if filename is not None:
+                path = os.path.abspath(filename)
+                if path in self._readers:
+                    self._close(path)
+                return
+            for path in list(self._readers):
+                if not self._in_use[path]:
+                    self._close(path)
+
+    def stats(self):
+        """dict of the open, hit and close counts and the number open"""
+        with self._lock:
+            return {
+                "opens": self.opens,
+                "hits": self.hits,
+                "closes": self.closes,
+                "open": len(self._readers),
+            }
+
+    def __len__(self):
+        return len(self._readers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+_pool = None
+
+
+def get_tidefile_pool():
+    """the pool shared by the pydsm helpers that take tidefile paths"""
+    global _pool
+    if _pool is None:
+        _pool = TidefilePool()
+    return _pool
+
+
+def open_tidefile(filename, reader_class=None):
+    """context manager for a reader from the shared pool (see TidefilePool.open)"""
+    return get_tidefile_pool().open(filename, reader_class)
@@ -0,0 +1,284 @@
+"""
+Rechunk and recompress DSM2 hydro, qual and GTM tidefiles.
+
+DSM2 writes its time indexed tables with small time-major chunks. That suits
+reading all channels for a few time steps, but full-period reads of a few
+channels decompress the whole table. `repack_tidefile` rewrites a tidefile
+with one of these chunk layouts for the time indexed tables:
+
+    time-major     chunks hold all channels for a block of time steps
+    channel-major  chunks hold one channel for a long block of time steps
+    balanced       chunks hold a few channels for a medium block of time steps
+
+and gzip, lzf or (with hdf5plugin installed) blosc compression. All groups,
+attributes and the geometry/input tables are copied as is, and the dimension
+scales are attached again in the new file. The time indexed
+tables are copied a block of time steps at a time, so memory use is bounded
+by the block size and not by the size of the tidefile.
+"""
+
+import click
+import h5py
+import numpy as np
+
+LAYOUTS = ["time-major", "channel-major", "balanced"]
+COMPRESSIONS = ["gzip", "lzf", "blosc", "none"]
+# number of channels per chunk in the balanced layout
+_BALANCED_CHANNELS = 32
+# attributes holding object references, which would point into the source file
+_REFERENCE_ATTRS = ("DIMENSION_LIST", "REFERENCE_LIST")
+
+
+def _size(shape):
+    return int(np.prod(shape, dtype=np.int64))
+
+
+def get_compression_options(compression="gzip", level=None):
+    """
+    keyword arguments for h5py create_dataset for the compression
+
+    :param compression: one of gzip, lzf, blosc (requires hdf5plugin) or none
+    :param level: compression level for gzip (default 4) and blosc (default 5)
+    """
+    if compression == "gzip":
+        return {
+            "compression": "gzip",
+            "compression_opts": 4 if level is None else level,
+            "shuffle": True,
+        }
+    elif compression == "lzf":
+        return {"compression": "lzf", "shuffle": True}
+    elif compression == "blosc":
+        try:
+            import hdf5plugin
+        except ImportError:
+            raise ValueError(
+                "blosc compression requires hdf5plugin: pip install hdf5plugin"
+            )
+        return dict(
+            hdf5plugin.Blosc(
+                cname="zstd",
+                clevel=5 if level is None else level,
+                shuffle=hdf5plugin.Blosc.SHUFFLE,
+            )
+        )
+    elif compression == "none":
+        return {}
+    else:
+        raise ValueError(f"compression should be one of {COMPRESSIONS}: {compression}")
+
+
+def get_chunk_shape(
+    shape, itemsize, layout="balanced", chunk_bytes=2**20, block_bytes=2**28
+):
+    """
+    chunk shape of a time indexed table for the layout
+
+    The channel dimension is taken to be the largest dimension after time. The
+    number of time steps per chunk fills chunk_bytes, but is limited so that a
+    block of one chunk along time across all channels fits in block_bytes.
+
+    :param shape: shape of the table, time first
+    :param itemsize: bytes per value
+    :param layout: one of time-major, channel-major or balanced
+    :param chunk_bytes: target size of a chunk in bytes
+    :param block_bytes: bound on the bytes held in memory while copying
+    :return: chunk shape or None if the table is empty
+    """
+    if layout not in LAYOUTS:
+        raise ValueError(f"layout should be one of {LAYOUTS}: {layout}")
+    if 0 in shape:
+        return None
+    other = list(shape[1:])
+    if layout != "time-major":
+        axis = int(np.argmax(other))
+        if layout == "channel-major":
+            other[axis] = 1
+        else:
+            other[axis] = min(other[axis], _BALANCED_CHANNELS)
+    rows = max(1, chunk_bytes // (itemsize * _size(other)))
+    rows = min(rows, shape[0], max(1, block_bytes // (itemsize * _size(shape[1:]))))
+    return (rows, *other)
+
+
+def is_time_indexed_table(data):
+    """True for the data tables with start_time and interval attributes"""
+    return data.ndim >= 2 and "start_time" in data.attrs and "interval" in data.attrs
+
+
+def copy_attrs(fromobj, toobj):
+    """
+    copy the attributes of the group or dataset except the dimension scale
+    references (see attach_dimension_scales), keeping their stored types so
+    e.g. the null terminated dimension scale names are not cut short
+    """
+    for key, value in fromobj.attrs.items():
+        if key not in _REFERENCE_ATTRS:
+            toobj.attrs.create(key, value, dtype=fromobj.attrs.get_id(key).dtype)
+
+
+def copy_dataset(path, fromhf, tohf):
+    """copy the dataset at path as is, apart from copy_attrs"""
+    data = fromhf[path]
+    tohf[path] = data[()]
+    copy_attrs(data, tohf[path])
+
+
+def attach_dimension_scales(fromhf, tohf):
+    """
+    attach the dimension scales in tohf to its datasets as the scales of the
+    same paths are attached to the datasets in fromhf. Object references can
+    not be copied between files, so this replaces copying DIMENSION_LIST and
+    REFERENCE_LIST.
+    """
+
+    def visit(name, item):
+        if isinstance(item, h5py.Dataset) and "DIMENSION_LIST" in item.attrs:
+            ntbl = tohf[name]
+            # H5DSattach_scale fails on datasets with a CLASS attribute that is
+            # not a scalar string, like the ["TIMESERIES"] of the DSM2 tables
+            class_attr = ntbl.attrs.get("CLASS")
+            if class_attr is not None:
+                del ntbl.attrs["CLASS"]
+            for i, dim in enumerate(item.dims):
+                for scale in dim.values():
+                    ntbl.dims[i].attach_scale(tohf[scale.name])
+            if class_attr is not None:
+                ntbl.attrs["CLASS"] = class_attr
+
+    fromhf.visititems(visit)
+
+
+def repack_table(data, tohf, chunks, compression_options, block_bytes=2**28):
+    """
+    copy the table to the same path in tohf with the chunks and compression,
+    a block of whole chunks along time at a time
+    """
+    ntbl = tohf.create_dataset(
+        data.name,
+        shape=data.shape,
+        dtype=data.dtype,
+        chunks=chunks,
+        **compression_options,
+    )
+    copy_attrs(data, ntbl)
+    row_bytes = data.dtype.itemsize * _size(data.shape[1:])
+    rows = chunks[0]
+    if data.chunks:
+        # also align the blocks with the chunks read, so none is read twice
+        aligned = int(np.lcm(rows, data.chunks[0]))
+        if aligned * row_bytes <= block_bytes:
+            rows = aligned
+    rows *= max(1, block_bytes // (rows * row_bytes))
+    for start in range(0, data.shape[0], rows):
+        ntbl[start : start + rows] = data[start : start + rows]
+    return ntbl
+
+
+def repack_tidefile(
+    infile,
+    outfile,
+    layout="balanced",
+    compression="gzip",
+    level=None,
+    chunk_kb=1024,
+    block_mb=256,
+):
+    """
+    Rewrite a hydro, qual or GTM tidefile with a new chunk layout and
+    compression for the time indexed tables.
+
+    Parameters
+    ----------
+    infile : str
+        Tidefile to repack.
+    outfile : str
+        New tidefile. It must not exist.
+    layout : str, default "balanced"
+        One of "time-major", "channel-major" or "balanced".
+    compression : str, default "gzip"
+        One of "gzip", "lzf", "blosc" (requires hdf5plugin, also to read the
+        repacked file) or "none".
+    level : int | None
+        Compression level for gzip and blosc.
+    chunk_kb : int, default 1024
+        Target chunk size in KiB.
+    block_mb : int, default 256
+        Bound on the MiB of a table held in memory while copying.
+    """
+    compression_options = get_compression_options(compression, level)
+    chunk_bytes = chunk_kb * 2**10
+    block_bytes = block_mb * 2**20
+
+    def repack_group(group, hf, nhf):
+        for item in group.values():
+            if isinstance(item, h5py.Group):
+                copy_attrs(item, nhf.create_group(item.name))
+                repack_group(item, hf, nhf)
+                continue
+            chunks = None
+            if is_time_indexed_table(item):
+                chunks = get_chunk_shape(
+                    item.shape, item.dtype.itemsize, layout, chunk_bytes, block_bytes
+                )
+            if chunks is None:
+                copy_dataset(item.name, hf, nhf)
+            else:
+                repack_table(item, nhf, chunks, compression_options, block_bytes)
+
+    with h5py.File(infile, "r") as hf:
+        with h5py.File(outfile, "w-") as nhf:
+            copy_attrs(hf, nhf)
+            repack_group(hf, hf, nhf)
+            attach_dimension_scales(hf, nhf)
+    return outfile
+
+
+@click.command(name="repack-tidefile")
+@click.argument("infile", type=click.Path(exists=True))
+@click.argument("outfile", type=click.Path())
+@click.option(
+    "--layout",
+    default="balanced",
+    show_default=True,
+    type=click.Choice(LAYOUTS),
+    help="Chunk layout of the time indexed tables.",
+)
+@click.option(
+    "--compression",
+    default="gzip",
+    show_default=True,
+    type=click.Choice(COMPRESSIONS),
+    help="Compression filter (blosc requires hdf5plugin).",
+)
+@click.option("--level", default=None, type=int, help="gzip or blosc level.")
+@click.option(
+    "--chunk-kb", default=1024, show_default=True, help="Target chunk size in KiB."
+)
+@click.option(
+    "--block-mb",
+    default=256,
+    show_default=True,
+    help="Memory bound in MiB for copying a table.",
+)
+def repack_tidefile_cmd(
+    infile, outfile, layout, compression, level, chunk_kb, block_mb
+):
+    """Rechunk and recompress a hydro, qual or GTM tidefile
+
+    Args:
+
+        INFILE (str): Input tidefile
+
+        OUTFILE (str): Output tidefile (must not exist)
+    """
+    repack_tidefile(
+        infile,
+        outfile,
+        layout=layout,
+        compression=compression,
+        level=level,
+        chunk_kb=chunk_kb,
+        block_mb=block_mb,
+    )
+    click.echo(f"Wrote repacked tidefile: {outfile}")
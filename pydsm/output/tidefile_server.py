@@ -0,0 +1,306 @@
+"""
+Local HTTP query server for DSM2 hydro and qual tidefiles.
+
+`pydsm serve` keeps the tidefiles open in one process (see TidefilePool) and
+answers catalog and time series queries over HTTP, so notebooks and
+dashboards need neither h5py nor their own open handles:
+
+    GET /files                          the served tidefiles by name
+    GET /catalog?file=NAME              the catalog of the tidefile
+    GET /data?file=NAME&id=CHAN_441_UP&variable=flow[&timewindow=START-END]
+                                        the time series of a catalog entry
+
+Names are the tidefile names without extension (see
+extract_tidefiles.get_study_names). Results are gzip compressed JSON (pandas
+"split" orientation) or, with format=arrow, an Arrow IPC stream (requires
+pyarrow). Encoded results are kept in a byte bounded LRU cache keyed by the
+file modification time and the query, so repeated queries are served without
+reading the tidefile again.
+
+`fetch_catalog` and `fetch_data` are the matching client helpers.
+"""
+
+import gzip
+import http.server
+import io
+import json
+import os
+import urllib.parse
+import urllib.request
+
+import click
+import numpy as np
+import pandas as pd
+
+from pydsm.output import dsm2h5
+from pydsm.output.extract_tidefiles import expand_file_patterns, get_study_names
+from pydsm.output.tidefile_pool import TidefilePool
+
+FORMATS = ["json", "arrow"]
+_CONTENT_TYPES = {
+    "json": "application/json",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+
+class QueryError(ValueError):
+    """a query that can not be answered, with the HTTP status to reply with"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+# ---------------------------------------------------------------------------
+# Encoding
+# ---------------------------------------------------------------------------
+
+
+def encode_frame(df, fmt="json"):
+    """encode the DataFrame as gzip compressed JSON or an Arrow IPC stream"""
+    if fmt == "arrow":
+        import pyarrow as pa
+
+        table = pa.Table.from_pandas(df, preserve_index=True)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table, max_chunksize=2**16)
+        return sink.getvalue().to_pybytes()
+    elif fmt == "json":
+        text = df.to_json(orient="split", date_format="iso", date_unit="s")
+        return gzip.compress(text.encode("utf-8"), compresslevel=5)
+    raise QueryError(f"format should be one of {FORMATS}: {fmt}")
+
+
+def decode_frame(payload, fmt="json"):
+    """the DataFrame of a payload written by encode_frame"""
+    if fmt == "arrow":
+        import pyarrow as pa
+
+        return pa.ipc.open_stream(payload).read_pandas()
+    df = pd.read_json(
+        io.StringIO(gzip.decompress(payload).decode("utf-8")),
+        orient="split",
+        convert_dates=False,
+    )
+    if len(df.index) and isinstance(df.index[0], str):
+        try:
+            df.index = pd.to_datetime(df.index)
+        except (TypeError, ValueError):
+            pass
+    return df
+
+
+# ---------------------------------------------------------------------------
+# Service
+# ---------------------------------------------------------------------------
+
+
+class TidefileService:
+    """
+    Answers the queries of the server for a set of tidefiles, keeping them
+    open in a TidefilePool and the encoded results in a dsm2h5.BlockCache.
+    """
+
+    def __init__(self, files, max_open=16, cache_bytes=2**28, cache_dir=None):
+        """
+        :param files: tidefiles, or a dict of name to tidefile
+        :param max_open: bound on the number of open tidefiles
+        :param cache_bytes: bound on the bytes of results held in memory
+        :param cache_dir: directory of an optional on-disk result cache
+        """
+        if not isinstance(files, dict):
+            files = dict(zip(get_study_names(files), files))
+        self.files = {name: os.path.abspath(f) for name, f in files.items()}
+        self.pool = TidefilePool(max_open)
+        self.cache = dsm2h5.BlockCache(cache_bytes, cache_dir)
+        # filename -> (modification time, catalog)
+        self._catalogs = {}
+
+    def _filename(self, name):
+        try:
+            return self.files[name]
+        except KeyError:
+            raise QueryError(f"no tidefile named {name}", status=404)
+
+    def list_files(self):
+        return {
+            name: {"filename": f, "model": dsm2h5.get_model_from_file(f)}
+            for name, f in self.files.items()
+        }
+
+    def get_catalog(self, name):
+        filename = self._filename(name)
+        mtime = os.stat(filename).st_mtime_ns
+        cached = self._catalogs.get(filename)
+        if cached is None or cached[0] != mtime:
+            with self.pool.open(filename) as tidef:
+                catalog = tidef.create_catalog()
+            cached = (mtime, catalog.reset_index(drop=True))
+            self._catalogs[filename] = cached
+        return cached[1]
+
+    def get_data(self, name, entry_id, variable, timewindow=None):
+        catalog = self.get_catalog(name)
+        entry = catalog[(catalog["id"] == entry_id) & (catalog["variable"] == variable)]
+        if entry.empty:
+            raise QueryError(f"{entry_id} {variable} is not in {name}", status=404)
+        try:
+            with self.pool.open(self.files[name]) as tidef:
+                return tidef.get_data_for_catalog_entry(entry.iloc[0], timewindow)
+        except (KeyError, ValueError) as e:
+            raise QueryError(f"no data for {entry_id} {variable} in {name}: {e}")
+
+    def query(self, path, params):
+        """
+        the encoded result and its format for the request path and query
+        parameters (dict of str), from the result cache where possible
+        """
+        fmt = params.get("format", "json")
+        if fmt not in FORMATS:
+            raise QueryError(f"format should be one of {FORMATS}: {fmt}")
+        if path == "/files":
+            return json.dumps(self.list_files()).encode("utf-8"), None
+        if path not in ("/catalog", "/data"):
+            raise QueryError(f"unknown path {path}", status=404)
+        name = _required(params, "file")
+        filename = self._filename(name)
+        key = (
+            filename,
+            os.stat(filename).st_mtime_ns,
+            path,
+            tuple(sorted(params.items())),
+        )
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached.tobytes(), fmt
+        if path == "/catalog":
+            df = self.get_catalog(name)
+        else:
+            df = self.get_data(
+                name,
+                _required(params, "id"),
+                _required(params, "variable"),
+                params.get("timewindow"),
+            )
+        payload = encode_frame(df, fmt)
+        self.cache.set(key, np.frombuffer(payload, dtype=np.uint8))
+        return payload, fmt
+
+    def close(self):
+        self.pool.close()
+        self.cache.close()
+
+
+def _required(params, name):
+    try:
+        return params[name]
+    except KeyError:
+        raise QueryError(f"missing query parameter {name}")
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    # set on the subclass made by make_server
+    service = None
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        params = dict(urllib.parse.parse_qsl(url.query))
+        try:
+            payload, fmt = self.service.query(url.path, params)
+        except QueryError as e:
+            self._reply(e.status, json.dumps({"error": str(e)}).encode("utf-8"))
+            return
+        except Exception as e:
+            self.log_error("%s failed: %r", self.path, e)
+            self._reply(500, json.dumps({"error": repr(e)}).encode("utf-8"))
+            return
+        self._reply(200, payload, fmt)
+
+    def _reply(self, status, payload, fmt=None):
+        self.send_response(status)
+        self.send_header("Content-Type", _CONTENT_TYPES[fmt or "json"])
+        if fmt == "json":
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+def make_server(service, host="127.0.0.1", port=8765, quiet=False):
+    """
+    threaded HTTP server for the TidefileService, call serve_forever() on it.
+    Port 0 picks a free port (see server.server_address).
+    """
+    attrs = {"service": service}
+    if quiet:
+        attrs["log_message"] = lambda self, *args: None
+    handler = type("TidefileHandler", (_Handler,), attrs)
+    server = http.server.ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+# ---------------------------------------------------------------------------
+# Client
+# ---------------------------------------------------------------------------
+
+
+def _fetch(url, fmt):
+    with urllib.request.urlopen(url) as response:
+        return decode_frame(response.read(), fmt)
+
+
+def fetch_catalog(base_url, name, fmt="json"):
+    """catalog of the tidefile named name from the server at base_url"""
+    query = urllib.parse.urlencode({"file": name, "format": fmt})
+    return _fetch(f"{base_url.rstrip('/')}/catalog?{query}", fmt)
+
+
+def fetch_data(base_url, name, entry_id, variable, timewindow=None, fmt="json"):
+    """time series of the catalog entry from the server at base_url"""
+    params = {"file": name, "id": entry_id, "variable": variable, "format": fmt}
+    if timewindow:
+        params["timewindow"] = timewindow
+    query = urllib.parse.urlencode(params)
+    return _fetch(f"{base_url.rstrip('/')}/data?{query}", fmt)
+
+
+# ---------------------------------------------------------------------------
+# CLI
+# ---------------------------------------------------------------------------
+
+
+@click.command(name="serve")
+@click.argument("files", nargs=-1, required=True)
+@click.option("--host", default="127.0.0.1", show_default=True, help="Bind address.")
+@click.option("--port", default=8765, show_default=True, help="Port.")
+@click.option(
+    "--max-open", default=16, show_default=True, help="Tidefiles kept open at once."
+)
+@click.option(
+    "--cache-mb",
+    default=256,
+    show_default=True,
+    help="Memory bound in MiB for cached results.",
+)
+@click.option(
+    "--cache-dir", default=None, help="Directory for an on-disk result cache."
+)
+def serve_cmd(files, host, port, max_open, cache_mb, cache_dir):
+    """Serve catalogs and time series of hydro and qual tidefiles over HTTP.
+
+    FILES: Tidefiles or glob patterns (e.g. "runs/*.h5"), each served by its
+    file name without extension.
+    """
+    files = expand_file_patterns(files)
+    service = TidefileService(files, max_open, cache_mb * 2**20, cache_dir)
+    server = make_server(service, host, port)
+    click.echo(f"Serving {len(files)} tidefiles on http://{host}:{port}/files")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
@@ -0,0 +1,373 @@
+"""
+Channel-major columnar export of DSM2 hydro and qual tidefiles.
+
+DSM2 writes its data tables time-major, i.e. every time step holds all
+channels, so a full-period series for one channel strides through the whole
+table. `export_tidefile` rewrites every time indexed table under /hydro/data
+(hydro) or /output (qual, gtm) as a Parquet file with one column per channel
+(and location, constituent, ...) in a store directory:
+
+    <store>/metadata.json          model, coordinates and per table start_time,
+                                   interval, shape and columns
+    <store>/<table_name>.parquet   one compressed column per series, one row
+                                   group per time block
+
+Reading one series then only touches that column. `TidefileStore` reads the
+store back with the same getters as HydroH5 and QualH5. Requires pyarrow.
+"""
+
+import itertools
+import json
+import os
+
+import click
+import numpy as np
+import pandas as pd
+
+from pydsm.output import dsm2h5
+from pydsm.output.hydroh5 import HydroH5
+from pydsm.output.qualh5 import QualH5
+
+METADATA_FILE = "metadata.json"
+FORMAT_VERSION = 1
+
+# ---------------------------------------------------------------------------
+# Export
+# ---------------------------------------------------------------------------
+
+
+def _table_file(table):
+    return table.replace(" ", "_") + ".parquet"
+
+
+def _column_names(labels):
+    return ["/".join(key) for key in itertools.product(*labels)]
+
+
+def _export_table(data, filename, columns, chunk, compression):
+    """write the time indexed table one time block (row group) at a time"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([(c, pa.from_numpy_dtype(data.dtype)) for c in columns])
+    # byte stream split without dictionaries compresses float series best
+    with pq.ParquetWriter(
+        filename,
+        schema,
+        compression=compression,
+        use_dictionary=False,
+        use_byte_stream_split=True,
+    ) as writer:
+        for block in dsm2h5.iter_time_slices(data, chunk=chunk):
+            values = data[block]
+            values = np.ascontiguousarray(values.reshape(values.shape[0], -1).T)
+            writer.write_table(pa.Table.from_arrays(list(values), schema=schema))
+
+
+def export_tidefile(tidefile, store_dir, chunk="365D", compression="zstd"):
+    """
+    Export the data tables of a hydro or qual (gtm) tidefile to a channel-major
+    Parquet store.
+
+    Parameters
+    ----------
+    tidefile : str
+        Hydro, qual or gtm HDF5 tidefile.
+    store_dir : str
+        Directory to write the store to. It is created if needed and existing
+        store files in it are overwritten.
+    chunk : str | int, default "365D"
+        Time length of each row group, rounded to whole HDF5 chunks
+        (see dsm2h5.get_time_block_rows).
+    compression : str, default "zstd"
+        Parquet compression codec, e.g. "zstd", "snappy", "gzip" or "none".
+
+    Returns
+    -------
+    str
+        Path to the store metadata file.
+    """
+    model = dsm2h5.get_model_from_file(tidefile)
+    if model == "hydro":
+        reader_class = HydroH5
+        data_path = HydroH5._DATA_PATH
+    elif model in ("qual", "gtm"):
+        reader_class = QualH5
+        data_path = "/output"
+    else:
+        raise ValueError(f"{tidefile} is not a hydro or qual tidefile")
+    os.makedirs(store_dir, exist_ok=True)
+    metadata = {
+        "format_version": FORMAT_VERSION,
+        "model": model,
+        "source": os.path.abspath(tidefile),
+        "tables": {},
+    }
+    with reader_class(tidefile) as tidef:
+        for table, (dims, coords) in tidef.get_data_table_layout().items():
+            data = tidef.h5.get(f"{data_path}/{table}")
+            if data is None:
+                continue
+            labels = [np.asarray(coords[dim]).astype(str).tolist() for dim in dims]
+            columns = _column_names(labels)
+            _export_table(
+                data,
+                os.path.join(store_dir, _table_file(table)),
+                columns,
+                chunk,
+                compression,
+            )
+            attrs = dsm2h5.read_attributes_from_table(data)
+            metadata["tables"][table] = {
+                "file": _table_file(table),
+                "start_time": str(attrs["start_time"]),
+                "interval": str(attrs["interval"]),
+                "shape": list(data.shape),
+                "dims": ["time"] + list(dims),
+                "coords": dict(zip(dims, labels)),
+            }
+        if model == "hydro":
+            # FIXME: See issue DSM2-164 (stage is really depth!!!).
+            metadata["channel_bottom"] = tidef.channel_bottom.tolist()
+    metadata_file = os.path.join(store_dir, METADATA_FILE)
+    with open(metadata_file, "w") as fh:
+        json.dump(metadata, fh)
+    return metadata_file
+
+
+# ---------------------------------------------------------------------------
+# Reader
+# ---------------------------------------------------------------------------
+
+
+class TidefileStore:
+    """
+    Reader for a store written by `export_tidefile`.
+
+    The getters mirror HydroH5 (get_channel_flow, get_channel_stage,
+    get_reservoir_height, ...) and QualH5 (get_channel_concentration, ...) and
+    return the same time indexed DataFrames, reading only the requested
+    columns and the row groups covering the timewindow.
+    """
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        with open(os.path.join(store_dir, METADATA_FILE)) as fh:
+            self.metadata = json.load(fh)
+        self.model = self.metadata["model"]
+        self._files = {}
+
+    def get_data_tables(self):
+        return list(self.metadata["tables"])
+
+    def _table_info(self, table):
+        try:
+            return self.metadata["tables"][table]
+        except KeyError:
+            raise ValueError(
+                f"{table} is not in the {self.model} store {self.store_dir}"
+            )
+
+    def _parquet_file(self, table):
+        import pyarrow.parquet as pq
+
+        if table not in self._files:
+            info = self._table_info(table)
+            self._files[table] = pq.ParquetFile(
+                os.path.join(self.store_dir, info["file"])
+            )
+        return self._files[table]
+
+    def get_coords(self, table, dim):
+        """labels of the dimension dim of table as stored"""
+        return self._table_info(table)["coords"][dim]
+
+    @property
+    def channel_numbers(self):
+        table = next(t for t in self.metadata["tables"] if t.startswith("channel"))
+        return np.array(self.get_coords(table, "channel"))
+
+    def read_table(self, table, columns, timewindow=None, names=None):
+        """
+        read the columns of the table for the timewindow
+
+        Parameters
+        ----------
+        table : str
+            Data table name, e.g. "channel flow".
+        columns : list[str]
+            Stored column names (labels joined with "/", e.g. "441/upstream").
+        timewindow : str | None
+            Optional DSM2 style window "START-END".
+        names : list[str] | None
+            Column names of the result, defaults to columns.
+
+        Returns
+        -------
+        pandas.DataFrame
+        """
+        info = self._table_info(table)
+        nrows = info["shape"][0]
+        if timewindow:
+            twse = [s.strip() for s in timewindow.split("-")]
+            time_slice = dsm2h5.convert_time_to_table_slice(
+                twse[0], twse[1], info["interval"], info["start_time"], nrows
+            )
+        else:
+            time_slice = slice(None)
+        start, stop, _ = time_slice.indices(nrows)
+        pf = self._parquet_file(table)
+        offsets = np.cumsum(
+            [0] + [pf.metadata.row_group(i).num_rows for i in range(pf.num_row_groups)]
+        )
+        groups = [
+            i
+            for i in range(pf.num_row_groups)
+            if offsets[i] < stop and offsets[i + 1] > start
+        ]
+        dtype = pf.schema_arrow.field(columns[0]).type.to_pandas_dtype()
+        if groups:
+            arrow_table = pf.read_row_groups(groups, columns=columns)
+            first = offsets[groups[0]]
+            values = np.column_stack(
+                [arrow_table.column(c).to_numpy() for c in columns]
+            )[start - first : stop - first]
+        else:
+            values = np.empty((0, len(columns)), dtype=dtype)
+        index = dsm2h5.get_time_index(info["start_time"], info["interval"], nrows)
+        return pd.DataFrame(
+            values,
+            index=index[start:stop],
+            columns=names or columns,
+            dtype=dtype,
+            copy=False,
+        )
+
+    def _channel_ids(self, table, channels):
+        numbers = self.get_coords(table, "channel")
+        if isinstance(channels, list):
+            channels = [str(c) for c in channels]
+        elif str(channels).lower() == "all":
+            channels = list(numbers)
+        else:
+            channels = [str(channels)]
+        known = set(numbers)
+        for c in channels:
+            if c not in known:
+                raise KeyError(c)
+        return channels
+
+    def _get_channel_ts(self, table, channels, location="upstream", timewindow=None):
+        channels = self._channel_ids(table, channels)
+        if location:
+            columns = [f"{c}/{location}" for c in channels]
+            names = [f"{c}-{location}" for c in channels]
+        else:
+            columns = names = channels
+        return self.read_table(table, columns, timewindow, names)
+
+    def _get_named_ts(self, table, names, timewindow=None, prefix=""):
+        names = [str(n) for n in dsm2h5.normalize_to_slice(names)]
+        return self.read_table(table, [prefix + n for n in names], timewindow, names)
+
+    # -- hydro --
+
+    def get_channel_flow(self, channel_id, location_id="upstream", timewindow=None):
+        return self._get_channel_ts("channel flow", channel_id, location_id, timewindow)
+
+    def get_channel_area(self, channel_id, location_id="upstream", timewindow=None):
+        return self._get_channel_ts("channel area", channel_id, location_id, timewindow)
+
+    def get_channel_stage(self, channel_id, location_id="upstream", timewindow=None):
+        """channel stage, computed from the stored depth and channel bottom"""
+        table = "channel stage"
+        df = self._get_channel_ts(table, channel_id, location_id, timewindow)
+        channels = self._channel_ids(table, channel_id)
+        number2index = {c: i for i, c in enumerate(self.get_coords(table, "channel"))}
+        location_index = self.get_coords(table, "location").index(location_id)
+        bottom = np.asarray(self.metadata["channel_bottom"], dtype=df.dtypes.iloc[0])
+        return df + bottom[location_index, [number2index[c] for c in channels]]
+
+    def get_channel_avg_area(self, channel_id, timewindow=None):
+        return self._get_channel_ts("channel avg area", channel_id, None, timewindow)
+
+    def get_reservoir_height(self, reservoir_name, timewindow=None):
+        return self._get_named_ts("reservoir height", reservoir_name, timewindow)
+
+    def get_reservoir_flow(self, reservoir_name, timewindow=None):
+        """flows through all connections of the reservoir (named reservoir/index)"""
+        connections = [
+            c
+            for c in self.get_coords("reservoir flow", "reservoir_connection")
+            if c.split("/")[0] == reservoir_name
+        ]
+        return self.read_table("reservoir flow", connections, timewindow)
+
+    def get_qext_flow(self, qext_id, timewindow=None):
+        return self._get_named_ts("qext flow", qext_id, timewindow)
+
+    def get_transfer_flow(self, transfer_id, timewindow=None):
+        return self._get_named_ts("transfer flow", transfer_id, timewindow)
+
+    # -- qual --
+
+    def get_channel_concentration(
+        self, constituent_name, channel_id, location_id="upstream", timewindow=None
+    ):
+        table = "channel concentration"
+        channels = self._channel_ids(table, channel_id)
+        return self.read_table(
+            table,
+            [f"{constituent_name}/{c}/{location_id}" for c in channels],
+            timewindow,
+            [f"{c}-{location_id}" for c in channels],
+        )
+
+    def get_channel_avg_concentration(
+        self, constituent_name, channel_id, timewindow=None
+    ):
+        table = "channel avg concentration"
+        channels = self._channel_ids(table, channel_id)
+        return self.read_table(
+            table, [f"{constituent_name}/{c}" for c in channels], timewindow, channels
+        )
+
+    def get_reservoir_concentration(
+        self, constituent_name, reservoir_name, timewindow=None
+    ):
+        return self._get_named_ts(
+            "reservoir concentration",
+            reservoir_name,
+            timewindow,
+            prefix=f"{constituent_name}/",
+        )
+
+
+# ---------------------------------------------------------------------------
+# CLI
+# ---------------------------------------------------------------------------
+
+
+@click.command(name="export-tidefile")
+@click.argument("tidefile", type=click.Path(exists=True))
+@click.argument("store_dir", type=click.Path())
+@click.option(
+    "--chunk",
+    default="365D",
+    show_default=True,
+    help="Time length of each Parquet row group, e.g. 30D or 365D.",
+)
+@click.option(
+    "--compression",
+    default="zstd",
+    show_default=True,
+    help="Parquet compression codec (zstd, snappy, gzip, none).",
+)
+def export_tidefile_cmd(tidefile, store_dir, chunk, compression):
+    """Export a hydro or qual tidefile to a channel-major Parquet store.
+
+    TIDEFILE: Path to the hydro, qual or gtm HDF5 tidefile.
+    STORE_DIR: Directory to write the store to.
+    """
+    path = export_tidefile(tidefile, store_dir, chunk=chunk, compression=compression)
+    click.echo(f"Wrote tidefile store: {path}")
@@ -1,5 +1,7 @@
 from pathlib import Path
 
+import h5py
+import numpy as np
 import pandas as pd
 import pytest
 
@@ -43,3 +45,208 @@ def assert_frame_fixture(request):
         pd.testing.assert_frame_equal(expected, df, check_freq=False)
 
     return _check
+
+
+_NETWORK_STEPS = 96
+
+
+def write_network_hydro_tidefile(filename):
+    """
+    three channels 1 -> 2 -> 3 -> 4 (nodes), 100 cfs flowing in at node 1 and
+    out through node 4 and 20 cfs from a reservoir at node 2 of which 5 cfs is
+    transferred from node 3 to the reservoir, with channel average areas and
+    the reservoir height for volumes and channel depths above the bottoms
+    """
+    with h5py.File(filename, "w") as h5:
+        inp = h5.create_group("hydro/input")
+        geo = h5.create_group("hydro/geometry")
+        dat = h5.create_group("hydro/data")
+        channel = np.zeros(
+            3,
+            dtype=[
+                ("chan_no", "<i4"),
+                ("length", "<i4"),
+                ("upnode", "<i4"),
+                ("downnode", "<i4"),
+            ],
+        )
+        channel["chan_no"] = [10, 20, 30]
+        channel["length"] = [1000, 2000, 3000]
+        channel["upnode"] = [1, 2, 3]
+        channel["downnode"] = [2, 3, 4]
+        inp["channel"] = channel
+        inp["reservoir"] = np.array(
+            [(b"res", 10.0, -5.0)],
+            dtype=[("name", "S32"), ("area", "<f8"), ("bot_elev", "<f8")],
+        )
+        transfer = np.zeros(
+            1,
+            dtype=[
+                ("name", "S32"),
+                ("from_obj_type", "S32"),
+                ("from_identifier", "S32"),
+                ("to_obj_type", "S32"),
+                ("to_identifier", "S32"),
+            ],
+        )
+        transfer[0] = (b"xfer", b"node", b"3", b"reservoir", b"res")
+        inp["transfer"] = transfer
+        geo["channel_location"] = np.array([b"upstream", b"downstream"], dtype="S12")
+        rnc = np.zeros(
+            1,
+            dtype=[
+                ("res_name", "S32"),
+                ("connect_index", "<i4"),
+                ("ext_node_no", "<i4"),
+            ],
+        )
+        rnc[0] = (b"res", 1, 2)
+        geo["reservoir_node_connect"] = rnc
+        geo["qext"] = np.array(
+            [(b"inflow", b"1", 2, 1), (b"res_source", b"res", 3, 1)],
+            dtype=[
+                ("name", "S32"),
+                ("attach_obj_name", "S32"),
+                ("attached_obj_type", "<i4"),
+                ("attached_obj_no", "<i4"),
+            ],
+        )
+        geo["transfer_names"] = np.array([b"xfer"], dtype="S32")
+        geo["channel_bottom"] = np.array(
+            [[-10, -11, -12], [-11, -12, -13]], dtype=np.float32
+        )
+        flow = np.empty((_NETWORK_STEPS, 3, 2), dtype=np.float32)
+        flow[:, 0, :] = 100
+        flow[:, 1, :] = 120
+        flow[:, 2, :] = 115
+        tables = {
+            "channel flow": flow,
+            "reservoir flow": np.full((_NETWORK_STEPS, 1), 20, dtype=np.float32),
+            "qext flow": np.tile(
+                np.array([100, 3], dtype=np.float32), (_NETWORK_STEPS, 1)
+            ),
+            "transfer flow": np.full((_NETWORK_STEPS, 1), 5, dtype=np.float32),
+            "channel avg area": np.tile(
+                np.array([500, 600, 700], dtype=np.float32), (_NETWORK_STEPS, 1)
+            ),
+            "channel area": np.full((_NETWORK_STEPS, 3, 2), 550, dtype=np.float32),
+            "channel stage": np.linspace(
+                5, 6, _NETWORK_STEPS * 6, dtype=np.float32
+            ).reshape(-1, 3, 2),
+            "reservoir height": np.linspace(
+                1, 2, _NETWORK_STEPS, dtype=np.float32
+            ).reshape(-1, 1),
+        }
+        for name, values in tables.items():
+            data = dat.create_dataset(
+                name, data=values, chunks=(16,) + values.shape[1:]
+            )
+            data.attrs["start_time"] = np.array([b"1990-01-01 00:00:00"])
+            data.attrs["interval"] = np.array([b"15min"])
+            data.attrs["model"] = np.array([b"Hydro"])
+            data.attrs["model_version"] = np.array([b"8.2"])
+
+
+@pytest.fixture(scope="session")
+def network_hydro_file(tmp_path_factory):
+    """small synthetic hydro tidefile (see write_network_hydro_tidefile)"""
+    filename = str(tmp_path_factory.mktemp("hydro") / "network.h5")
+    write_network_hydro_tidefile(filename)
+    return filename
+
+
+_GTM_STEPS = 48
+GTM_CONSTITUENTS = ["ec", "doc", "temp"]
+
+
+def _write_gtm_table(group, name, values, labels):
+    data = group.create_dataset(name, data=values, chunks=(16,) + values.shape[1:])
+    data.attrs["start_time"] = np.array([b"1990-01-01 00:00:00"])
+    data.attrs["interval"] = np.array([b"60min"])
+    data.attrs["model"] = np.array([b"GTM"])
+    data.attrs["model_version"] = np.array([b"8.2"])
+    # DSM2 writes the dimension labels in Fortran order
+    data.attrs["DIMENSION_LABELS"] = np.array(labels[::-1], dtype=h5py.string_dtype())
+
+
+def write_gtm_tidefile(filename):
+    """
+    three channels 10, 20 and 30 of 3, 2 and 4 cells (of 1000 ft, one segment
+    each) and a reservoir with the constituents ec, doc and temp. The
+    concentration of constituent k (from 0) at time step t is
+    100 * (k + 1) + 0.01 * t plus 10 * channel index + 5 at the downstream end
+    for the channels, 50 for the reservoir and the cell number for the cells.
+    """
+    nchan, ncells = 3, 9
+    t = 0.01 * np.arange(_GTM_STEPS)[:, None]
+    k = 100.0 * np.arange(1, len(GTM_CONSTITUENTS) + 1)[None, :]
+    with h5py.File(filename, "w") as h5:
+        scalar = np.array(
+            [
+                (b"run_start_date", b"01JAN1990 0000"),
+                (b"run_end_date", b"02JAN1990 2300"),
+            ],
+            dtype=[("name", "S32"), ("value", "S64")],
+        )
+        h5["input/scalar"] = scalar
+        channel = np.zeros(
+            nchan,
+            dtype=[("channel_num", "<i4"), ("start_cell", "<i4"), ("end_cell", "<i4")],
+        )
+        channel["channel_num"] = [10, 20, 30]
+        channel["start_cell"] = [1, 4, 6]
+        channel["end_cell"] = [3, 5, 9]
+        h5["geometry/channel"] = channel
+        segment = np.zeros(
+            nchan,
+            dtype=[
+                ("segm_no", "<i4"),
+                ("chan_no", "<i4"),
+                ("chan_num", "<i4"),
+                ("up_distance", "<f8"),
+                ("length", "<f8"),
+                ("nx", "<i4"),
+                ("start_cell_no", "<i4"),
+            ],
+        )
+        segment["segm_no"] = segment["chan_no"] = [1, 2, 3]
+        segment["chan_num"] = [10, 20, 30]
+        segment["length"] = [3000, 2000, 4000]
+        segment["nx"] = [3, 2, 4]
+        segment["start_cell_no"] = [1, 4, 6]
+        h5["geometry/segment"] = segment
+        out = h5.create_group("output")
+        out["constituent_names"] = np.array(GTM_CONSTITUENTS, dtype="S32")
+        out["channel_number"] = np.array([10, 20, 30], dtype="<i4")
+        out["channel_location"] = np.array([b"upstream", b"downstream"], dtype="S12")
+        out["reservoir_names"] = np.array([b"res"], dtype="S32")
+        base = (t + k)[:, :, None, None]
+        chan = base + 10.0 * np.arange(nchan)[None, None, :, None]
+        chan = chan + np.array([0.0, 5.0])[None, None, None, :]
+        _write_gtm_table(
+            out,
+            "channel concentration",
+            chan.astype(np.float32),
+            ["time", "constituent", "channel_number", "channel_location"],
+        )
+        _write_gtm_table(
+            out,
+            "reservoir concentration",
+            (t + k + 50.0)[:, :, None].astype(np.float32),
+            ["time", "constituent", "reservoir_names"],
+        )
+        cell = (t + k)[:, :, None] + np.arange(1, ncells + 1)[None, None, :]
+        _write_gtm_table(
+            out,
+            "cell concentration",
+            cell.astype(np.float32),
+            ["time", "constituent", "cell"],
+        )
+
+
+@pytest.fixture(scope="session")
+def gtm_tidefile(tmp_path_factory):
+    """small synthetic multi constituent gtm tidefile (see write_gtm_tidefile)"""
+    filename = str(tmp_path_factory.mktemp("gtm") / "gtm.h5")
+    write_gtm_tidefile(filename)
+    return filename
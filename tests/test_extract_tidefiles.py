@@ -0,0 +1,103 @@
+import os
+import shutil
+import h5py
+import numpy as np
+import pandas as pd
+import pytest
+from click.testing import CliRunner
+from pydsm.output.qualh5 import QualH5
+from pydsm.output.extract_tidefiles import (
+    extract_tidefiles,
+    extract_tidefiles_cmd,
+    get_study_names,
+)
+
+QUAL_FILE = os.path.join(os.path.dirname(__file__), "data", "historical_v82_ec.h5")
+TIMEWINDOW = "05JAN1990 0100 - 07JAN1990 0300"
+
+
+@pytest.fixture(scope="module")
+def studies(tmp_path_factory):
+    files = []
+    for name in ["base", "alt"]:
+        files.append(str(tmp_path_factory.mktemp(name) / "historical_v82_ec.h5"))
+        shutil.copy(QUAL_FILE, files[-1])
+    return files
+
+
+def test_get_study_names():
+    assert get_study_names(["a/base.h5", "b/alt.h5"]) == ["base", "alt"]
+    assert get_study_names(["a/run.h5", "b/run.h5"]) == ["a_run", "b_run"]
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_extract_parquet(studies, tmp_path, jobs):
+    pytest.importorskip("pyarrow")
+    outfile = str(tmp_path / "extract.parquet")
+    names = get_study_names(studies)
+    extract_tidefiles(
+        studies,
+        ["441", "1"],
+        "ec",
+        timewindow=TIMEWINDOW,
+        outfile=outfile,
+        jobs=jobs,
+        chunk="1D",
+    )
+    expected = QualH5(QUAL_FILE).get_channel_concentration(
+        "ec", ["441", "1"], "upstream", TIMEWINDOW
+    )
+    df = pd.read_parquet(outfile)
+    assert sorted(df["study"].unique()) == sorted(names)
+    for name in names:
+        actual = df[df["study"] == name].set_index("time").sort_index()
+        actual = actual.drop(columns="study").rename_axis(None)
+        pd.testing.assert_frame_equal(actual, expected, check_freq=False)
+
+
+def test_extract_hdf5(studies, tmp_path):
+    outfile = str(tmp_path / "extract.h5")
+    calls = []
+    extract_tidefiles(
+        studies,
+        "all",
+        "ec",
+        location=None,
+        outfile=outfile,
+        jobs=2,
+        chunk="2D",
+        progress=lambda done, total: calls.append((done, total)),
+    )
+    expected = QualH5(QUAL_FILE).get_channel_avg_concentration("ec", "all")
+    assert calls[-1][0] == calls[-1][1] == len(calls)
+    with h5py.File(outfile, "r") as h5:
+        for name in get_study_names(studies):
+            data = h5[name]
+            np.testing.assert_array_equal(data[()], expected.to_numpy())
+            assert (
+                pd.to_datetime(data.attrs["start_time"][0].decode())
+                == expected.index[0]
+            )
+            assert [c.decode() for c in data.attrs["columns"]] == list(expected.columns)
+
+
+def test_extract_tidefiles_cmd(studies, tmp_path):
+    outfile = str(tmp_path / "extract.h5")
+    result = CliRunner().invoke(
+        extract_tidefiles_cmd,
+        [
+            *studies,
+            "--channels",
+            "441,1",
+            "--variable",
+            "ec",
+            "--jobs",
+            "1",
+            "-o",
+            outfile,
+        ],
+    )
+    assert result.exit_code == 0, result.output
+    with h5py.File(outfile, "r") as h5:
+        assert set(h5) == set(get_study_names(studies))
+        assert h5[get_study_names(studies)[0]].shape[1] == 2
@@ -0,0 +1,114 @@
+import os
+
+import h5py
+import numpy as np
+import pytest
+
+from pydsm.input import parser
+from pydsm.output.gtm_grid import gtm_grid
+
+ECHO_FILE = os.path.join(
+    os.path.dirname(__file__), "data", "hydro_echo_historical_v82.inp"
+)
+
+
+@pytest.fixture(scope="module")
+def grid(tmp_path_factory):
+    """grid of the echo file channels, split into 1 to 3 segments of ~2500 ft cells"""
+    with open(ECHO_FILE) as f:
+        channels = parser.parse(f.read())["CHANNEL"]
+    rows = []
+    cell = 1
+    for i, (num, length) in enumerate(zip(channels.CHAN_NO, channels.LENGTH)):
+        nseg = 1 + i % 3
+        for k in range(nseg):
+            nx = max(1, int(round(length / nseg / 2500.0)))
+            rows.append(
+                (len(rows) + 1, i + 1, num, k * length / nseg, length / nseg, nx, cell)
+            )
+            cell += nx
+    segment = np.array(
+        rows,
+        dtype=[
+            ("segm_no", "<i4"),
+            ("chan_no", "<i4"),
+            ("chan_num", "<i4"),
+            ("up_distance", "<f8"),
+            ("length", "<f8"),
+            ("nx", "<i4"),
+            ("start_cell_no", "<i4"),
+        ],
+    )
+    filename = str(tmp_path_factory.mktemp("gtm_grid") / "gtm.h5")
+    with h5py.File(filename, "w") as h5:
+        h5["geometry/segment"] = segment
+    return gtm_grid(filename, ECHO_FILE)
+
+
+def test_cells(grid):
+    cells = grid.cells
+    assert grid.ncell == len(cells) == grid.segments["end_cell_no"].iloc[-1]
+    np.testing.assert_array_equal(cells.cell, np.arange(1, grid.ncell + 1))
+    first = cells.groupby("chan_num").first()
+    last = cells.groupby("chan_num").last()
+    assert (first.start_distance == 0).all()
+    lengths = grid.channels.set_index("CHAN_NO").LENGTH
+    np.testing.assert_allclose(last.end_distance, lengths[last.index], rtol=1e-6)
+
+
+def test_channel_to_cell_arr(grid):
+    cells = grid.cells
+    rng = np.random.default_rng(0)
+    chans = rng.choice(cells.chan_num.unique(), 200)
+    lengths = grid.channels.set_index("CHAN_NO").LENGTH[chans].values
+    distance = (rng.random(200) * lengths).astype(object)
+    distance[::7] = 0
+    distance[::11] = "length"
+    found = grid.channel_to_cell_arr(chans, distance)
+    for c, d, cell in zip(chans, distance, found):
+        chan_cells = cells[cells.chan_num == c]
+        if d == "length":
+            assert cell == chan_cells.cell.iloc[-1]
+        elif d == 0:
+            assert cell == chan_cells.cell.iloc[0]
+        else:
+            d = np.float32(d)
+            expected = chan_cells[
+                (chan_cells.start_distance < d) & (chan_cells.end_distance >= d)
+            ]
+            assert cell == expected.cell.iloc[0]
+    assert grid.channel_to_cell(chans[1], distance[1]) == found[1]
+    with pytest.raises(ValueError):
+        grid.channel_to_cell(chans[1], 10 * lengths[1])
+    with pytest.raises(Exception):
+        grid.channel_to_cell(chans[1], "middle")
+
+
+def test_node_cell(grid):
+    cell_node = grid.cell_node
+    node_cell = grid.node_cell
+    upnode = dict(zip(cell_node.cell, cell_node.upnode))
+    downnode = dict(zip(cell_node.cell, cell_node.downnode))
+    for node, up, down in zip(node_cell.node, node_cell.upcell, node_cell.downcell):
+        assert downnode[up] == node and upnode[down] == node
+    # a row for every pair of cells into and out of each node
+    into = cell_node.groupby("downnode").size()
+    out_of = cell_node.groupby("upnode").size()
+    both = into.index.intersection(out_of.index)
+    assert len(node_cell) == (into[both] * out_of[both]).sum()
+    assert not node_cell.duplicated(["upcell", "downcell"]).any()
+    # within a channel the cells meet at '<chan>_<cell>' nodes
+    row = node_cell[node_cell.node == "1_1"].iloc[0]
+    assert (row.upcell, row.downcell) == (1, 2)
+
+
+def test_node_rc(grid):
+    node_rc = grid.node_rc
+    cell_node = grid.cell_node
+    for node, cell, res in node_rc.itertuples(index=False):
+        if isinstance(cell, str):
+            assert cell != res
+        else:
+            row = cell_node[cell_node.cell == cell].iloc[0]
+            assert node in (row.upnode, row.downnode)
+    assert set(node_rc.rc_cell) == set(grid.rc.RES_NAME)
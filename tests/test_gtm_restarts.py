@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+from click.testing import CliRunner
+
+from pydsm.output.create_gtm_restart import (
+    create_gtm_restarts_cmd,
+    write_gtm_restart,
+    write_gtm_restarts,
+)
+from pydsm.output.gtmh5 import get_cell_concentrations
+
+
+def _read_restart(path):
+    lines = path.read_text().splitlines()
+    ncol = int(lines[2].split()[0])
+    ncell = int(lines[3].split()[0])
+    cells = np.array([line.split() for line in lines[5 : 5 + ncell]], dtype=float)
+    nres = int(lines[5 + ncell].split()[0])
+    res = [line.split() for line in lines[7 + ncell : 7 + ncell + nres]]
+    return lines, ncol, cells, res
+
+
+def test_write_gtm_restart(gtm_tidefile, tmp_path):
+    path = write_gtm_restart(gtm_tidefile, "01JAN1990 0530", tmp_path / "r.qrf", "doc")
+    lines, ncol, cells, res = _read_restart(path)
+    assert lines[0] == "01JAN1990 0600/time"
+    assert ncol == 1
+    assert lines[4].split() == ["cell_no", "doc"]
+    assert len(lines[5]) == 64
+    expected = get_cell_concentrations(
+        gtm_tidefile, "01JAN1990 0500-01JAN1990 0600", "doc"
+    )
+    np.testing.assert_array_equal(cells[:, 0], np.arange(1, 10))
+    np.testing.assert_allclose(cells[:, 1], expected.iloc[0], rtol=1e-15)
+    assert res[0][0] == "res"
+    assert float(res[0][1]) == np.float32(250.05)
+
+
+def test_write_gtm_restarts(gtm_tidefile, tmp_path):
+    times = ["01JAN1990 0500", pd.Timestamp("1990-01-01 23:00"), "01JAN1990 0200"]
+    paths = write_gtm_restarts(
+        gtm_tidefile,
+        times,
+        tmp_path / "restarts" / "gtm_{time:%Y%m%d%H%M}.qrf",
+        ["ec", "doc", "temp"],
+    )
+    assert [p.name for p in paths] == [
+        "gtm_199001010600.qrf",
+        "gtm_199001020000.qrf",
+        "gtm_199001010300.qrf",
+    ]
+    lines, ncol, cells, res = _read_restart(paths[1])
+    assert lines[0] == "01JAN1990 2400/time"
+    assert ncol == 3
+    assert lines[4].split() == ["cell_no", "ec", "doc", "temp"]
+    # the columns are as in single constituent restarts
+    for col, name in enumerate(["ec", "doc", "temp"], start=1):
+        single = write_gtm_restart(
+            gtm_tidefile, "01JAN1990 2300", tmp_path / f"{name}.qrf", name
+        )
+        _, _, single_cells, single_res = _read_restart(single)
+        np.testing.assert_array_equal(cells[:, col], single_cells[:, 1])
+        assert res[0][col] == single_res[0][1]
+
+
+def test_create_gtm_restarts_cmd(gtm_tidefile, tmp_path):
+    pattern = str(tmp_path / "gtm_{time:%d%H}.qrf")
+    result = CliRunner().invoke(
+        create_gtm_restarts_cmd,
+        [gtm_tidefile, pattern, "--freq", "6h", "-c", "ec", "-c", "temp"],
+    )
+    assert result.exit_code == 0, result.output
+    assert "Wrote 8 restart files" in result.output
+    assert len(list(tmp_path.glob("gtm_*.qrf"))) == 8
+    result = CliRunner().invoke(create_gtm_restarts_cmd, [gtm_tidefile, pattern])
+    assert result.exit_code != 0
@@ -1,13 +1,18 @@
 import os
 import pytest
 import pandas as pd
+import numpy as np
 from datetime import datetime
 from pydsm.output.gtmh5 import (
     _nearest_time,
     _format_time,
     _parse_dsm2_time,
     build_timewindow_for_time,
+    build_cell_interpolation_operator,
+    get_cell_concentrations,
+    get_cell_interpolation_operator,
     get_interpolated_cell_concentrations,
+    iter_cell_concentrations,
 )
 from pydsm.output.qualh5 import QualH5
 
@@ -52,3 +57,36 @@ def test_get_interpolated_cell_concentrations_shape(gtm_file):
     conc = get_interpolated_cell_concentrations(gtm_file, tw, constituent="ec")
     assert conc.ndim == 2 and conc.shape[0] == 1
     assert conc.shape[1] > 100  # expect many cells
+
+
+def test_cell_interpolation_operator():
+    ct = pd.DataFrame({"channel_num": [7, 3], "start_cell": [1, 4], "end_cell": [3, 4]})
+    op = build_cell_interpolation_operator(ct, [3, 7])
+    assert op.shape == (4, 4)
+    # channel 7 is the second channel of the output
+    ends = np.array([[10.0, 20.0, 0.0, 4.0]])
+    np.testing.assert_allclose(ends @ op, [[1.0, 2.0, 3.0, 15.0]])
+    with pytest.raises(ValueError):
+        build_cell_interpolation_operator(ct, [3])
+
+
+def test_cell_concentrations(gtm_tidefile):
+    tw = "01JAN1990 0100 - 02JAN1990 0100"
+    df = get_cell_concentrations(gtm_tidefile, tw, constituent="doc")
+    assert df.shape == (24, 9)
+    assert df.columns.tolist() == list(range(1, 10))
+    t = 0.01 * np.arange(1, 25)[:, None]
+    # channels 10, 20, 30 are 3, 2 and 4 cells, 5 more downstream than upstream
+    base = np.repeat([0.0, 10.0, 20.0], [3, 2, 4])
+    weight = np.array([1, 2, 3, 1, 2, 1, 2, 3, 4]) / np.repeat([4, 3, 5], [3, 2, 4])
+    np.testing.assert_allclose(df.to_numpy(), 200 + t + base + 5 * weight, rtol=1e-6)
+    blocks = list(iter_cell_concentrations(gtm_tidefile, tw, "doc", chunk=16))
+    assert len(blocks) == 2
+    pd.testing.assert_frame_equal(pd.concat(blocks), df)
+    single = get_interpolated_cell_concentrations(
+        gtm_tidefile, "01JAN1990 0500-01JAN1990 0600", constituent="doc"
+    )
+    np.testing.assert_array_equal(single, df.loc[["1990-01-01 05:00"]].to_numpy())
+    assert get_cell_interpolation_operator(gtm_tidefile) is (
+        get_cell_interpolation_operator(gtm_tidefile)
+    )
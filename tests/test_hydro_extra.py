@@ -80,3 +80,23 @@ def test_get_channel_flow_all(hydro):
     # Should have one column per channel (at least > 400 for test data set) and many rows
     assert df.shape[1] > 400
     assert df.shape[0] > 100  # time rows
+
+
+def test_get_data_for_catalog(network_hydro_file):
+    hydro = HydroH5(network_hydro_file)
+    catalog = hydro.create_catalog()
+    tw = "01JAN1990 0300 - 01JAN1990 1200"
+    df = hydro.get_data_for_catalog(catalog, tw)
+    assert df.shape == (36, len(catalog))
+    pd.testing.assert_series_equal(
+        df[("CHAN_20_DOWN", "stage")],
+        hydro.get_channel_stage("20", "downstream", tw)["20-downstream"],
+        check_names=False,
+        check_freq=False,
+    )
+    qext = catalog[catalog.id == "QEXT_inflow"].iloc[0]
+    pd.testing.assert_frame_equal(
+        hydro.get_data_for_catalog(catalog, tw, as_dict=True)[("QEXT_inflow", "flow")],
+        hydro.get_data_for_catalog_entry(qext, tw),
+        check_freq=False,
+    )
@@ -167,3 +167,90 @@ class TestHydroH5:
         df = hydro.get_channel_bottom(channels)
         assert len(df) == 3
         assert 3.502402 == pytest.approx(df.loc["1", "upstream"])
+
+    def test_get_channel_stage_list_and_all(self, hydro):
+        stage = hydro.get_channel_stage(["441", "4"], "downstream")
+        assert list(stage.columns) == ["441-downstream", "4-downstream"]
+        pd.testing.assert_frame_equal(
+            stage[["4-downstream"]], hydro.get_channel_stage("4", "downstream")
+        )
+        stage_all = hydro.get_channel_stage("all", "downstream")
+        assert not stage_all.isna().any().any()
+        pd.testing.assert_frame_equal(stage_all[stage.columns], stage)
+
+    def test_cached_geometry(self, hydro):
+        assert hydro.channel_bottom is hydro.channel_bottom
+        assert hydro.channel_bottom.shape == (2, len(hydro.channel_numbers))
+        assert len(hydro.channel_length) == len(hydro.channel_numbers)
+        assert len(hydro.reservoir_area) == len(hydro.reservoirs)
+
+    def test_lazy_metadata(self):
+        filename = os.path.join(os.path.dirname(__file__), "data", "historical_v82.h5")
+        hydro = HydroH5(filename)
+        assert hydro._channels is None
+        assert hydro.channel_number2index["441"] == 420
+        assert hydro._reservoirs is None
+        assert hydro.channels is hydro.channels  # read only once
+
+    def test_channel_ids_to_indicies_order(self, hydro):
+        assert hydro._channel_ids_to_indicies(["441", "1", 4]) == [420, 0, 3]
+        assert hydro._channel_ids_to_indicies(441) == 420
+
+    def test_get_channel_flow_unordered(self, hydro):
+        flow = hydro.get_channel_flow(["5", "4"], "upstream")
+        assert list(flow.columns) == ["5-upstream", "4-upstream"]
+        flow4 = hydro.get_channel_flow("4", "upstream")
+        assert (flow["4-upstream"] == flow4["4-upstream"]).all()
+
+    def test_read_many(self, hydro):
+        tw = "05JAN1990 - 07JAN1990"
+        flow, area, avg_area, stage = hydro.read_many(
+            [
+                ("flow", ["441", "4"], "downstream"),
+                ("area", "all", "upstream"),
+                ("avg area", ["441"]),
+                ("stage", "4", "upstream"),
+            ],
+            tw,
+        )
+        pd.testing.assert_frame_equal(
+            flow, hydro.get_channel_flow(["441", "4"], "downstream", tw)
+        )
+        assert area.shape[1] == len(hydro.channel_numbers)
+        pd.testing.assert_frame_equal(avg_area, hydro.get_channel_avg_area("441", tw))
+        pd.testing.assert_frame_equal(
+            stage, hydro.get_channel_stage("4", "upstream", tw)
+        )
+
+    def test_iter_channel_ts(self, hydro):
+        tw = "05JAN1990 - 20JAN1990"
+        blocks = list(hydro.iter_channel_ts("flow", ["441", "4"], "upstream", tw, "5D"))
+        assert len(blocks) > 1
+        pd.testing.assert_frame_equal(
+            pd.concat(blocks),
+            hydro.get_channel_flow(["441", "4"], "upstream", tw),
+            check_freq=False,
+        )
+
+    def test_get_channel_flow_as_array(self, hydro):
+        df = hydro.get_channel_flow(["4", "5"], "upstream")
+        arr = hydro.get_channel_flow(["4", "5"], "upstream", as_array=True)
+        assert np.array_equal(arr, df.values)
+        stage = hydro.get_channel_stage("4", "upstream", as_array=True)
+        assert np.array_equal(stage, hydro.get_channel_stage("4").values[:, 0])
+
+    def test_get_channel_flow_as_xarray(self, hydro):
+        pytest.importorskip("xarray")
+        da = hydro.get_channel_flow("all", "downstream", as_xarray=True)
+        assert da.dims == ("time", "channel")
+        assert da.sizes["channel"] == len(hydro.channel_numbers)
+
+    def test_to_xarray(self, hydro):
+        pytest.importorskip("xarray")
+        pytest.importorskip("dask")
+        ds = hydro.to_xarray()
+        assert ds["channel_flow"].dims == ("time", "channel", "location")
+        assert ds["reservoir_height"].dims == ("time", "reservoir")
+        expected = hydro.get_channel_stage("441", "downstream")
+        actual = ds["channel_stage"].sel(channel="441", location="downstream")
+        np.testing.assert_allclose(actual.values, expected.iloc[:, 0].values)
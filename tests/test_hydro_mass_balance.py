@@ -0,0 +1,28 @@
+import numpy as np
+import pytest
+from pydsm.output.hydroh5 import HydroH5
+from pydsm.output.hydro_mass_balance import get_node_imbalance, get_node_incidence
+
+
+@pytest.fixture(scope="module")
+def hydro(network_hydro_file):
+    return HydroH5(network_hydro_file)
+
+
+def test_get_node_incidence(hydro):
+    nodes, incidence = get_node_incidence(hydro)
+    assert list(nodes) == [1, 2, 3, 4]
+    # 6 channel ends, 1 reservoir connection, 1 qext at a node, 1 transfer end
+    assert incidence.shape == (4, 6 + 1 + 2 + 1)
+    assert incidence.nnz == 9
+
+
+def test_get_node_imbalance(hydro):
+    imbalance = get_node_imbalance(hydro, chunk=32)
+    assert imbalance.shape == (96, 4)
+    assert list(imbalance.columns) == ["1", "2", "3", "4"]
+    # all nodes balance apart from the outflow through node 4
+    np.testing.assert_allclose(imbalance[["1", "2", "3"]], 0)
+    np.testing.assert_allclose(imbalance["4"], 115)
+    window = get_node_imbalance(hydro, "01JAN1990 0100 - 01JAN1990 0300")
+    assert len(window) == 8
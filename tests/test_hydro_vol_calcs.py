@@ -0,0 +1,106 @@
+import numpy as np
+import pandas as pd
+import pytest
+from click.testing import CliRunner
+from pydsm.output.hydroh5 import HydroH5
+from pydsm.output.hydro_vol_calcs import (
+    calc_volumes_cmd,
+    get_channel_volumes,
+    get_reservoir_volumes,
+    iter_volumes,
+    write_volumes,
+)
+
+
+@pytest.fixture(scope="module")
+def hydro(network_hydro_file):
+    return HydroH5(network_hydro_file)
+
+
+def test_get_channel_volumes(hydro):
+    vols = get_channel_volumes(hydro, unit="cubic-feet")
+    assert list(vols.columns) == ["10", "20", "30"]
+    np.testing.assert_allclose(vols.iloc[0], [500 * 1000, 600 * 2000, 700 * 3000])
+
+
+def test_iter_volumes(hydro):
+    blocks = list(iter_volumes(hydro, unit="maf", per_item=True, chunk=32))
+    assert len(blocks) == 3
+    vols = pd.concat(blocks)
+    channel_vols = get_channel_volumes(hydro, unit="maf")
+    reservoir_vols = get_reservoir_volumes(hydro, unit="maf")
+    np.testing.assert_allclose(vols["channel_volume"], channel_vols.sum(axis=1))
+    np.testing.assert_allclose(vols["reservoir_volume"], reservoir_vols.sum(axis=1))
+    np.testing.assert_allclose(
+        vols["total_volume"], vols["channel_volume"] + vols["reservoir_volume"]
+    )
+    np.testing.assert_allclose(vols["channel_20"], channel_vols["20"])
+    np.testing.assert_allclose(vols["reservoir_res"], reservoir_vols["res"])
+
+
+def test_iter_volumes_subset(hydro):
+    vols = pd.concat(
+        iter_volumes(
+            hydro,
+            ["30", "10"],
+            timewindow="01JAN1990 0100 - 01JAN1990 0300",
+            no_reservoirs=True,
+            per_item=True,
+        )
+    )
+    assert list(vols.columns) == [
+        "channel_volume",
+        "total_volume",
+        "channel_30",
+        "channel_10",
+    ]
+    assert len(vols) == 8
+    np.testing.assert_allclose(vols["channel_30"], 700 * 3000 / 43560)
+
+
+@pytest.mark.parametrize("suffix", [".csv", ".parquet"])
+def test_write_volumes(hydro, tmp_path, suffix):
+    if suffix == ".parquet":
+        pytest.importorskip("pyarrow")
+    output = str(tmp_path / f"volumes{suffix}")
+    means = write_volumes(
+        output, iter_volumes(hydro, chunk=16), {"hydrofile": hydro.filename}
+    )
+    expected = pd.concat(iter_volumes(hydro))
+    if suffix == ".csv":
+        actual = pd.read_csv(output, comment="#", index_col=0, parse_dates=True)
+    else:
+        actual = pd.read_parquet(output)
+    pd.testing.assert_frame_equal(actual, expected, check_freq=False)
+    pd.testing.assert_series_equal(means, expected.mean())
+
+
+@pytest.mark.parametrize("suffix", [".csv", ".parquet"])
+def test_write_volumes_empty_window(hydro, tmp_path, suffix):
+    if suffix == ".parquet":
+        pytest.importorskip("pyarrow")
+    output = str(tmp_path / f"volumes{suffix}")
+    means = write_volumes(
+        output, iter_volumes(hydro, timewindow="01FEB1990 - 02FEB1990")
+    )
+    columns = ["channel_volume", "reservoir_volume", "total_volume"]
+    assert list(means.index) == columns
+    assert means.isna().all()
+    if suffix == ".csv":
+        actual = pd.read_csv(output, comment="#", index_col=0)
+    else:
+        actual = pd.read_parquet(output)
+    assert list(actual.columns) == columns
+    assert actual.empty
+
+
+def test_calc_volumes_cmd_parallel(hydro, tmp_path):
+    output = str(tmp_path / "volumes.csv")
+    result = CliRunner().invoke(
+        calc_volumes_cmd,
+        [hydro.filename, "--jobs", "2", "--chunk", "16", "-o", output],
+    )
+    assert result.exit_code == 0, result.output
+    actual = pd.read_csv(output, comment="#", index_col=0, parse_dates=True)
+    expected = pd.concat(iter_volumes(hydro))
+    pd.testing.assert_frame_equal(actual, expected, check_freq=False)
@@ -0,0 +1,86 @@
+import os
+import shutil
+import h5py
+import numpy as np
+import pandas as pd
+import pytest
+from pydsm.output import dsm2h5
+from pydsm.output.qualh5 import QualH5
+from pydsm.output.multitidefile import get_time_indexed_tables, open_multitidefile
+
+QUAL_FILE = os.path.join(os.path.dirname(__file__), "data", "historical_v82_ec.h5")
+
+
+def split_tidefile(filename, outfile, start, stop):
+    """
+    write the time steps start:stop of the tidefile to outfile, with the
+    dimension scales attached to the tables as in the tidefile
+    """
+    shutil.copyfile(filename, outfile)
+    with h5py.File(outfile, "r+") as nhf:
+        for path in get_time_indexed_tables(nhf):
+            data = nhf[path]
+            index = dsm2h5.get_table_time_index(data)
+            attrs = dict(data.attrs)
+            scales = [list(dim.values()) for dim in data.dims]
+            for i, dim_scales in enumerate(scales):
+                for scale in dim_scales:
+                    data.dims[i].detach_scale(scale)
+            values = data[start:stop]
+            del nhf[path]
+            nhf[path] = values
+            for i, dim_scales in enumerate(scales):
+                for scale in dim_scales:
+                    nhf[path].dims[i].attach_scale(scale)
+            for key, value in attrs.items():
+                if key != "DIMENSION_LIST":
+                    nhf[path].attrs[key] = value
+            nhf[path].attrs["start_time"] = np.array(
+                [index[start].strftime("%Y-%m-%d %H:%M:%S").encode()]
+            )
+
+
+@pytest.fixture(scope="module")
+def parts(tmp_path_factory):
+    tmp = tmp_path_factory.mktemp("parts")
+    files = []
+    # the second part overlaps the first by 10 time steps
+    for i, (start, stop) in enumerate([(0, 210), (200, 400), (400, 649)]):
+        files.append(str(tmp / f"part{i}.h5"))
+        split_tidefile(QUAL_FILE, files[-1], start, stop)
+    return files
+
+
+def test_open_multitidefile(parts):
+    qual = QualH5(QUAL_FILE)
+    multi = open_multitidefile(list(reversed(parts)))
+    assert isinstance(multi, QualH5)
+    assert multi.filenames == [os.path.abspath(f) for f in parts]
+    pd.testing.assert_frame_equal(
+        multi.get_channel_concentration("ec", ["441", "1"], "upstream"),
+        qual.get_channel_concentration("ec", ["441", "1"], "upstream"),
+    )
+    timewindow = "10JAN1990 0100 - 25JAN1990 0300"
+    pd.testing.assert_frame_equal(
+        multi.get_channel_avg_concentration("ec", "441", timewindow),
+        qual.get_channel_avg_concentration("ec", "441", timewindow),
+    )
+
+
+def test_open_multitidefile_dimension_scales(parts, tmp_path):
+    outfile = str(tmp_path / "multi.h5")
+    open_multitidefile(parts, outfile).close()
+    with h5py.File(QUAL_FILE, "r") as hf, h5py.File(outfile, "r") as nhf:
+        for path in get_time_indexed_tables(hf):
+            dims, ndims = hf[path].dims, nhf[path].dims
+            assert [d.label for d in ndims] == [d.label for d in dims]
+            for dim, ndim in zip(dims, ndims):
+                assert ndim.keys() == dim.keys()
+                for scale, nscale in zip(dim.values(), ndim.values()):
+                    assert nscale.file == nhf
+                    np.testing.assert_array_equal(nscale[()], scale[()])
+
+
+def test_open_multitidefile_gap(parts):
+    with pytest.raises(ValueError):
+        open_multitidefile([parts[0], parts[2]])
@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from pydsm.output import ptm
+
+HEADER = "65744640 65746080 15 3\n"
+EVENTS = np.array(
+    [
+        [65744640, 1, 12, 101],
+        [65744655, 2, -1, 40001],
+        [65744670, 1, 13, 102],
+        [65744685, 3, 412, 20003],
+        [65744700, 2, 12, 101],
+    ]
+)
+
+
+@pytest.fixture
+def trace_file(tmp_path):
+    filename = tmp_path / "trace.out"
+    lines = ["%d  %d %d   %d" % tuple(row) for row in EVENTS]
+    filename.write_text(HEADER + "\n".join(lines) + "\n")
+    return str(filename)
+
+
+def test_load_ptm_trace(trace_file):
+    df, meta = ptm.load_ptm_trace(trace_file)
+    assert meta["start_date"] == pd.Timestamp("2024-12-31")
+    assert meta["end_date"] == pd.Timestamp("2025-01-01")
+    assert meta["timestep"] == 15 and meta["nparticles"] == 3
+    assert df.columns.tolist() == ptm.TRACE_COLUMNS
+    assert df.dtypes.tolist() == [np.int32, np.int32, np.int16, np.int32]
+    np.testing.assert_array_equal(df.to_numpy(), EVENTS)
+    assert df.index[1] == pd.Timestamp("2024-12-31 00:15")
+
+
+def test_iter_ptm_trace(trace_file):
+    # chunks smaller than a line are joined up to whole lines
+    chunks = list(ptm.iter_ptm_trace(trace_file, chunk_bytes=16))
+    assert len(chunks) > 1
+    df, _ = ptm.load_ptm_trace(trace_file)
+    pd.testing.assert_frame_equal(pd.concat(chunks), df)
+
+
+def test_bad_ptm_trace(tmp_path):
+    filename = tmp_path / "trace.out"
+    filename.write_text(HEADER + "65744640 1 12 101\n65744655 2 x 40001\n")
+    with pytest.raises(ValueError):
+        ptm.load_ptm_trace(str(filename))
+    filename.write_text(HEADER + "65744640 1 12\n")
+    with pytest.raises(ValueError):
+        ptm.load_ptm_trace(str(filename))
+    # a line too long and one too short still add up to whole lines of values
+    filename.write_text(HEADER + "65744640 1 12 101 7\n65744655 2 40001\n")
+    with pytest.raises(ValueError):
+        ptm.load_ptm_trace(str(filename))
+
+
+def test_ptm_trace_parquet(trace_file, tmp_path):
+    pytest.importorskip("pyarrow")
+    out_dir = str(tmp_path / "trace")
+    files = ptm.ptm_trace_to_parquet(trace_file, out_dir, chunk_bytes=40)
+    assert len(files) > 1
+    df, meta = ptm.load_ptm_trace(trace_file)
+    actual, actual_meta = ptm.read_ptm_trace_parquet(out_dir)
+    pd.testing.assert_frame_equal(actual, df)
+    assert actual_meta == meta
+    selected, _ = ptm.read_ptm_trace_parquet(
+        out_dir, columns=["particle_id"], filters=[("particle_id", "==", 2)]
+    )
+    assert selected["particle_id"].tolist() == [2, 2]
+
+
+def test_ptm_trace_parquet_schema(tmp_path):
+    pytest.importorskip("pyarrow")
+    filename = tmp_path / "trace.out"
+    # only the second chunk has a node_id that does not fit in int16
+    filename.write_text(HEADER + "65744640 1 12 101\n65744655 2 40000 101\n")
+    out_dir = str(tmp_path / "trace")
+    files = ptm.ptm_trace_to_parquet(str(filename), out_dir, chunk_bytes=20)
+    assert len(files) == 2
+    df = pd.read_parquet(out_dir)
+    assert df["node_id"].tolist() == [12, 40000]
+    actual, _ = ptm.read_ptm_trace_parquet(out_dir)
+    assert actual["node_id"].dtype == np.int32
+    expected, _ = ptm.load_ptm_trace(str(filename))
+    np.testing.assert_array_equal(actual.to_numpy(), expected.to_numpy())
+    pd.testing.assert_index_equal(actual.index, expected.index)
@@ -1,6 +1,9 @@
 import os
+import h5py
+import numpy as np
 import pytest
 import pandas as pd
+from pydsm.output import dsm2h5
 from pydsm.output.qualh5 import QualH5
 
 
@@ -42,3 +45,215 @@ def test_channel_ids_to_indicies_error(qual):
 def test_channel_locations_to_indicies_error(qual):
     with pytest.raises(RuntimeError):
         qual._channel_locations_to_indicies(object())  # type: ignore
+
+
+def test_create_catalog_cached(qual, tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    cat = qual.create_catalog(use_cache=True, cache_dir=cache_dir)
+    pd.testing.assert_frame_equal(cat, qual.create_catalog())
+    # served from the cache without rebuilding
+    cached = dsm2h5.get_cached_catalog(qual.filename, lambda: None, cache_dir)
+    pd.testing.assert_frame_equal(cached, cat)
+
+
+def test_cached_catalog_rebuilt_when_file_changes(tmp_path):
+    filename = tmp_path / "tidefile.h5"
+    filename.write_bytes(b"v1")
+    calls = []
+
+    def build():
+        calls.append(1)
+        return pd.DataFrame({"id": ["CHAN_1_UP"], "filename": [str(filename)]})
+
+    cache_dir = str(tmp_path / "cache")
+    dsm2h5.get_cached_catalog(str(filename), build, cache_dir)
+    dsm2h5.get_cached_catalog(str(filename), build, cache_dir)
+    assert len(calls) == 1
+    filename.write_bytes(b"version 2")
+    dsm2h5.get_cached_catalog(str(filename), build, cache_dir)
+    assert len(calls) == 2
+
+
+def test_read_contiguous_table_from_memmap(qual, tmp_path):
+    filename = str(tmp_path / "contiguous.h5")
+    path = "/output/channel concentration"
+    with h5py.File(qual.filename, "r") as hf, h5py.File(filename, "w") as nhf:
+        for name in hf:
+            hf.copy(hf[name], nhf, name=name)
+        del nhf[path]
+        nhf.create_dataset(path, data=hf[path][()])  # contiguous, unfiltered
+        for key, value in hf[path].attrs.items():
+            if key != "DIMENSION_LIST":
+                nhf[path].attrs[key] = value
+    contiguous = QualH5(filename)
+    data, _ = dsm2h5.get_time_indexed_table(contiguous.h5, path)
+    assert isinstance(data, np.memmap)
+    # chunked tables are read with h5py
+    data, _ = dsm2h5.get_time_indexed_table(
+        contiguous.h5, "/output/channel avg concentration"
+    )
+    assert isinstance(data, h5py.Dataset)
+    tw = "05JAN1990 0100 - 07JAN1990 0300"
+    actual = contiguous.get_channel_concentration("ec", ["441", "1"], "upstream", tw)
+    expected = qual.get_channel_concentration("ec", ["441", "1"], "upstream", tw)
+    pd.testing.assert_frame_equal(actual, expected)
+    actual.iloc[0, 0] = 0.0  # an in memory copy, not a read only view
+    # the maps are released with the file
+    h5 = contiguous.h5
+    contiguous.close()
+    assert id(h5) not in dsm2h5._time_indexed_tables
+    os.remove(filename)
+
+
+def test_block_cache(qual, tmp_path):
+    tw = "05JAN1990 0100 - 07JAN1990 0300"
+    expected = qual.get_channel_concentration("ec", ["441", "1"], "upstream", tw)
+    cache = dsm2h5.enable_block_cache(cache_dir=str(tmp_path / "blocks"), block=24)
+    try:
+        actual = qual.get_channel_concentration("ec", ["441", "1"], "upstream", tw)
+        pd.testing.assert_frame_equal(actual, expected)
+        stats = cache.stats()
+        assert stats["misses"] > 0 and stats["hits"] == 0
+        actual.iloc[0, 0] = -1.0  # a copy, the cached blocks are unchanged
+        again = qual.get_channel_concentration("ec", ["441", "1"], "upstream", tw)
+        pd.testing.assert_frame_equal(again, expected)
+        assert cache.stats()["hits"] == stats["misses"]
+        # a new process would find the blocks in the disk tier
+        cache._blocks.clear()
+        cache._nbytes = 0
+        qual.get_channel_concentration("ec", ["441", "1"], "upstream", tw)
+        assert cache.stats()["disk_hits"] == stats["misses"]
+        cache.clear()
+        assert cache.stats()["blocks"] == 0
+    finally:
+        dsm2h5.disable_block_cache()
+    assert dsm2h5.get_block_cache() is None
+
+
+def test_block_cache_evicts_to_max_bytes(qual):
+    expected = qual.get_channel_concentration("ec", ["441", "1"], "upstream")
+    cache = dsm2h5.enable_block_cache(max_bytes=2**10, block=24)
+    try:
+        actual = qual.get_channel_concentration("ec", ["441", "1"], "upstream")
+        pd.testing.assert_frame_equal(actual, expected)
+        stats = cache.stats()
+        assert stats["evictions"] > 0
+        assert 0 < stats["nbytes"] <= 2**10
+    finally:
+        dsm2h5.disable_block_cache()
+
+
+def test_get_data_for_catalog(qual):
+    catalog = qual.create_catalog().reset_index(drop=True)
+    tw = "05JAN1990 0100 - 07JAN1990 0300"
+    sample = catalog.iloc[::50]
+    df = qual.get_data_for_catalog(sample, tw)
+    assert df.shape[1] == len(sample)
+    frames = qual.get_data_for_catalog(sample, tw, as_dict=True)
+    for _, entry in sample.iterrows():
+        expected = qual.get_data_for_catalog_entry(entry, tw)
+        key = (entry["id"], entry["variable"])
+        pd.testing.assert_frame_equal(frames[key], expected, check_freq=False)
+        np.testing.assert_array_equal(
+            df[key].to_numpy(),
+            expected.iloc[:, 0].to_numpy(),
+        )
+
+
+def test_multi_constituent_channel_concentration(gtm_tidefile):
+    gtm = QualH5(gtm_tidefile)
+    assert gtm.is_gtm()
+    constituents = ["ec", "doc", "temp"]
+    locations = ["upstream", "downstream"]
+    tw = "01JAN1990 0300 - 01JAN1990 1200"
+    df = gtm.get_channel_concentration(constituents, "all", locations, tw)
+    assert df.columns.names == ["constituent", "channel", "location"]
+    assert df.shape == (9, 18)
+    for name in constituents:
+        for location in locations:
+            expected = gtm.get_channel_concentration(name, "all", location, tw)
+            np.testing.assert_array_equal(
+                df.xs((name, location), axis=1, level=[0, 2]).to_numpy(),
+                expected.to_numpy(),
+            )
+    assert df[("doc", "20", "downstream")].iloc[0] == np.float32(200 + 0.03 + 15)
+    darr = gtm.get_channel_concentration(
+        constituents, ["10", "30"], locations, tw, as_xarray=True
+    )
+    assert darr.dims == ("time", "constituent", "channel", "location")
+    assert darr.shape == (9, 3, 2, 2)
+    np.testing.assert_array_equal(
+        darr.sel(constituent="temp", location="upstream").values,
+        gtm.get_channel_concentration("temp", ["10", "30"], "upstream", tw).values,
+    )
+
+
+def test_multi_constituent_reservoir_concentration(gtm_tidefile):
+    gtm = QualH5(gtm_tidefile)
+    df = gtm.get_reservoir_concentration(["ec", "temp"], "res")
+    assert df.columns.tolist() == [("ec", "res"), ("temp", "res")]
+    np.testing.assert_array_equal(
+        df[("temp", "res")].to_numpy(),
+        gtm.get_reservoir_concentration("temp", "res").iloc[:, 0].to_numpy(),
+    )
+
+
+def test_multi_constituent_avg_concentration(qual):
+    tw = "05JAN1990 0100 - 07JAN1990 0300"
+    df = qual.get_channel_avg_concentration(["ec"], ["441", "1"], tw)
+    expected = qual.get_channel_avg_concentration("ec", ["441", "1"], tw)
+    np.testing.assert_array_equal(df.to_numpy(), expected.to_numpy())
+
+
+def test_cell_concentration(gtm_tidefile):
+    gtm = QualH5(gtm_tidefile)
+    assert "cell concentration" in gtm.get_data_tables()
+    tw = "01JAN1990 0100 - 01JAN1990 0400"
+    df = gtm.get_cell_concentration("doc", timewindow=tw)
+    assert df.columns.tolist() == list(range(1, 10))
+    t = 0.01 * np.arange(1, 4)[:, None]
+    np.testing.assert_allclose(df.to_numpy(), 200 + t + np.arange(1, 10), rtol=1e-6)
+    # cells of a channel through the grid, from upstream
+    np.testing.assert_array_equal(
+        gtm.get_channel_cells(["30", 10]), [6, 7, 8, 9, 1, 2, 3]
+    )
+    by_channel = gtm.get_cell_concentration("doc", timewindow=tw, channel_id="20")
+    pd.testing.assert_frame_equal(by_channel, df[[4, 5]])
+    multi = gtm.get_cell_concentration(["temp", "ec"], [9, 2], tw)
+    assert multi.columns.names == ["constituent", "cell"]
+    assert multi[("temp", 2)].iloc[0] == np.float32(300 + 0.01 + 2)
+    darr = gtm.get_cell_concentration(["temp", "ec"], [9, 2], tw, as_xarray=True)
+    assert darr.dims == ("time", "constituent", "cell")
+    np.testing.assert_array_equal(darr.sel(constituent="ec").values, multi["ec"].values)
+    blocks = list(
+        gtm.iter_cell_concentration(
+            ["temp", "ec"], [9, 2], "01JAN1990 0000 - 02JAN1990 2300", chunk=16
+        )
+    )
+    assert len(blocks) == 3
+    pd.testing.assert_frame_equal(pd.concat(blocks).iloc[1:4], multi, check_freq=False)
+    with pytest.raises(ValueError):
+        gtm.get_cell_concentration("ec", [10])
+
+
+def test_cell_concentration_cells_first(gtm_tidefile, tmp_path):
+    # DIMENSION_LABELS decide the order of the cell and constituent dimensions
+    filename = str(tmp_path / "gtm.h5")
+    with h5py.File(gtm_tidefile) as src, h5py.File(filename, "w") as dst:
+        for name in src:
+            src.copy(name, dst)
+        data = dst["output/cell concentration"]
+        values = np.ascontiguousarray(data[()].transpose(0, 2, 1))
+        attrs = dict(data.attrs)
+        del dst["output/cell concentration"]
+        data = dst.create_dataset("output/cell concentration", data=values)
+        attrs["DIMENSION_LABELS"] = np.array(
+            ["constituent", "cell", "time"], dtype=h5py.string_dtype()
+        )
+        data.attrs.update(attrs)
+    expected = QualH5(gtm_tidefile).get_cell_concentration(["ec", "doc"], [3, 1])
+    gtm = QualH5(filename)
+    actual = gtm.get_cell_concentration(["ec", "doc"], [3, 1])
+    pd.testing.assert_frame_equal(actual[expected.columns], expected)
+    layout = gtm.get_data_table_layout()["cell concentration"]
+    assert layout[0] == ("cell", "constituent")
@@ -105,3 +105,83 @@ class TestQualH5:
     def test_get_reservoir_concentration_tw(self, qual):
         df = qual.get_reservoir_concentration("ec", "bethel", "11JAN1990 - 23JAN1990")
         assert len(df) > 100
+
+    def test_read_table_as_df_strings(self, qual):
+        df = dsm2h5.read_table_as_df(qual.h5, "/input/node_concentration")
+        assert df["name"].str.strip().equals(df["name"])
+        assert df["node_no"].dtype == np.int32
+        dfc = dsm2h5.read_table_as_df(
+            qual.h5, "/input/node_concentration", string_dtype="category"
+        )
+        assert isinstance(dfc["name"].dtype, pd.CategoricalDtype)
+        assert list(dfc["name"].astype(str)) == list(df["name"])
+        names = qual.get_input_table("/output/constituent_names", "category")
+        assert names.iloc[0, 0] == "ec"
+
+    def test_read_hyperslab_unordered(self, qual):
+        data = qual.h5["/output/channel concentration"]
+        full = data[:10]
+        channels = [420, 3, 4, 5, 420, 100]
+        arr = dsm2h5.read_hyperslab(data, slice(0, 10), 0, channels, 1)
+        assert np.array_equal(arr, full[:, 0, channels, 1])
+        arr = dsm2h5.read_hyperslab(data, slice(0, 10), [0], [7, 2], slice(None))
+        assert np.array_equal(arr, full[:, [0]][:, :, [7, 2], :])
+
+    def test_coalesce_indices(self):
+        unique, inverse, runs = dsm2h5.coalesce_indices([5, 3, 4, 9, 3])
+        assert list(unique) == [3, 4, 5, 9]
+        assert list(unique[inverse]) == [5, 3, 4, 9, 3]
+        assert runs == [slice(3, 6), slice(9, 10)]
+
+    def test_get_channel_concentration_unordered(self, qual):
+        df = qual.get_channel_concentration("ec", ["441", "1"], "upstream")
+        assert list(df.columns) == ["441-upstream", "1-upstream"]
+        df1 = qual.get_channel_concentration("ec", "1", "upstream")
+        assert (df["1-upstream"] == df1["1-upstream"]).all()
+
+    def test_iter_channel_ts(self, qual):
+        blocks = list(qual.iter_channel_ts("ec", ["441", "1"], "upstream", chunk="2D"))
+        assert len(blocks) > 1
+        chunk_rows = qual.h5["/output/channel concentration"].chunks[0]
+        assert all(len(b) % chunk_rows == 0 for b in blocks[:-1])
+        pd.testing.assert_frame_equal(
+            pd.concat(blocks),
+            qual.get_channel_concentration("ec", ["441", "1"], "upstream"),
+            check_freq=False,
+        )
+        tw = "05JAN1990 - 10JAN1990"
+        blocks = list(qual.iter_channel_ts("ec", "441", None, tw, chunk=None))
+        pd.testing.assert_frame_equal(
+            pd.concat(blocks),
+            qual.get_channel_avg_concentration("ec", "441", tw),
+            check_freq=False,
+        )
+
+    def test_get_channel_concentration_as_array(self, qual):
+        df = qual.get_channel_concentration("ec", ["441", "1"], "upstream")
+        arr = qual.get_channel_concentration(
+            "ec", ["441", "1"], "upstream", as_array=True
+        )
+        assert isinstance(arr, np.ndarray)
+        assert np.array_equal(arr, df.values)
+
+    def test_get_channel_concentration_as_xarray(self, qual):
+        pytest.importorskip("xarray")
+        da = qual.get_channel_concentration("ec", "all", "downstream", as_xarray=True)
+        assert da.dims == ("time", "channel")
+        assert da.coords["location"].item() == "downstream"
+        assert da.sel(channel="441").values[10] == pytest.approx(
+            qual.get_channel_concentration("ec", "441", "downstream").iloc[10, 0]
+        )
+
+    def test_to_xarray(self, qual):
+        pytest.importorskip("xarray")
+        pytest.importorskip("dask")
+        ds = qual.to_xarray(chunk="2D")
+        cc = ds["channel_concentration"]
+        assert cc.dims == ("time", "constituent", "channel", "location")
+        assert cc.chunks[0][0] % qual.h5["/output/channel concentration"].chunks[0] == 0
+        assert list(ds["reservoir"].values) == list(qual.get_reservoirs()["name"])
+        expected = qual.get_channel_concentration("ec", ["441", "1"], "upstream")
+        actual = cc.sel(constituent="ec", channel=["441", "1"], location="upstream")
+        np.testing.assert_array_equal(actual.values, expected.values)
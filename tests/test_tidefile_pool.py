@@ -0,0 +1,87 @@
+import os
+import shutil
+
+import pytest
+
+from pydsm.output.hydroh5 import HydroH5
+from pydsm.output.qualh5 import QualH5
+from pydsm.output.tidefile_pool import TidefilePool, get_tidefile_pool
+
+QUAL_FILE = os.path.join(os.path.dirname(__file__), "data", "historical_v82_ec.h5")
+
+
+def test_get_reuses_reader(network_hydro_file):
+    pool = TidefilePool()
+    hydro = pool.get(network_hydro_file)
+    assert isinstance(hydro, HydroH5)
+    assert pool.get(network_hydro_file) is hydro
+    assert isinstance(pool.get(QUAL_FILE), QualH5)
+    assert pool.stats() == {"opens": 2, "hits": 1, "closes": 0, "open": 2}
+    pool.close()
+    assert len(pool) == 0
+    assert not hydro.h5.id.valid
+
+
+def test_least_recently_used_closed(network_hydro_file):
+    with TidefilePool(max_open=1) as pool:
+        with pool.open(network_hydro_file) as hydro:
+            qual = pool.get(QUAL_FILE)
+            # in use, so kept open past max_open
+            assert hydro.h5.id.valid and len(pool) == 2
+        # closed once no longer in use
+        assert not hydro.h5.id.valid and qual.h5.id.valid
+        assert len(pool) == 1
+    assert not qual.h5.id.valid
+
+
+def test_changed_file_reopened(network_hydro_file, tmp_path):
+    filename = str(tmp_path / "hydro.h5")
+    shutil.copy(network_hydro_file, filename)
+    pool = TidefilePool()
+    hydro = pool.get(filename)
+    stat = os.stat(filename)
+    os.utime(filename, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert pool.get(filename) is not hydro
+    assert not hydro.h5.id.valid
+    pool.close()
+
+
+def test_changed_file_in_use(network_hydro_file, tmp_path):
+    filename = str(tmp_path / "hydro.h5")
+    shutil.copy(network_hydro_file, filename)
+    pool = TidefilePool()
+    with pool.open(filename) as hydro:
+        stat = os.stat(filename)
+        os.utime(filename, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        with pool.open(filename) as reopened:
+            assert reopened is not hydro
+            # the old reader stays open while in use
+            assert hydro.h5.id.valid
+        assert reopened.h5.id.valid
+        assert len(hydro.channel_numbers) == 3
+    assert not hydro.h5.id.valid
+    assert pool.get(filename) is reopened
+    assert pool.stats() == {"opens": 2, "hits": 1, "closes": 1, "open": 1}
+    pool.close()
+    assert not reopened.h5.id.valid
+
+
+def test_forked_pool_opens_own_readers(network_hydro_file):
+    pool = TidefilePool()
+    hydro = pool.get(network_hydro_file)
+    pool._pid = -1  # as seen from a forked child
+    assert pool.get(network_hydro_file) is not hydro
+    assert pool.stats()["open"] == 1
+    pool.close()
+
+
+def test_reader_context_manager(network_hydro_file):
+    with HydroH5(network_hydro_file) as hydro:
+        assert len(hydro.channel_numbers) == 3
+    assert not hydro.h5.id.valid
+
+
+def test_shared_pool():
+    assert get_tidefile_pool() is get_tidefile_pool()
+    with pytest.raises(FileNotFoundError):
+        get_tidefile_pool().get("no_such_tidefile.h5")
@@ -0,0 +1,73 @@
+import os
+import h5py
+import numpy as np
+import pandas as pd
+import pytest
+from pydsm.output.qualh5 import QualH5
+from pydsm.output.tidefile_repack import (
+    get_chunk_shape,
+    get_compression_options,
+    repack_tidefile,
+)
+
+QUAL_FILE = os.path.join(os.path.dirname(__file__), "data", "historical_v82_ec.h5")
+
+
+def test_get_chunk_shape():
+    shape = (100000, 1, 521, 2)
+    time_major = get_chunk_shape(shape, 4, "time-major", chunk_bytes=2**20)
+    assert time_major == (251, 1, 521, 2)
+    channel_major = get_chunk_shape(shape, 4, "channel-major", block_bytes=2**30)
+    assert channel_major == (100000, 1, 1, 2)
+    assert get_chunk_shape(shape, 4, "balanced")[2] == 32
+    # limited so that a block of one chunk along time fits in block_bytes
+    assert get_chunk_shape(shape, 4, "channel-major", block_bytes=2**20)[0] == 251
+    assert get_chunk_shape((0, 10, 2), 4) is None
+    with pytest.raises(ValueError):
+        get_chunk_shape(shape, 4, "diagonal")
+
+
+def test_get_compression_options():
+    assert get_compression_options("gzip", 6)["compression_opts"] == 6
+    assert get_compression_options("none") == {}
+    with pytest.raises(ValueError):
+        get_compression_options("zip")
+
+
+@pytest.mark.parametrize("layout", ["time-major", "channel-major", "balanced"])
+def test_repack_tidefile(tmp_path, layout):
+    outfile = str(tmp_path / "repacked.h5")
+    repack_tidefile(QUAL_FILE, outfile, layout=layout, compression="lzf", block_mb=1)
+    with h5py.File(QUAL_FILE, "r") as hf, h5py.File(outfile, "r") as nhf:
+        assert set(hf.attrs) == set(nhf.attrs)
+
+        def check(name, item):
+            nitem = nhf[name]
+            assert set(item.attrs) == set(nitem.attrs)
+            if isinstance(item, h5py.Dataset):
+                np.testing.assert_array_equal(item[()], nitem[()])
+
+        hf.visititems(check)
+        assert nhf["/output/channel concentration"].compression == "lzf"
+    pd.testing.assert_frame_equal(
+        QualH5(outfile).get_channel_concentration("ec", ["441", "1"], "upstream"),
+        QualH5(QUAL_FILE).get_channel_concentration("ec", ["441", "1"], "upstream"),
+    )
+
+
+def test_repack_tidefile_dimension_scales(tmp_path):
+    outfile = str(tmp_path / "repacked.h5")
+    repack_tidefile(QUAL_FILE, outfile, compression="none")
+    with h5py.File(QUAL_FILE, "r") as hf, h5py.File(outfile, "r") as nhf:
+        for path in [
+            "/output/channel concentration",
+            "/output/channel avg concentration",
+            "/output/reservoir concentration",
+        ]:
+            dims, ndims = hf[path].dims, nhf[path].dims
+            assert [d.label for d in ndims] == [d.label for d in dims]
+            for dim, ndim in zip(dims, ndims):
+                assert ndim.keys() == dim.keys()
+                for scale, nscale in zip(dim.values(), ndim.values()):
+                    assert nscale.file == nhf
+                    np.testing.assert_array_equal(nscale[()], scale[()])
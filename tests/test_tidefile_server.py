@@ -0,0 +1,98 @@
+import json
+import os
+import threading
+import urllib.error
+import urllib.request
+
+import pandas as pd
+import pytest
+from click.testing import CliRunner
+
+from pydsm.output.qualh5 import QualH5
+from pydsm.output.tidefile_server import (
+    TidefileService,
+    fetch_catalog,
+    fetch_data,
+    make_server,
+    serve_cmd,
+)
+
+QUAL_FILE = os.path.join(os.path.dirname(__file__), "data", "historical_v82_ec.h5")
+TIMEWINDOW = "05JAN1990 0100 - 07JAN1990 0300"
+
+
+@pytest.fixture(scope="module")
+def server(network_hydro_file):
+    service = TidefileService({"qual": QUAL_FILE, "hydro": network_hydro_file})
+    server = make_server(service, port=0, quiet=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield service, f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+    service.close()
+
+
+def test_files(server):
+    _, url = server
+    with urllib.request.urlopen(url + "/files") as response:
+        files = json.loads(response.read())
+    assert files["qual"]["model"] == "qual"
+    assert files["hydro"]["model"] == "hydro"
+
+
+def test_catalog(server):
+    _, url = server
+    catalog = fetch_catalog(url, "qual")
+    expected = QualH5(QUAL_FILE).create_catalog().reset_index(drop=True)
+    assert catalog["id"].tolist() == expected["id"].tolist()
+
+
+@pytest.mark.parametrize("fmt", ["json", "arrow"])
+def test_data_cached(server, fmt):
+    if fmt == "arrow":
+        pytest.importorskip("pyarrow")
+    service, url = server
+    expected = QualH5(QUAL_FILE).get_channel_concentration(
+        "ec", "441", "upstream", TIMEWINDOW
+    )
+    actual = fetch_data(url, "qual", "CHAN_441_UP", "ec", TIMEWINDOW, fmt=fmt)
+    # json has no float32
+    pd.testing.assert_frame_equal(
+        actual,
+        expected,
+        check_dtype=fmt == "arrow",
+        check_index_type=False,
+        check_freq=False,
+    )
+    hits = service.cache.stats()["hits"]
+    fetch_data(url, "qual", "CHAN_441_UP", "ec", TIMEWINDOW, fmt=fmt)
+    assert service.cache.stats()["hits"] == hits + 1
+
+
+def test_hydro_data(server):
+    _, url = server
+    df = fetch_data(url, "hydro", "CHAN_20_DOWN", "flow")
+    assert df.columns.tolist() == ["20-downstream"]
+    assert len(df) == 96
+
+
+def test_errors(server):
+    _, url = server
+    for path, status in [
+        ("/data?file=qual&id=CHAN_99999_UP&variable=ec", 404),
+        ("/data?file=qual&id=CHAN_441_UP", 400),
+        ("/catalog?file=nope", 404),
+        ("/catalog?file=qual&format=csv", 400),
+        ("/other", 404),
+    ]:
+        with pytest.raises(urllib.error.HTTPError) as e:
+            urllib.request.urlopen(url + path)
+        assert e.value.code == status
+        assert "error" in json.loads(e.value.read())
+
+
+def test_serve_cmd_help():
+    result = CliRunner().invoke(serve_cmd, ["--help"])
+    assert result.exit_code == 0
+    assert "--cache-mb" in result.output
@@ -0,0 +1,60 @@
+import os
+import pytest
+import pandas as pd
+from pydsm.output.qualh5 import QualH5
+from pydsm.output.tidefile_store import export_tidefile, TidefileStore
+
+pytest.importorskip("pyarrow")
+
+TIMEWINDOW = "05JAN1990 0100 - 07JAN1990 0300"
+
+
+@pytest.fixture(scope="module")
+def qual():
+    filename = os.path.join(os.path.dirname(__file__), "data", "historical_v82_ec.h5")
+    return QualH5(filename)
+
+
+@pytest.fixture(scope="module")
+def store(qual, tmp_path_factory):
+    store_dir = str(tmp_path_factory.mktemp("store"))
+    export_tidefile(qual.filename, store_dir, chunk="2D")
+    return TidefileStore(store_dir)
+
+
+def test_store_tables(store, qual):
+    assert store.model == "qual"
+    assert set(store.get_data_tables()) == set(qual.get_data_tables())
+    assert list(store.channel_numbers) == list(qual.get_channels()[0])
+
+
+@pytest.mark.parametrize(
+    "channels,location,timewindow",
+    [
+        ("441", "upstream", None),
+        (["1", "441", "2"], "downstream", TIMEWINDOW),
+        ("all", "upstream", TIMEWINDOW),
+    ],
+)
+def test_get_channel_concentration(store, qual, channels, location, timewindow):
+    expected = qual.get_channel_concentration("ec", channels, location, timewindow)
+    actual = store.get_channel_concentration("ec", channels, location, timewindow)
+    pd.testing.assert_frame_equal(actual, expected, check_freq=False)
+
+
+def test_get_avg_and_reservoir_concentration(store, qual):
+    pd.testing.assert_frame_equal(
+        store.get_channel_avg_concentration("ec", ["441", "1"], TIMEWINDOW),
+        qual.get_channel_avg_concentration("ec", ["441", "1"], TIMEWINDOW),
+        check_freq=False,
+    )
+    pd.testing.assert_frame_equal(
+        store.get_reservoir_concentration("ec", "bethel", TIMEWINDOW),
+        qual.get_reservoir_concentration("ec", "bethel", TIMEWINDOW),
+        check_freq=False,
+    )
+
+
+def test_unknown_channel(store):
+    with pytest.raises(KeyError):
+        store.get_channel_concentration("ec", "99999")